@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+
+"""
+Throughput and memory benchmarks of steinbit
+
+Run from the top of the repository with:
+
+    python -m benchmarks.suite
+
+Each benchmark is timed a few times and the best time kept, then run
+once more with tracemalloc to find its peak memory. The results are
+compared with a stored baseline and the command fails if any benchmark
+is slower or uses more memory than the baseline allows.
+"""
+
+from argparse import ArgumentParser, Namespace
+from typing import Callable, Dict, List, Iterator, Any, Optional
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from steinbit.config import Config
+from steinbit.core import ColourMapping, CompositionMode, Frame
+from steinbit.core import ImageDataExtractor, MineralMap, comparison
+from steinbit.create import SteinbitCreate, PREFETCH
+from steinbit.compare import SteinbitCompare
+from steinbit.stream import StreamWriter, STREAM_ROWS
+from .synthetic import synthetic_image, save_image
+
+
+DATA = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+CONFIG = """
+[Mapping]
+DetailedMapping = {data}/bls.csv
+ReducedMapping = {data}/rs.csv
+Translation = {data}/translation.csv
+
+[Fields]
+Wellbore = Wellbore
+Well = Wellbore
+Depth = Depth
+D_unit = Depth
+RtID = RtID
+
+[Regexes]
+Well = [ _]*([0-9/-]*).*
+Depth = ([0-9][0-9\\.]*)
+D_unit = [0-9\\.]*(.*)
+
+[Cache]
+Enabled = no
+"""
+
+# The fraction by which a benchmark may exceed its baseline time or memory
+TOLERANCE = 0.5
+
+# The most time in seconds that starting the command line may take,
+# whatever the baseline
+STARTUP_BUDGET = 1.0
+
+
+class Benchmark:
+    """
+    A single benchmark: a function to time, built by a setup function
+    outside of the timing, and the number of items, pixels or rows,
+    that it processes
+    """
+
+    name: str
+    setup: Callable[[], Callable[[], Any]]
+    items: int
+    unit: str
+    budget: Optional[float]
+
+    def __init__(
+            self,
+            name: str,
+            setup: Callable[[], Callable[[], Any]],
+            items: int,
+            unit: str,
+            budget: Optional[float] = None):
+        self.name = name
+        self.setup = setup
+        self.items = items
+        self.unit = unit
+        self.budget = budget
+
+    def measure(self, repeat: int) -> Dict[str, Any]:
+        """
+        Time the benchmark and find its peak memory
+
+        Parameters
+        ----------
+        repeat: int
+            The number of times to time the benchmark
+
+        Returns
+        -------
+        Dict[str, Any]
+            The best time in seconds, the items processed per second
+            and the peak memory in megabytes
+        """
+        seconds = []
+        for _ in range(repeat):
+            run = self.setup()
+            start = time.perf_counter()
+            run()
+            seconds.append(time.perf_counter() - start)
+        run = self.setup()
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        best = min(seconds)
+        result = {
+            'seconds': best,
+            'throughput': self.items / best,
+            'unit': '%s/s' % self.unit,
+            'peak_mb': peak / (1 << 20)}
+        if self.budget is not None:
+            result['budget'] = self.budget
+        return result
+
+
+class Suite:
+    """
+    The benchmarks of steinbit, sharing a configuration, a directory of
+    generated files and a cache of generated images
+    """
+
+    config: Config
+    directory: str
+    quick: bool
+    __images: Dict[Any, Any]
+
+    def __init__(self, directory: str, quick: bool = False):
+        """
+        Construct the suite
+
+        Parameters
+        ----------
+        directory: str
+            A scratch directory for configuration, images and outputs
+        quick: bool
+            Use smaller images and fewer rows
+        """
+        path = os.path.join(directory, 'steinbit.cfg')
+        with open(path, 'w') as handle:
+            handle.write(CONFIG.format(data=DATA))
+        self.config = Config(path)
+        self.directory = directory
+        self.quick = quick
+        self.__images = {}
+
+    def extractors(self, mode=CompositionMode.LOOKUP):
+        "The detailed and reduced extractors"
+        cfg = self.config
+        return [
+            ImageDataExtractor(m, cfg.fields, mode, cfg.budget)
+            for m in [cfg.detailed_mapping, cfg.reduced_mapping]]
+
+    def image(self, mapping: ColourMapping, size: int, colours: int,
+              noise: float, seed: int = 0, depth: float = 1590.0):
+        "Generate an image, or reuse one generated before"
+        key = (id(mapping), size, colours, noise, seed, depth)
+        if key not in self.__images:
+            self.__images[key] = synthetic_image(
+                mapping, (size, size), colours, noise, depth, seed)
+        return self.__images[key]
+
+    def rows(self, count: int) -> List[Any]:
+        "Describe small images at distinct depths to append as rows"
+        frame = Frame(self.extractors())
+        described = [
+            frame.describe(self.image(
+                self.config.detailed_mapping, 32, 16, 0.05, seed=i))
+            for i in range(16)]
+        rows = []
+        for index in range(count):
+            scores, fields = described[index % len(described)]
+            fields = dict(fields, depth=1000.0 + index)
+            rows.append((scores, fields))
+        return rows
+
+    def frame(self, count: int) -> Frame:
+        "A frame of detailed rows"
+        frame = Frame(self.extractors())
+        for scores, fields in self.rows(count):
+            frame.append_scores(scores, fields)
+        return frame
+
+    def table(self, count: int) -> pd.DataFrame:
+        "A table of detailed rows with a column for every mineral"
+        result = self.frame(count).result()
+        minerals = self.config.detailed_mapping.minerals
+        return result.reindex(columns=list(result.columns) + [
+            x for x in minerals if x not in result.columns]).fillna(0)
+
+    def composition(self) -> Iterator[Benchmark]:
+        "Benchmarks of classifying the pixels of a single image"
+        sizes = [256] if self.quick else [512, 1024, 2048]
+        detailed = self.config.detailed_mapping
+        detailed.lookup()
+        self.config.reduced_mapping.lookup()
+        for size in sizes:
+            for colours in [8, 64]:
+                for noise in [0.0, 0.1]:
+                    def lookup(size=size, colours=colours, noise=noise):
+                        image = self.image(detailed, size, colours, noise)
+                        extractor = ImageDataExtractor(detailed)
+                        return lambda: extractor.composition(image)
+                    yield Benchmark(
+                        'composition/lookup/%d/%dc/noise%g' % (
+                            size, colours, noise),
+                        lookup, size * size, 'pixels')
+        size = sizes[-1]
+        for mode in [CompositionMode.HISTOGRAM, CompositionMode.TILED]:
+            def composition(mode=mode):
+                image = self.image(detailed, size, 64, 0.1)
+                extractor = ImageDataExtractor(detailed, mode=mode)
+                return lambda: extractor.composition(image)
+            yield Benchmark(
+                'composition/%s/%d/64c/noise0.1' % (mode.value, size),
+                composition, size * size, 'pixels')
+
+        def describe():
+            image = self.image(detailed, size, 64, 0.1)
+            frame = Frame(self.extractors())
+            return lambda: frame.describe(image)
+        yield Benchmark(
+            'describe/%d/64c/noise0.1' % size, describe,
+            size * size, 'pixels')
+
+        def classify():
+            image = self.image(detailed, size, 64, 0.1)
+            extractor = ImageDataExtractor(detailed)
+            return lambda: MineralMap.classify(image, extractor)
+        yield Benchmark(
+            'map/classify/%d' % size, classify, size * size, 'pixels')
+
+        regions = 100
+
+        def counts():
+            mineral_map = MineralMap.classify(
+                self.image(detailed, size, 64, 0.1),
+                ImageDataExtractor(detailed))
+            rng = np.random.default_rng(0)
+            boxes = [
+                tuple(np.sort(rng.integers(0, size, (2, 2)), axis=0).ravel())
+                for _ in range(regions)]
+            return lambda: [mineral_map.counts(x) for x in boxes]
+        yield Benchmark(
+            'map/counts/%d' % size, counts, regions, 'regions')
+
+    def frames(self) -> Iterator[Benchmark]:
+        "Benchmarks of building and transforming frames"
+        counts = [10, 100, 1000] if self.quick else [10, 100, 1000, 10000]
+        for count in counts:
+            def append_images(count=count):
+                images = [
+                    self.image(
+                        self.config.detailed_mapping, 32, 16, 0.05,
+                        seed=i % 16, depth=1000.0 + i)
+                    for i in range(count)]
+                frame = Frame(self.extractors())
+                return lambda: [frame.append_image(x) for x in images]
+            yield Benchmark(
+                'frame/append_image/%d' % count, append_images,
+                count, 'rows')
+
+            def append_frame(count=count):
+                table = self.table(count)
+                frame = Frame(self.extractors())
+                return lambda: frame.append_frame(table.copy())
+            yield Benchmark(
+                'frame/append_frame/%d' % count, append_frame,
+                count, 'rows')
+
+        count = counts[-1]
+
+        def translate():
+            frame = Frame(self.extractors())
+            for scores, fields in self.rows(count):
+                frame.append_scores(scores, fields)
+            return lambda: frame.apply_translation(self.config.translation)
+        yield Benchmark(
+            'frame/apply_translation/%d' % count, translate, count, 'rows')
+
+        def percentages():
+            create = SteinbitCreate(self.config)
+            result = self.frame(count).result()
+            return lambda: create.percentages(result.copy())
+        yield Benchmark(
+            'create/percentages/%d' % count, percentages, count, 'rows')
+
+        def output_las():
+            las = os.path.join(self.directory, 'output.las')
+            frame = Frame(self.extractors())
+            frame.append_frame(self.table(count))
+            return lambda: SteinbitCreate.output_las(frame, las)
+        yield Benchmark(
+            'create/output_las/%d' % count, output_las, count, 'rows')
+
+        def read_las():
+            las = os.path.join(self.directory, 'input.las')
+            frame = Frame(self.extractors())
+            frame.append_frame(self.table(count))
+            SteinbitCreate.output_las(frame, las)
+            return lambda: SteinbitCreate.read_las(las)
+        yield Benchmark(
+            'create/read_las/%d' % count, read_las, count, 'rows')
+
+        output = os.path.join(self.directory, 'output.csv')
+
+        def write():
+            rows = self.rows(count)
+            create = SteinbitCreate(self.config)
+
+            def run():
+                frame = Frame(self.extractors())
+                for scores, fields in rows:
+                    frame.append_scores(scores, fields)
+                create.write(frame, output, True, True)
+            return run
+        yield Benchmark('create/write/%d' % count, write, count, 'rows')
+
+        def stream():
+            rows = self.rows(count)
+            create = SteinbitCreate(self.config)
+
+            def run():
+                frame = Frame(self.extractors())
+                writer = StreamWriter(output)
+                for scores, fields in rows:
+                    frame.append_scores(scores, fields)
+                    if len(frame) >= STREAM_ROWS:
+                        create.flush(frame, writer, True, True)
+                create.flush(frame, writer, True, True)
+                writer.close()
+            return run
+        yield Benchmark('create/stream/%d' % count, stream, count, 'rows')
+
+    def end_to_end(self) -> Iterator[Benchmark]:
+        "Benchmarks of the command line operations"
+        count, size = (8, 256) if self.quick else (32, 512)
+        output = os.path.join(self.directory, 'output.csv')
+
+        def create():
+            files = []
+            for index in range(count):
+                path = os.path.join(self.directory, 'image%03d.png' % index)
+                save_image(self.image(
+                    self.config.detailed_mapping, size, 32, 0.05,
+                    seed=index, depth=1590.0 + index), path)
+                files.append(path)
+            tool = SteinbitCreate(self.config)
+            args = Namespace(
+                files=files, output=output, update=None, jobs=1,
+                translate=False, percent=False, index=None, well=None,
+                depth_min=None, depth_max=None, prefetch=PREFETCH,
+                stream=False, maps=None, compress_maps=False)
+
+            def run():
+                with contextlib.redirect_stderr(io.StringIO()):
+                    tool.run(args)
+            return run
+        yield Benchmark(
+            'end_to_end/create/%dx%d' % (count, size), create,
+            count * size * size, 'pixels')
+
+        rows = 100 if self.quick else 1000
+        first = os.path.join(self.directory, 'first.csv')
+        second = os.path.join(self.directory, 'second.csv')
+
+        def compare():
+            result = self.table(rows)
+            result.to_csv(first, index=False)
+            minerals = self.config.detailed_mapping.minerals
+            result.loc[::7, minerals] += 1
+            result.to_csv(second, index=False)
+            tool = SteinbitCompare(self.config)
+            args = Namespace(
+                file1=first, file2=second, tolerance=comparison.TOLERANCE,
+                diff=None, pairs=None, jobs=1, report=None)
+
+            def run():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    tool.run(args)
+            return run
+        yield Benchmark(
+            'end_to_end/compare/%d' % rows, compare, rows, 'rows')
+
+    def startup(self) -> Iterator[Benchmark]:
+        "Benchmarks of starting the command line in a new interpreter"
+        def cli():
+            command = [sys.executable, '-m', 'steinbit.steinbit', '--help']
+            return lambda: subprocess.run(
+                command, stdout=subprocess.DEVNULL, check=True)
+        yield Benchmark(
+            'startup/help', cli, 1, 'runs', budget=STARTUP_BUDGET)
+
+    def benchmarks(self) -> Iterator[Benchmark]:
+        "Every benchmark in the suite"
+        yield from self.startup()
+        yield from self.composition()
+        yield from self.frames()
+        yield from self.end_to_end()
+
+
+def regressions(
+        results: Dict[str, Dict[str, Any]],
+        baseline: Dict[str, Dict[str, Any]],
+        tolerance: float) -> List[str]:
+    """
+    Find the benchmarks that are slower or use more memory than their
+    baseline allows, or slower than their fixed budget
+
+    Parameters
+    ----------
+    results: Dict[str, Dict[str, Any]]
+        The measurements of each benchmark
+    baseline: Dict[str, Dict[str, Any]]
+        The baseline measurements of each benchmark
+    tolerance: float
+        The fraction by which a measurement may exceed its baseline
+
+    Returns
+    -------
+    List[str]
+        A description of each regression
+    """
+    found = []
+    for name, result in results.items():
+        if result.get('budget', np.inf) < result['seconds']:
+            found.append("%s: seconds %.3f exceeds budget %.3f" % (
+                name, result['seconds'], result['budget']))
+        if name not in baseline:
+            continue
+        for key in ['seconds', 'peak_mb']:
+            limit = baseline[name][key] * (1 + tolerance)
+            if result[key] > limit:
+                found.append("%s: %s %.3f exceeds baseline %.3f" % (
+                    name, key, result[key], baseline[name][key]))
+    return found
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    "Run the suite and compare it with the baseline"
+    parser = ArgumentParser(description='Steinbit benchmarks')
+    parser.add_argument(
+        '-q', '--quick', action='store_true',
+        help='use smaller images and fewer rows')
+    parser.add_argument(
+        '-k', '--filter', type=str, default='',
+        help='only run benchmarks whose names contain this text')
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=3,
+        help='the number of times to time each benchmark')
+    parser.add_argument(
+        '-b', '--baseline', type=str, default=BASELINE,
+        help='the baseline to compare with')
+    parser.add_argument(
+        '-t', '--tolerance', type=float, default=TOLERANCE,
+        help='the fraction by which a benchmark may exceed its baseline')
+    parser.add_argument(
+        '-o', '--output', type=str,
+        help='a file to write the results to')
+    parser.add_argument(
+        '--save', action='store_true',
+        help='write the results to the baseline instead of comparing')
+    args = parser.parse_args(argv)
+
+    baseline: Dict[str, Any] = {}
+    if not args.save and os.path.isfile(args.baseline):
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)['benchmarks']
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        suite = Suite(directory, args.quick)
+        for benchmark in suite.benchmarks():
+            if args.filter not in benchmark.name:
+                continue
+            result = benchmark.measure(args.repeat)
+            results[benchmark.name] = result
+            change = ''
+            if benchmark.name in baseline:
+                change = '%+6.0f%%' % (100 * (
+                    result['seconds'] /
+                    baseline[benchmark.name]['seconds'] - 1))
+            print("%-45s %9.4fs %12.4g %-8s %8.1fMB %s" % (
+                benchmark.name, result['seconds'], result['throughput'],
+                result['unit'], result['peak_mb'], change))
+            sys.stdout.flush()
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+        'benchmarks': results}
+    for path in [args.baseline if args.save else None, args.output]:
+        if path:
+            with open(path, 'w') as handle:
+                json.dump(report, handle, indent=1, sort_keys=True)
+
+    found = regressions(results, baseline, args.tolerance)
+    for regression in found:
+        print("Regression: %s" % regression)
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""
+Synthetic mineral map images for benchmarking
+"""
+
+from typing import Tuple, Optional
+import numpy as np
+from PIL import Image, PngImagePlugin
+from scipy.spatial import cKDTree
+from steinbit.core import ColourMapping, RequiredFields
+
+
+# The mean width of a mineral grain in pixels
+GRAIN = 12
+
+# The mean radius of a particle in grains
+PARTICLE = 8
+
+
+def synthetic_pixels(
+        mapping: ColourMapping,
+        size: Tuple[int, int],
+        colours: Optional[int] = None,
+        noise: float = 0.0,
+        seed: int = 0) -> np.ndarray:
+    """
+    Draw a mineral map: round particles on the background colour, each
+    made of grains of minerals in skewed abundances, as in a QEMSCAN
+    image of a core sample
+
+    Parameters
+    ----------
+    mapping: ColourMapping
+        The palette to draw with
+    size: Tuple[int, int]
+        The width and height of the image
+    colours: Optional[int]
+        The number of mineral colours to use, or all of them
+    noise: float
+        The amount of anti-aliasing noise, from 0 for an image drawn
+        only with palette colours to 1 where every grain boundary is
+        blended and every pixel jittered
+    seed: int
+        The seed of the random generator
+
+    Returns
+    -------
+    np.ndarray
+        An (H, W, 3) array of uint8 pixels
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    background = [
+        i for i, x in enumerate(mapping.minerals)
+        if x.lower() == RequiredFields.BACKGROUND.value]
+    minerals = np.array([
+        i for i in range(len(mapping.minerals)) if i not in background])
+    minerals = rng.permutation(minerals)[:colours]
+    abundance = 1.0 / np.arange(1, len(minerals) + 1)
+
+    grid = np.stack(np.meshgrid(
+        np.arange(width), np.arange(height)), axis=-1).reshape(-1, 2)
+    grains = max(1, width * height // (GRAIN * GRAIN))
+    centres = rng.random((grains, 2)) * (width, height)
+    _, nearest = cKDTree(centres).query(grid)
+    labels = minerals[rng.choice(
+        len(minerals), grains, p=abundance / abundance.sum())][nearest]
+
+    particles = max(1, grains // (2 * PARTICLE * PARTICLE))
+    middles = rng.random((particles, 2)) * (width, height)
+    radii = rng.uniform(0.5, 1.5, particles) * PARTICLE * GRAIN
+    distances, closest = cKDTree(middles).query(grid)
+    if background:
+        labels[distances > radii[closest]] = background[0]
+
+    pixels = mapping.colours[labels.reshape(height, width)].astype(np.int16)
+    if noise > 0:
+        shifted = np.roll(pixels, 1, axis=1)
+        edges = np.any(pixels != shifted, axis=-1)
+        edges &= rng.random((height, width)) < noise
+        pixels[edges] = (pixels[edges] + shifted[edges]) // 2
+        jitter = rng.random((height, width)) < noise
+        pixels[jitter] += rng.integers(-4, 5, (int(jitter.sum()), 3)).astype(
+            np.int16)
+    return np.clip(pixels, 0, 255).astype(np.uint8)
+
+
+def description(depth: float, seed: int = 0) -> str:
+    "The metadata description of a synthetic image"
+    return 'Wellbore:_25/2-18_C;Depth:%gm;RtID:RN2-%03d;Supplier:Synthetic' % (
+        depth, seed)
+
+
+def synthetic_image(
+        mapping: ColourMapping,
+        size: Tuple[int, int],
+        colours: Optional[int] = None,
+        noise: float = 0.0,
+        depth: float = 1590.0,
+        seed: int = 0) -> Image:
+    """
+    Draw a mineral map image with a metadata Description giving its
+    well, depth and sample ID. The parameters are those of
+    synthetic_pixels, with the depth of the sample.
+    """
+    image = Image.fromarray(
+        synthetic_pixels(mapping, size, colours, noise, seed), 'RGB')
+    image.info['Description'] = description(depth, seed)
+    return image
+
+
+def save_image(image: Image, path: str):
+    "Save a synthetic image as a PNG, keeping its Description"
+    info = PngImagePlugin.PngInfo()
+    info.add_text('Description', image.info['Description'])
+    image.save(path, pnginfo=info)
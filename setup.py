@@ -14,6 +14,9 @@ setup(
       'numpy', 'scipy', 'pandas',
       'pillow>=7.0.0', 'tqdm',
       'scikit-learn', 'lasio'],
+  extras_require={
+      'arrow': ['pyarrow'],
+  },
   entry_points={
       'console_scripts': [
           'steinbit = steinbit.steinbit:main',
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+"""
+A persistent cache of image compositions keyed by file content
+"""
+
+from .core import ImageDataExtractor
+
+from typing import List, Dict, Tuple, Any, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+# The default size limit of the cache in bytes
+CACHE_SIZE = 256 << 20
+
+# The default size limit in bytes of the compiled and lookup tables kept
+# in the cache, room for about twenty lookup tables
+TABLE_SIZE = 1 << 30
+
+# The directories of the cache holding files made from configurations,
+# which have a size limit of their own
+ARTIFACTS = ['config', 'lookup']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    digest TEXT NOT NULL);
+"""
+
+
+def default_cache_directory() -> str:
+    """
+    Return the default directory for cached data
+    """
+    base = os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'steinbit')
+
+
+def file_digest(filepath: str) -> Tuple[str, int, int]:
+    """
+    Hash the content of a file, in any process, returning the hash with
+    the size and modification time of the file before it was read
+    """
+    stat = os.stat(filepath)
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest(), stat.st_size, stat.st_mtime_ns
+
+
+class CompositionCache:
+    """
+    The CompositionCache stores the description of each image, that is
+    the composition from each extractor and its metadata, in an SQLite
+    database. Entries are keyed by a hash of the image file and a
+    fingerprint of the extractors, so an entry is never used with a
+    different mapping or field configuration. The least recently used
+    entries are removed once the cache grows beyond its size limit. The
+    compiled tables and lookup tables kept in the same directory have a
+    limit of their own, so that building a table never removes entries
+    and the entries never remove a table in use, and the least recently
+    used tables are removed once they grow beyond it.
+    """
+
+    directory: str
+    fingerprint: str
+    limit: int
+    table_limit: int
+    __connection: sqlite3.Connection
+
+    def __init__(
+            self,
+            directory: str,
+            extractors: List[ImageDataExtractor],
+            limit: int = CACHE_SIZE,
+            table_limit: int = TABLE_SIZE):
+        """
+        Open or create a cache
+
+        Parameters
+        ----------
+        directory: str
+            The directory holding the cache database
+        extractors: List[ImageDataExtractor]
+            The extractors the cached descriptions are made with
+        limit: int
+            The size limit of the entries of the cache in bytes
+        table_limit: int
+            The size limit of the tables kept in the cache in bytes
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fingerprint = CompositionCache.fingerprint_of(extractors)
+        self.limit = limit
+        self.table_limit = table_limit
+        self.__connection = sqlite3.connect(
+            os.path.join(directory, 'compositions.sqlite'), timeout=60)
+        self.__connection.execute("PRAGMA journal_mode = WAL")
+        self.__connection.execute("PRAGMA synchronous = NORMAL")
+        self.__connection.executescript(SCHEMA)
+
+    @staticmethod
+    def fingerprint_of(extractors: List[ImageDataExtractor]) -> str:
+        """
+        Find a fingerprint of everything about a list of extractors
+        that affects the description of an image
+        """
+        digest = hashlib.sha256()
+        for extractor in extractors:
+            digest.update(extractor.mode.value.encode())
+            digest.update(extractor.mapping.colours.tobytes())
+            digest.update(json.dumps(extractor.minerals).encode())
+            digest.update(json.dumps(sorted(
+                (k, f.exif, f.regex.pattern)
+                for k, f in extractor.fields.items())).encode())
+        return digest.hexdigest()
+
+    def digest(self, filepath: str) -> str:
+        """
+        Hash the content of a file. The hash is remembered alongside the
+        size and modification time of the file so an unchanged file is
+        not read again.
+        """
+        digest = self.stored_digest(filepath)
+        if digest is None:
+            digest, size, mtime = file_digest(filepath)
+            self.remember(filepath, digest, size, mtime)
+        return digest
+
+    def stored_digest(self, filepath: str) -> Optional[str]:
+        """
+        Return the hash remembered for a file, if it has not changed
+        size or modification time since, without reading the file
+        """
+        path = os.path.abspath(filepath)
+        stat = os.stat(path)
+        row = self.__connection.execute(
+            "SELECT digest FROM files WHERE path = ? AND size = ? "
+            "AND mtime = ?", (path, stat.st_size, stat.st_mtime_ns)
+            ).fetchone()
+        return row[0] if row else None
+
+    def remember(self, filepath: str, digest: str, size: int, mtime: int):
+        """
+        Remember the hash of a file, made elsewhere by file_digest, with
+        the size and modification time of the file when it was hashed
+        """
+        with self.__connection:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (os.path.abspath(filepath), size, mtime, digest))
+
+    def key(self, filepath: str) -> str:
+        """
+        Return the key of the entry for a file
+        """
+        return self.digest_key(self.digest(filepath))
+
+    def digest_key(self, digest: str) -> str:
+        """
+        Return the key of the entry for a file with a given hash
+        """
+        return "%s:%s" % (self.fingerprint, digest)
+
+    def get(self, key: str) -> Optional[Tuple[
+            List[Tuple[float, Dict[str, int]]], Dict[str, Any]]]:
+        """
+        Find a cached description
+
+        Parameters
+        ----------
+        key: str
+            The key of the entry
+
+        Returns
+        -------
+        Optional[Tuple[List[Tuple[float, Dict[str, int]]], Dict[str, Any]]]
+            The description, as returned by Frame.describe, or None if
+            there is no entry
+        """
+        row = self.__connection.execute(
+            "SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.__connection:
+            self.__connection.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?",
+                (time.time(), key))
+        value = json.loads(row[0])
+        return [tuple(x) for x in value['scores']], value['fields']
+
+    def put(
+            self,
+            key: str,
+            description: Tuple[
+                List[Tuple[float, Dict[str, int]]], Dict[str, Any]]):
+        """
+        Store a description
+
+        Parameters
+        ----------
+        key: str
+            The key of the entry
+        description:
+            The description, as returned by Frame.describe
+        """
+        scores, fields = description
+        value = json.dumps({
+            'scores': [
+                (float(e), {k: int(v) for k, v in c.items()})
+                for e, c in scores],
+            'fields': fields})
+        with self.__connection:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()))
+
+    def artifacts(self) -> List[Tuple[float, str, int]]:
+        """
+        List the compiled tables and lookup tables in the cache
+        directory, but not those still being written, with the time
+        each was last used and its size, the least recently used first
+        """
+        found = []
+        for name in ARTIFACTS:
+            try:
+                entries = list(os.scandir(os.path.join(self.directory, name)))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    found.append((stat.st_mtime, entry.path, stat.st_size))
+        return sorted(found)
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is
+        within its size limit, and the least recently used tables until
+        the tables are within theirs
+        """
+        files = self.artifacts()
+        total = sum(x[2] for x in files)
+        for _, path, size in files:
+            if total <= self.table_limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+        total = self.__connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.limit:
+            return
+        removed = []
+        for key, size in self.__connection.execute(
+                "SELECT key, size FROM entries ORDER BY accessed"):
+            if total <= self.limit:
+                break
+            removed.append((key,))
+            total -= size
+        with self.__connection:
+            self.__connection.executemany(
+                "DELETE FROM entries WHERE key = ?", removed)
+
+    def close(self):
+        """
+        Enforce the size limit and close the cache
+        """
+        self.evict()
+        self.__connection.close()
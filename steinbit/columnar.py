@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+Read and write sheets as Parquet or Arrow IPC files with typed columns
+"""
+
+from typing import Any, Iterable
+import os
+import numpy as np
+import pandas as pd
+
+from .core import RequiredFields
+
+
+# The extensions of Parquet files
+PARQUET_EXTENSIONS = ['.parquet', '.pq']
+
+# The extensions of Arrow IPC files
+ARROW_EXTENSIONS = ['.arrow', '.feather', '.ipc']
+
+# The largest pixel count stored as a 32-bit integer
+UINT32_MAX = np.iinfo(np.uint32).max
+
+
+def extension(filepath: str) -> str:
+    "Return the extension of a file in lower case"
+    return os.path.splitext(filepath)[1].lower()
+
+
+def is_columnar(filepath: str) -> bool:
+    """
+    Return true if a file is named as a Parquet or Arrow IPC file
+
+    >>> is_columnar('25_2-18.parquet'), is_columnar('25_2-18.csv')
+    (True, False)
+    """
+    return extension(filepath) in PARQUET_EXTENSIONS + ARROW_EXTENSIONS
+
+
+def pyarrow() -> Any:
+    """
+    Import pyarrow, which is only needed for Parquet and Arrow files
+    and is installed with the arrow extra of steinbit
+    """
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError(
+            "Parquet and Arrow files need pyarrow, installed with "
+            "pip install steinbit[arrow]") from error
+    return pyarrow
+
+
+def to_arrow(df: pd.DataFrame, minerals: Iterable[str]) -> Any:
+    """
+    Convert a sheet to an Arrow table, storing pixel counts as unsigned
+    32-bit integers, or 64-bit if any count is too large, percentages
+    and other fractional minerals as 32-bit floats and the well and
+    depth unit, which are the same on every row, dictionary encoded
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        The sheet to convert
+    minerals: Iterable[str]
+        The mineral columns of the sheet
+
+    Returns
+    -------
+    pyarrow.Table
+        The sheet as an Arrow table
+    """
+    pa = pyarrow()
+    minerals = set(minerals)
+    consistent = {
+        x.match_name(df.columns) for x in RequiredFields
+        if x.is_consistent()}
+    arrays = []
+    for name in df.columns:
+        column = df[name]
+        counts = name in minerals and column.dtype.kind in 'iu' and \
+            not (len(column.index) and column.min() < 0)
+        if counts:
+            large = len(column.index) and column.max() > UINT32_MAX
+            array = pa.array(
+                column, pa.uint64() if large else pa.uint32())
+        elif name in minerals and column.dtype.kind == 'f':
+            array = pa.array(column, pa.float32(), from_pandas=True)
+        elif name in consistent:
+            array = pa.array(column.astype('category'), from_pandas=True)
+        else:
+            array = pa.array(column, from_pandas=True)
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, names=[str(x) for x in df.columns])
+
+
+def write_columnar(
+        df: pd.DataFrame,
+        filepath: str,
+        minerals: Iterable[str]):
+    """
+    Write a sheet to a Parquet or Arrow IPC file, chosen by the
+    extension of the file, with the column types of to_arrow
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        The sheet to write
+    filepath: str
+        The file to write to
+    minerals: Iterable[str]
+        The mineral columns of the sheet
+    """
+    pa = pyarrow()
+    table = to_arrow(df, minerals)
+    if extension(filepath) in PARQUET_EXTENSIONS:
+        pa.parquet.write_table(table, filepath)
+    else:
+        pa.feather.write_feather(table, filepath)
+
+
+def read_columnar(filepath: str) -> pd.DataFrame:
+    """
+    Read a sheet from a Parquet or Arrow IPC file. Dictionary encoded
+    columns are read as plain columns of their values.
+
+    Parameters
+    ----------
+    filepath: str
+        The file to read
+
+    Returns
+    -------
+    pd.DataFrame
+        The sheet
+    """
+    pa = pyarrow()
+    if extension(filepath) in PARQUET_EXTENSIONS:
+        table = pa.parquet.read_table(filepath)
+    else:
+        table = pa.feather.read_table(filepath)
+    df = table.to_pandas()
+    for name in df.columns:
+        if isinstance(df[name].dtype, pd.CategoricalDtype):
+            df[name] = df[name].astype(object)
+    return df
@@ -1,26 +1,101 @@
 #!/usr/bin/env python3
 
 from argparse import ArgumentParser, Namespace
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
-from typing import List
+from typing import List, Tuple, Dict, Any, Optional, Union
+import json
+import os
 
-from .core import RequiredFields
+from .core import (
+    Comparison, TOLERANCE, Frame, ImageDataExtractor, RequiredFields
+)
+from .config import Config
 from .tool import SteinbitTool
 from .create import SteinbitCreate
+from .columnar import PARQUET_EXTENSIONS, ARROW_EXTENSIONS
 
 
 EPSILON = 0.01
 
+# Differences no larger than this are rounding error and not reported
+PRECISION = 1e-9
+
+# The extensions of the files compared when comparing directories
+SHEET_EXTENSIONS = ['.csv', '.las'] + PARQUET_EXTENSIONS + ARROW_EXTENSIONS
+
+# The tool used to load files in a worker process
+WORKER_COMPARE: Optional['SteinbitCompare'] = None
+
 
 def has_percent_row(minerals: List[str], df: pd.DataFrame) -> bool:
     """
     Return true if this frame has a percentage row
     """
+    minerals = [x for x in minerals if x in df.columns]
     return any(abs(x - 100) < EPSILON for x in df[minerals].sum(axis=1))
 
 
+def initialise_worker(config: Config):
+    """
+    Build the tool for a worker process once, before any files are
+    handed to it
+    """
+    global WORKER_COMPARE
+    WORKER_COMPARE = SteinbitCompare(config)
+
+
+def load_in_worker(filepath: str) -> 'Sheet':
+    "Load a single file in a worker process"
+    if WORKER_COMPARE is None:
+        raise RuntimeError("Worker process has not been initialised")
+    return WORKER_COMPARE.load(filepath)
+
+
+class Sheet:
+    """
+    A file read for comparison: its result, the minerals of the result
+    and whether it was translated to the reduced list
+    """
+
+    filepath: str
+    result: pd.DataFrame
+    minerals: List[str]
+    translated: bool
+
+    def __init__(
+            self,
+            filepath: str,
+            result: pd.DataFrame,
+            minerals: List[str],
+            translated: bool):
+        self.filepath = filepath
+        self.result = result
+        self.minerals = minerals
+        self.translated = translated
+
+    def well(self) -> Optional[str]:
+        "Return the well the sheet describes, if it names one"
+        well = RequiredFields.WELL.match_name(self.result.columns)
+        if well is None or len(self.result.index) == 0:
+            return None
+        return str(self.result[well].iloc[0]).strip()
+
+
+# A loaded sheet, or the error raised loading it
+Loaded = Union[Sheet, Exception]
+
+
 class SteinbitCompare(SteinbitTool):
 
+    create: SteinbitCreate
+    __extractors: Optional[List[ImageDataExtractor]]
+
+    def __init__(self, config: Config):
+        super().__init__(config)
+        self.create = SteinbitCreate(config)
+        self.__extractors = None
+
     @classmethod
     def add_arguments(cls, parser: ArgumentParser):
         """
@@ -28,53 +103,351 @@ class SteinbitCompare(SteinbitTool):
         """
         parser.set_defaults(clazz=cls)
         parser.add_argument(
-            'file1', type=str, nargs=1,
-            help='The first file to compare')
+            '--tolerance', type=float, default=TOLERANCE,
+            help='the largest difference in depth between rows compared')
+        parser.add_argument(
+            '--diff', type=str,
+            help='a CSV file to write the difference at every depth to')
+        parser.add_argument(
+            '--pairs', type=str,
+            help='a CSV file listing pairs of files to compare '
+                 'in columns file1 and file2')
+        parser.add_argument(
+            '-j', '--jobs', type=int, default=1,
+            help='the number of processes used to read files')
         parser.add_argument(
-            'file2', type=str, nargs=1,
-            help='The second file to compare')
+            '--report', type=str,
+            help='a JSON or CSV file to write the comparison '
+                 'of every pair to')
+        parser.add_argument(
+            'file1', type=str, nargs='?',
+            help='The first file, or directory of files, to compare')
+        parser.add_argument(
+            'file2', type=str, nargs='?',
+            help='The second file, or directory of files, to compare')
+
+    def load(self, filepath: str) -> Sheet:
+        """
+        Read a file to compare, translating it if it holds both
+        detailed and reduced rows. Of a LAS file only the depth and
+        the curves of known minerals are read.
+
+        Parameters
+        ----------
+        filepath: str
+            An image, CSV or LAS file
+
+        Returns
+        -------
+        Sheet
+            The result read from the file
+        """
+        if self.__extractors is None:
+            self.__extractors = self.create.extractors()
+        if not SteinbitCreate.is_image(filepath) and \
+                SteinbitCreate.is_las(filepath):
+            curves = {x.value for x in RequiredFields}
+            for extractor in self.__extractors:
+                curves.update(extractor.minerals)
+            frame = Frame(self.__extractors)
+            frame.append_frame(SteinbitCreate.read_table(filepath, curves))
+        else:
+            frame = self.create.process_files(
+                [filepath], extractors=self.__extractors, prefetch=0)
+        translated = frame.requires_translation()
+        if translated:
+            frame.apply_translation(self.config.translation)
+        return Sheet(filepath, frame.result(), frame.minerals(), translated)
+
+    def load_all(self, files: List[str], jobs: int) -> Dict[str, Loaded]:
+        """
+        Read each distinct file once, in a pool of worker processes if
+        there is more than one job
+
+        Parameters
+        ----------
+        files: List[str]
+            The files to read, which may repeat
+        jobs: int
+            The number of worker processes
+
+        Returns
+        -------
+        Dict[str, Loaded]
+            Each file with its sheet, or the error raised reading it
+        """
+        distinct = list(dict.fromkeys(files))
+        loaded: Dict[str, Loaded] = {}
+        if jobs <= 1:
+            for filepath in distinct:
+                try:
+                    loaded[filepath] = self.load(filepath)
+                except Exception as e:
+                    loaded[filepath] = e
+            return loaded
+        order = sorted(
+            distinct, reverse=True,
+            key=lambda f: os.path.getsize(f) if os.path.isfile(f) else 0)
+        with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=initialise_worker,
+                initargs=(self.config,)) as executor:
+            futures = {f: executor.submit(load_in_worker, f) for f in order}
+            for filepath in distinct:
+                try:
+                    loaded[filepath] = futures[filepath].result()
+                except Exception as e:
+                    loaded[filepath] = e
+        return loaded
+
+    def reduce(self, sheet: Sheet) -> Sheet:
+        "Translate a sheet of detailed minerals to the reduced list"
+        if sheet.minerals != self.config.detailed_mapping.minerals:
+            return sheet
+        return Sheet(
+            sheet.filepath,
+            self.config.translation.translate_frame(sheet.result),
+            self.config.reduced_mapping.minerals, True)
+
+    def prepare(
+            self,
+            sheet1: Sheet,
+            sheet2: Sheet
+            ) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, bool]]:
+        """
+        Make the results of two sheets comparable, translating both to
+        the reduced list if their minerals differ and converting both to
+        percentages if either is in percentages. The sheets are not
+        changed.
+
+        Parameters
+        ----------
+        sheet1: Sheet
+            The first sheet
+        sheet2: Sheet
+            The second sheet
+
+        Returns
+        -------
+        Tuple[pd.DataFrame, pd.DataFrame, Dict[str, bool]]
+            The two results and whether they were translated and
+            converted to percentages
+        """
+        if sheet1.minerals != sheet2.minerals:
+            sheet1, sheet2 = self.reduce(sheet1), self.reduce(sheet2)
+        result1, result2 = sheet1.result, sheet2.result
+        percentages = any(
+            has_percent_row(sheet1.minerals, r) for r in [result1, result2])
+        if percentages:
+            result1 = self.create.percentages(result1.copy())
+            result2 = self.create.percentages(result2.copy())
+        return result1, result2, {
+            'translated': sheet1.translated or sheet2.translated,
+            'percentages': percentages}
+
+    @staticmethod
+    def differing(comparison: Comparison) -> pd.DataFrame:
+        "The summary of the columns that differ, largest RMSE first"
+        summary = comparison.summary()
+        return summary[summary['max'] > PRECISION].sort_values(
+            'rmse', ascending=False)
+
+    @staticmethod
+    def pairs_listed(filepath: str) -> List[Tuple[str, str]]:
+        """
+        Read the pairs of files listed in a CSV file, relative to
+        the directory of the list
+        """
+        listed = pd.read_csv(filepath)
+        directory = os.path.dirname(filepath)
+        return [
+            (os.path.join(directory, a), os.path.join(directory, b))
+            for a, b in zip(listed['file1'], listed['file2'])]
+
+    @staticmethod
+    def sheets_in(directory: str) -> List[str]:
+        "Return the CSV and LAS files in a directory"
+        return sorted(
+            os.path.join(directory, x) for x in os.listdir(directory)
+            if os.path.splitext(x)[1].lower() in SHEET_EXTENSIONS)
+
+    @staticmethod
+    def pairs_by_well(
+            files1: List[str],
+            files2: List[str],
+            loaded: Dict[str, Loaded]) -> List[Tuple[str, str]]:
+        """
+        Pair each file of one list with the files of another that
+        describe the same well
+        """
+        wells: Dict[str, List[str]] = {}
+        for filepath in files2:
+            well = SteinbitCompare.well_of(loaded[filepath])
+            if well is not None:
+                wells.setdefault(well, []).append(filepath)
+        return [
+            (a, b) for a in files1
+            for b in wells.get(SteinbitCompare.well_of(loaded[a]) or '', [])]
+
+    @staticmethod
+    def well_of(loaded: Loaded) -> Optional[str]:
+        "The well of a sheet, or None if it could not be read"
+        return loaded.well() if isinstance(loaded, Sheet) else None
+
+    @staticmethod
+    def report_entry(
+            pair: Tuple[str, str],
+            loaded: Dict[str, Loaded],
+            compared: Any) -> Dict[str, Any]:
+        "Describe the comparison of a pair for the report"
+        entry: Dict[str, Any] = {'file1': pair[0], 'file2': pair[1]}
+        errors = [
+            "%s: %s" % (f, loaded[f]) for f in pair
+            if isinstance(loaded[f], Exception)]
+        if isinstance(compared, Exception):
+            errors.append(str(compared))
+        if errors:
+            entry['error'] = "; ".join(errors)
+            return entry
+        comparison, notes = compared
+        entry.update(notes)
+        entry['rows'] = comparison.rows
+        entry['matched'] = comparison.matched
+        entry['columns'] = json.loads(SteinbitCompare.differing(
+            comparison).to_json(orient='index', double_precision=15))
+        return entry
+
+    @staticmethod
+    def write_report(
+            output: str,
+            tolerance: float,
+            entries: List[Dict[str, Any]]):
+        """
+        Write a report of every pair compared, as JSON or, if the
+        output is a CSV file, as a row for each column that differs
+        """
+        if not output.lower().endswith('.csv'):
+            with open(output, 'w') as handle:
+                json.dump(
+                    {'tolerance': tolerance, 'pairs': entries},
+                    handle, indent=1)
+            return
+        rows = []
+        for entry in entries:
+            pair = {
+                k: v for k, v in entry.items()
+                if k not in ['columns', 'rows', 'matched']}
+            for key in ['rows', 'matched']:
+                for index, value in enumerate(entry.get(key, [])):
+                    pair['%s%d' % (key, index + 1)] = value
+            columns = entry.get('columns') or {None: {}}
+            for column, summary in columns.items():
+                rows.append(dict(pair, column=column, **summary))
+        pd.DataFrame(rows).to_csv(output, index=False)
+
+    def run_batch(self, args: Namespace, pairs: List[Tuple[str, str]],
+                  loaded: Dict[str, Loaded]):
+        """
+        Compare many pairs of files that have been read, in a pool of
+        threads, printing a line for each pair and writing the report
+        """
+        def compare(pair: Tuple[str, str]) -> Any:
+            sheet1, sheet2 = (loaded[x] for x in pair)
+            if not isinstance(sheet1, Sheet) or \
+                    not isinstance(sheet2, Sheet):
+                return None
+            try:
+                result1, result2, notes = self.prepare(sheet1, sheet2)
+                return Comparison(result1, result2, args.tolerance), notes
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+            compared = list(executor.map(compare, pairs))
+        entries = [
+            SteinbitCompare.report_entry(pair, loaded, result)
+            for pair, result in zip(pairs, compared)]
+        for entry in entries:
+            if 'error' in entry:
+                status = "error: %s" % entry['error']
+            else:
+                status = "matched %d of %d and %d of %d rows, " % (
+                    entry['matched'][0], entry['rows'][0],
+                    entry['matched'][1], entry['rows'][1])
+                if not entry['matched'][0]:
+                    status += "nothing compared"
+                elif not entry['columns']:
+                    status += "identical"
+                else:
+                    column, worst = next(iter(entry['columns'].items()))
+                    status += "%d columns differ, largest RMSE %g (%s)" % (
+                        len(entry['columns']), worst['rmse'], column)
+            print("%s ~ %s: %s" % (entry['file1'], entry['file2'], status))
+        print("Compared %d pairs of files" % len(entries))
+        if args.report:
+            SteinbitCompare.write_report(args.report, args.tolerance, entries)
 
     def run(self, args: Namespace):
         """
         Compare files by automatically applying any
         required translations
         """
-        create = SteinbitCreate(self.config)
-        frame1 = create.process_files(args.file1)
-        frame2 = create.process_files(args.file2)
+        if args.pairs:
+            pairs = SteinbitCompare.pairs_listed(args.pairs)
+            files = [x for pair in pairs for x in pair]
+            return self.run_batch(
+                args, pairs, self.load_all(files, args.jobs))
+        if not args.file1 or not args.file2:
+            raise ValueError("Two files, two directories or --pairs "
+                             "must be given to compare")
+        if os.path.isdir(args.file1) and os.path.isdir(args.file2):
+            files1, files2 = (
+                SteinbitCompare.sheets_in(x) for x in [args.file1, args.file2])
+            loaded = self.load_all(files1 + files2, args.jobs)
+            return self.run_batch(args, SteinbitCompare.pairs_by_well(
+                files1, files2, loaded), loaded)
+        self.run_pair(args)
 
-        if frame1.requires_translation() or frame2.requires_translation():
+    def run_pair(self, args: Namespace):
+        "Compare a single pair of files and print the differences"
+        sheet1, sheet2 = (self.load(x) for x in [args.file1, args.file2])
+        if sheet1.minerals != sheet2.minerals or \
+                sheet1.translated or sheet2.translated:
             print("Frames require translation...")
-            frame1.translate()
-            frame2.translate()
-        result1 = frame1.result()
-        result2 = frame2.result()
-        minerals = frame1.minerals()
-
-        if any(has_percent_row(minerals, r) for r in [result1, result2]):
+        result1, result2, notes = self.prepare(sheet1, sheet2)
+        if notes['percentages']:
             print("Converting to percentage-based")
-            result1 = create.percentages(result1)
-            result2 = create.percentages(result2)
+        comparison = Comparison(result1, result2, args.tolerance)
 
         columns = set(result1.columns).intersection(result2.columns)
-        extra1 = set(result1.columns) - columns
-        extra2 = set(result2.columns) - columns
+        extra1 = [x for x in result1.columns if x not in columns]
+        extra2 = [x for x in result2.columns if x not in columns]
 
         print("Comparison result:")
         if extra1:
             print("Extra columns in %s: [%s]" % (
-                args.file1[0],
+                args.file1,
                 ", ".join(extra1)))
         if extra2:
             print("Extra columns in %s: [%s]" % (
-                args.file2[0],
+                args.file2,
                 ", ".join(extra2)))
         print("-" * 40)
-        result1.set_index(RequiredFields.DEPTH.value, inplace=True, drop=False)
-        result2.set_index(RequiredFields.DEPTH.value, inplace=True, drop=False)
-        comparison = result1[columns].compare(result2[columns])
-        if len(comparison.index) == 0:
-            print("File data in matching columns is identical")
+        print("Matched %d of %d rows of %s to %d of %d rows of %s" % (
+            comparison.matched[0], comparison.rows[0], args.file1,
+            comparison.matched[1], comparison.rows[1], args.file2))
+        summary = SteinbitCompare.differing(comparison)
+        if len(summary.index) == 0:
+            print("File data in matching columns is identical%s" % (
+                "" if comparison.matched == comparison.rows
+                else " at matched depths"))
         else:
-            print(comparison.rename(columns={
-                'self': args.file1[0], 'other': args.file2[0]}))
+            print(summary.to_string())
+        if args.diff:
+            comparison.diff().to_csv(args.diff, index=False)
+        if args.report:
+            SteinbitCompare.write_report(
+                args.report, args.tolerance, [SteinbitCompare.report_entry(
+                    (args.file1, args.file2),
+                    {args.file1: sheet1, args.file2: sheet2},
+                    (comparison, notes))])
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""
+The compiled form of the tables a configuration is built from
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+
+# The version of the stored tables, part of the key of every compiled
+# configuration so that a change to their format is never misread
+FORMAT = 2
+
+
+class CompiledConfig:
+    """
+    The CompiledConfig stores the parsed form of the mapping, palette
+    and translation tables of a configuration, with colours already
+    resolved to R, G, B values, in the cache directory. Each table is
+    a record array in a .npy file, memory mapped when it is loaded,
+    with numbers kept as they are and other values as fixed width
+    strings. A JSON file beside the tables names their columns and is
+    keyed by the paths of the source tables and the version of its
+    format. It records the size, modification time and hash of each
+    source, so the tables are used only while every source is
+    unchanged. A source whose modification time changed but whose
+    content did not is hashed again, not reparsed. The files are
+    touched whenever they are loaded, so the cache can remove those
+    of configurations no longer used.
+    """
+
+    path: str
+    sources: Dict[str, str]
+
+    def __init__(self, directory: str, sources: Dict[str, str]):
+        """
+        Construct the compiled form of a set of tables
+
+        Parameters
+        ----------
+        directory: str
+            The directory holding compiled configurations
+        sources: Dict[str, str]
+            The filename of each table by name
+        """
+        self.sources = {k: os.path.abspath(v) for k, v in sources.items()}
+        key = hashlib.sha256(json.dumps(
+            [FORMAT, sorted(self.sources.items())]).encode()).hexdigest()
+        self.path = os.path.join(directory, key + '.json')
+
+    def table_path(self, index: int) -> str:
+        "The file holding a compiled table, by its position"
+        return '%s.%d.npy' % (os.path.splitext(self.path)[0], index)
+
+    @staticmethod
+    def column(values: pd.Series) -> np.ndarray:
+        """
+        Convert a column of a table to an array that can be memory
+        mapped, of numbers or else of fixed width strings
+        """
+        if values.dtype.kind in 'biuf':
+            return values.to_numpy()
+        return np.array([str(x) for x in values], dtype=str)
+
+    @staticmethod
+    def digest(filepath: str) -> str:
+        "Hash the content of a file"
+        with open(filepath, 'rb') as handle:
+            return hashlib.sha256(handle.read()).hexdigest()
+
+    @staticmethod
+    def identity(filepath: str) -> Dict[str, Any]:
+        "Return the size and modification time of a file"
+        stat = os.stat(filepath)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def load(self) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        Load the compiled tables if every source is unchanged
+
+        Returns
+        -------
+        Optional[Dict[str, pd.DataFrame]]
+            The table from each source by name, or None if the
+            tables must be compiled again
+        """
+        try:
+            with open(self.path) as handle:
+                stored = json.load(handle)
+            files = stored['files']
+            if set(files) != set(self.sources):
+                return None
+            for name, path in self.sources.items():
+                entry = files[name]
+                if entry['path'] != path:
+                    return None
+                identity = CompiledConfig.identity(path)
+                if identity == entry['identity']:
+                    continue
+                if CompiledConfig.digest(path) != entry['digest']:
+                    return None
+            tables = {}
+            paths = [self.path]
+            for name, table in stored['tables'].items():
+                paths.append(self.table_path(table['index']))
+                array = np.load(paths[-1], mmap_mode='r')
+                columns = table['columns']
+                tables[name] = pd.DataFrame({
+                    i: array['f%d' % i] for i in range(len(columns))})
+                tables[name].columns = columns
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        for path in paths:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return tables
+
+    def save(self, tables: Dict[str, pd.DataFrame]):
+        """
+        Store the compiled tables, replacing any stored before. The
+        tables are written first and the file naming them last.
+
+        Parameters
+        ----------
+        tables: Dict[str, pd.DataFrame]
+            The table from each source by name
+        """
+        stored = {
+            'files': {
+                name: {
+                    'path': path,
+                    'identity': CompiledConfig.identity(path),
+                    'digest': CompiledConfig.digest(path)}
+                for name, path in self.sources.items()},
+            'tables': {
+                name: {
+                    'columns': [str(c) for c in table.columns],
+                    'index': index}
+                for index, (name, table) in enumerate(tables.items())}}
+        writes: List[Tuple[str, Callable[[Any], Any]]] = []
+        for index, table in enumerate(tables.values()):
+            columns = [
+                CompiledConfig.column(table.iloc[:, i])
+                for i in range(len(table.columns))]
+            record = np.empty(len(table.index), dtype=[
+                ('f%d' % i, x.dtype) for i, x in enumerate(columns)])
+            for i, values in enumerate(columns):
+                record['f%d' % i] = values
+            writes.append((
+                self.table_path(index),
+                functools.partial(np.save, arr=record)))
+        writes.append((self.path, lambda x: x.write(
+            json.dumps(stored).encode('utf-8'))))
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        for path, write in writes:
+            with tempfile.NamedTemporaryFile(
+                    dir=directory, suffix='.tmp', delete=False) as handle:
+                write(handle)
+            os.replace(handle.name, path)
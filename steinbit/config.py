@@ -4,7 +4,12 @@
 The configuration file
 """
 
-from .core import ColourMapping, Field, RequiredFields
+from .core import (
+    ColourMapping, Field, RequiredFields, CompositionMode, TILE_BUDGET,
+    Translation, InvalidTranslationException
+)
+from .cache import default_cache_directory, CACHE_SIZE, TABLE_SIZE
+from .compiled import CompiledConfig
 
 import os
 import configparser
@@ -29,8 +34,14 @@ class Config:
 
     detailed_mapping: ColourMapping
     reduced_mapping: ColourMapping
-    translation: pd.DataFrame
+    palettes: Dict[str, ColourMapping]
+    translation: Translation
     fields: Dict[str, Field]
+    mode: CompositionMode
+    budget: int
+    cache_size: int
+    table_size: int
+    __cache_directory: Optional[str]
 
     @classmethod
     def search_config(cls):
@@ -47,14 +58,24 @@ class Config:
                 return path
         return None
 
-    def __init__(self, filename: Optional[str]):
+    def __init__(
+            self,
+            filename: Optional[str],
+            cache_directory: Optional[str] = None,
+            use_cache: bool = True):
         """
-        Parse the config file supplied
+        Parse the config file supplied. Overrides of the cache are given
+        here, rather than set afterwards, so that the compiled tables
+        are read from and written to the cache that is used.
 
         Parameters
         ----------
         filename: Optional[str]
             Construct from a configration filename instead of the default
+        cache_directory: Optional[str]
+            The cache directory to use instead of that of the file
+        use_cache: bool
+            Whether to use a cache at all, whatever the file says
         """
         filename = filename or self.search_config()
         config = configparser.ConfigParser()
@@ -70,14 +91,70 @@ class Config:
         translation = section.get(
             'Translation',
             os.path.join(MODULEPATH, 'data/translation.csv'))
-        self.detailed_mapping = ColourMapping(pd.read_csv(detailed_mapping))
-        self.reduced_mapping = ColourMapping(pd.read_csv(reduced_mapping))
-        self.translation = pd.read_csv(translation).dropna()
+        palettes = config['Palettes'] if 'Palettes' in config else {}
+        sources = {
+            'detailed': detailed_mapping,
+            'reduced': reduced_mapping,
+            'translation': translation}
+        sources.update(
+            {'palette/' + name: path for name, path in palettes.items()})
+
+        cache = config['Cache'] if 'Cache' in config else {}
+        enabled = cache.get('Enabled', 'yes').lower() in [
+            'yes', 'true', 'on', '1']
+        if not use_cache:
+            cache_directory = None
+        elif not cache_directory and enabled:
+            cache_directory = os.path.expanduser(
+                cache.get('Directory', default_cache_directory()))
+        try:
+            self.cache_size = int(cache.get('Size', CACHE_SIZE >> 20)) << 20
+            self.table_size = int(
+                cache.get('TableSize', TABLE_SIZE >> 20)) << 20
+        except ValueError:
+            raise ConfigException("Cache size must be a number of megabytes")
+
+        tables = Config.compile(sources, cache_directory)
+        self.detailed_mapping = ColourMapping(tables['detailed'])
+        self.reduced_mapping = ColourMapping(tables['reduced'])
+        try:
+            self.translation = Translation(tables['translation'])
+        except InvalidTranslationException:
+            raise ConfigException(
+                "Translation %s must have two columns" % translation)
+
+        self.palettes = {
+            name: ColourMapping(tables['palette/' + name])
+            for name in palettes}
+        for name, palette in self.palettes.items():
+            minerals = set(palette.minerals)
+            if not any(
+                    minerals <= set(x.minerals)
+                    for x in [self.detailed_mapping, self.reduced_mapping]):
+                raise ConfigException(
+                    "Palette '%s' has minerals in neither the detailed "
+                    "nor the reduced list: [%s]" % (name, ", ".join(
+                        minerals - set(self.detailed_mapping.minerals))))
+        self.cache_directory = cache_directory
 
         self.fields = {
                 k.lower(): Field(f, config['Regexes'].get(k, '(.*)'))
                 for k, f in config['Fields'].items()}
 
+        processing = config['Processing'] if 'Processing' in config else {}
+        mode = processing.get('Mode', CompositionMode.LOOKUP.value)
+        try:
+            self.mode = CompositionMode(mode.lower())
+        except ValueError:
+            raise ConfigException(
+                "Unknown composition mode '%s', expected one of [%s]" % (
+                    mode, ", ".join(m.value for m in CompositionMode)))
+        try:
+            self.budget = int(processing.get('TileBudget', TILE_BUDGET))
+        except ValueError:
+            raise ConfigException(
+                "TileBudget must be a number of pixels")
+
         minerals = set(self.detailed_mapping.minerals)
         minerals = minerals.intersection(self.reduced_mapping.minerals)
         fields = [x.lower() for x in minerals.union(self.fields.keys())]
@@ -86,9 +163,8 @@ class Config:
                 raise ConfigException(
                     "Required field '%s' is not specified" % field.value)
 
-        trns = self.translation
-        detailed_list = set(trns[trns.columns[1]])
-        reduced_list = set(trns[trns.columns[0]])
+        detailed_list = set(self.translation.detailed)
+        reduced_list = set(self.translation.reduced)
         if set(self.detailed_mapping.minerals) - detailed_list != set():
             raise ConfigException("""
                 Translation detailed list (%s, column 2) does not
@@ -99,3 +175,61 @@ class Config:
                 Translation reduced list (%s, column 1) does not
                 match reduced list from colour mapping (%s).
                 """ % (translation, detailed_mapping))
+
+    @staticmethod
+    def compile(
+            sources: Dict[str, str],
+            cache_directory: Optional[str]) -> Dict[str, pd.DataFrame]:
+        """
+        Read the mapping, palette and translation tables of a
+        configuration, resolving the colours of each mapping to R, G, B
+        values. The result is kept in the cache directory, if there is
+        one, and read from there while the sources are unchanged.
+
+        Parameters
+        ----------
+        sources: Dict[str, str]
+            The filename of each table by name, 'translation' for the
+            translation and a mapping for any other name
+        cache_directory: Optional[str]
+            The cache directory, or None to always read the tables
+
+        Returns
+        -------
+        Dict[str, pd.DataFrame]
+            The table from each source by name
+        """
+        store = None
+        if cache_directory:
+            store = CompiledConfig(
+                os.path.join(cache_directory, 'config'), sources)
+            tables = store.load()
+            if tables is not None:
+                return tables
+        tables = {
+            name: (
+                pd.read_csv(path).dropna() if name == 'translation'
+                else ColourMapping(pd.read_csv(path)).frame())
+            for name, path in sources.items()}
+        if store is not None:
+            try:
+                store.save(tables)
+            except OSError:
+                pass
+        return tables
+
+    @property
+    def cache_directory(self) -> Optional[str]:
+        """
+        The directory of the composition cache, also holding the
+        compiled tables and the colour lookup tables of the mappings
+        """
+        return self.__cache_directory
+
+    @cache_directory.setter
+    def cache_directory(self, directory: Optional[str]):
+        self.__cache_directory = directory
+        mappings = [self.detailed_mapping, self.reduced_mapping]
+        for mapping in mappings + list(self.palettes.values()):
+            mapping.lookup_directory = (
+                os.path.join(directory, 'lookup') if directory else None)
@@ -1,5 +1,12 @@
-from .imagedataextractor import ImageDataExtractor
+from .imagedataextractor import ImageDataExtractor, CompositionMode
 from .frame import (
-        Frame, ColumnMismatchException, InvalidTranslationException,
-        RequiredFields, ConsistencyException)
+        Frame, ColumnMismatchException, RequiredFields, ConsistencyException)
+from .translation import Translation, InvalidTranslationException
 from .types import ColourMapping, Field
+from .lookup import ColourLookup
+from .tiles import TILE_BUDGET
+from .routing import PaletteIndex
+from .raster import Raster, RasterFormatException
+from .header import read_info
+from .comparison import Comparison, TOLERANCE
+from .mineralmap import MineralMap, MineralMapException
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+
+"""
+Columnar storage for rows appended to a frame
+"""
+
+from typing import List, Dict, Any, Collection, Mapping
+import numpy as np
+import pandas as pd
+from enum import IntEnum
+
+
+class Kind(IntEnum):
+    """
+    The storage used for a column, in order of generality
+    """
+    INTEGER = 0
+    FLOAT = 1
+    OBJECT = 2
+
+    @staticmethod
+    def of_value(value: Any) -> 'Kind':
+        "Find the storage needed for a single value"
+        if isinstance(value, (bool, np.bool_)):
+            return Kind.OBJECT
+        if isinstance(value, (int, np.integer)):
+            return Kind.INTEGER
+        if isinstance(value, (float, np.floating)):
+            return Kind.FLOAT
+        return Kind.OBJECT
+
+    @staticmethod
+    def of_array(values: np.ndarray) -> 'Kind':
+        "Find the storage needed for an array of values"
+        if values.dtype.kind in 'iu':
+            return Kind.INTEGER
+        if values.dtype.kind == 'f':
+            return Kind.FLOAT
+        return Kind.OBJECT
+
+
+# The value stored for a row that lacks a column
+MISSING = np.nan
+
+
+class Column:
+    """
+    A single growable column. Numbers are held in a preallocated
+    integer or float array while any other values are interned, with
+    the array holding an index into the list of distinct values.
+    """
+
+    kind: Kind
+    values: np.ndarray
+    categories: List[Any]
+    __codes: Dict[Any, int]
+
+    def __init__(self, kind: Kind, capacity: int, rows: int):
+        """
+        Construct a column in which the first rows are missing
+
+        Parameters
+        ----------
+        kind: Kind
+            The storage to use for values
+        capacity: int
+            The number of rows to allocate space for
+        rows: int
+            The number of rows already in the buffer
+        """
+        self.kind = kind
+        self.categories = []
+        self.__codes = {}
+        if kind == Kind.INTEGER and rows > 0:
+            self.kind = Kind.FLOAT
+        self.values = np.empty(capacity, dtype=self.__dtype())
+        self.fill(0, rows)
+
+    def __dtype(self) -> type:
+        "The dtype of the value array"
+        return {
+            Kind.INTEGER: np.int64,
+            Kind.FLOAT: np.float64,
+            Kind.OBJECT: np.int32}[self.kind]
+
+    def intern(self, value: Any) -> int:
+        "Return the code for a value, adding it if it is new"
+        code = self.__codes.get(value)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(value)
+            self.__codes[value] = code
+        return code
+
+    def resize(self, capacity: int):
+        "Change the number of rows space is allocated for"
+        values = np.empty(capacity, dtype=self.values.dtype)
+        size = min(capacity, len(self.values))
+        values[:size] = self.values[:size]
+        self.values = values
+
+    def promote(self, kind: Kind, rows: int):
+        """
+        Widen the storage so that it can hold values of a kind
+
+        Parameters
+        ----------
+        kind: Kind
+            The kind of values to be stored
+        rows: int
+            The number of rows in use
+        """
+        if kind <= self.kind:
+            return
+        if kind == Kind.OBJECT:
+            codes = np.empty(len(self.values), dtype=np.int32)
+            codes[:rows] = [self.intern(x) for x in self.values[:rows]]
+            self.values = codes
+        else:
+            self.values = self.values.astype(np.float64)
+        self.kind = kind
+
+    def fill(self, start: int, stop: int):
+        "Mark a range of rows as missing"
+        if start >= stop:
+            return
+        self.promote(Kind.FLOAT, start)
+        if self.kind == Kind.OBJECT:
+            self.values[start:stop] = self.intern(MISSING)
+        else:
+            self.values[start:stop] = MISSING
+
+    def set(self, row: int, value: Any, kind: Kind):
+        "Store a single value of a given kind"
+        if kind > self.kind:
+            self.promote(kind, row)
+        if self.kind == Kind.OBJECT:
+            self.values[row] = self.intern(value)
+        else:
+            self.values[row] = value
+
+    def extend(self, start: int, values: np.ndarray):
+        "Store an array of values from a row onwards"
+        self.promote(Kind.of_array(values), start)
+        stop = start + len(values)
+        if self.kind == Kind.OBJECT:
+            self.values[start:stop] = [self.intern(x) for x in values]
+        else:
+            self.values[start:stop] = values
+
+    def distinct(self, start: int, stop: int) -> List[Any]:
+        "Return the distinct values in a range of rows"
+        values = self.values[start:stop]
+        if self.kind == Kind.OBJECT:
+            return [self.categories[x] for x in dict.fromkeys(values)]
+        return list(dict.fromkeys(values.tolist()))
+
+    def array(self, rows: int) -> np.ndarray:
+        "Return the values of the first rows as an array"
+        if self.kind != Kind.OBJECT:
+            return self.values[:rows].copy()
+        categories = np.empty(len(self.categories), dtype=object)
+        categories[:] = self.categories
+        return categories[self.values[:rows]]
+
+
+class ColumnBuffer:
+    """
+    A buffer of rows stored by column. Rows may be appended one at a
+    time or as data frames, columns are added as they are first seen
+    and a data frame is only constructed when it is requested.
+    """
+
+    __columns: Dict[str, Column]
+    rows: int
+    capacity: int
+
+    def __init__(self, capacity: int = 64):
+        """
+        Construct an empty buffer
+
+        Parameters
+        ----------
+        capacity: int
+            The number of rows to allocate space for initially
+        """
+        self.__columns = {}
+        self.rows = 0
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def columns(self) -> List[str]:
+        "The names of the columns in the order they were first seen"
+        return list(self.__columns)
+
+    def __reserve(self, rows: int):
+        "Ensure there is space for some more rows"
+        needed = self.rows + rows
+        if needed <= self.capacity:
+            return
+        while self.capacity < needed:
+            self.capacity *= 2
+        for column in self.__columns.values():
+            column.resize(self.capacity)
+
+    def __column(self, name: str, kind: Kind) -> Column:
+        "Find a column by name, adding it if it is new"
+        column = self.__columns.get(name)
+        if column is None:
+            column = Column(kind, self.capacity, self.rows)
+            self.__columns[name] = column
+        return column
+
+    def __finish(self, names: Collection[str], rows: int):
+        "Mark the columns without values in the new rows as missing"
+        if len(self.__columns) > len(names):
+            present = set(names)
+            for name, column in self.__columns.items():
+                if name not in present:
+                    column.fill(self.rows, self.rows + rows)
+        self.rows += rows
+
+    def append(self, row: Mapping[str, Any]):
+        """
+        Append a single row
+
+        Parameters
+        ----------
+        row: Mapping[str, Any]
+            A mapping from column names to values
+        """
+        self.__reserve(1)
+        for name, value in row.items():
+            kind = Kind.of_value(value)
+            self.__column(name, kind).set(self.rows, value, kind)
+        self.__finish(row.keys(), 1)
+
+    def extend(self, frame: pd.DataFrame):
+        """
+        Append every row of a data frame
+
+        Parameters
+        ----------
+        frame: pd.DataFrame
+            The rows to append
+        """
+        rows = len(frame.index)
+        self.__reserve(rows)
+        for name in frame.columns:
+            values = frame[name].to_numpy()
+            self.__column(name, Kind.of_array(values)).extend(
+                self.rows, values)
+        self.__finish(frame.columns, rows)
+
+    def distinct(self, name: str, start: int) -> List[Any]:
+        """
+        Return the distinct values of a column from a row onwards
+
+        Parameters
+        ----------
+        name: str
+            The name of the column
+        start: int
+            The first row to consider
+        """
+        return self.__columns[name].distinct(start, self.rows)
+
+    def clear(self):
+        "Remove every row and column"
+        self.__columns = {}
+        self.rows = 0
+
+    def frame(self) -> pd.DataFrame:
+        "Construct a data frame from the rows appended"
+        return pd.DataFrame({
+            name: column.array(self.rows)
+            for name, column in self.__columns.items()},
+            columns=self.columns)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""
+Compare two results aligned by depth
+"""
+
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+from .frame import RequiredFields, ConsistencyException
+from .instrument import stage
+
+
+# The largest difference in depth between rows that are compared
+TOLERANCE = 0.05
+
+# The suffixes of the columns of each result in an alignment
+SUFFIXES = ('_1', '_2')
+
+
+class Comparison:
+    """
+    A Comparison aligns the rows of two results by nearest depth,
+    within a tolerance, with a sorted merge and computes the difference
+    of every shared numeric column, the second result less the first.
+    Depths need not match exactly, so results whose depths were rounded
+    differently are still compared row by row.
+    """
+
+    columns: List[str]
+    tolerance: float
+    depths: np.ndarray  # NDArray[(N, 2), Float[64]]
+    differences: np.ndarray  # NDArray[(N, len(columns)), Float[64]]
+    first: np.ndarray  # NDArray[(N, len(columns)), Float[64]]
+    second: np.ndarray  # NDArray[(N, len(columns)), Float[64]]
+    rows: List[int]
+    matched: List[int]
+
+    def __init__(
+            self,
+            first: pd.DataFrame,
+            second: pd.DataFrame,
+            tolerance: float = TOLERANCE):
+        """
+        Align two results and compute their differences
+
+        Parameters
+        ----------
+        first: pd.DataFrame
+            The first result, with a depth column
+        second: pd.DataFrame
+            The second result, with a depth column
+        tolerance: float
+            The largest difference in depth between rows compared
+        """
+        self.tolerance = tolerance
+        with stage('align', 'rows') as timer:
+            depths, blocks = zip(*(self.__numeric(x) for x in [first, second]))
+            self.columns = [c for c in blocks[0] if c in blocks[1]]
+            keys = [
+                pd.DataFrame({'depth': depth, 'row': np.arange(len(depth))})
+                .dropna().sort_values('depth', kind='mergesort')
+                for depth in depths]
+            aligned = pd.merge_asof(
+                keys[0], keys[1].assign(other=keys[1]['depth']),
+                on='depth', direction='nearest', tolerance=tolerance,
+                suffixes=SUFFIXES).dropna()
+            rows = [
+                aligned['row' + s].to_numpy(dtype=np.int64)
+                for s in SUFFIXES]
+            self.rows = [len(first.index), len(second.index)]
+            self.matched = [len(rows[0]), len(np.unique(rows[1]))]
+            self.depths = aligned[['depth', 'other']].to_numpy()
+            self.first, self.second = (
+                block[self.columns].to_numpy(dtype=np.float64)[row]
+                for block, row in zip(blocks, rows))
+            self.differences = self.second - self.first
+            timer.count(len(rows[0]))
+
+    @staticmethod
+    def __numeric(result: pd.DataFrame) -> Tuple[np.ndarray, pd.DataFrame]:
+        "The depths and the other numeric columns of a result"
+        depth = RequiredFields.DEPTH.match_name(result.columns)
+        if depth is None:
+            raise ConsistencyException("Required column depth is missing")
+        columns = [
+            c for c in result.columns
+            if c != depth and result[c].dtype.kind in 'iuf']
+        return (
+            pd.to_numeric(result[depth], errors='coerce').to_numpy(
+                dtype=np.float64),
+            result[columns])
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Summarise the differences of each column over the aligned rows:
+        the number of rows compared, the mean difference (bias), the
+        root mean square difference, the largest absolute difference and
+        the correlation of the two results. Missing values are ignored.
+
+        Returns
+        -------
+        pd.DataFrame
+            A row for each column compared
+        """
+        valid = ~np.isnan(self.differences)
+        count = valid.sum(axis=0)
+        differences = np.where(valid, self.differences, 0.0)
+        centred = []
+        for values in [self.first, self.second]:
+            values = np.where(valid, values, 0.0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values -= values.sum(axis=0) / count
+            values[~valid] = 0.0
+            centred.append(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            bias = differences.sum(axis=0) / count
+            rmse = np.sqrt(
+                np.einsum('ij,ij->j', differences, differences) / count)
+            largest = np.where(count > 0, np.maximum(
+                differences.max(axis=0, initial=0.0),
+                -differences.min(axis=0, initial=0.0)), np.nan)
+            correlation = np.einsum('ij,ij->j', *centred) / np.sqrt(
+                np.einsum('ij,ij->j', centred[0], centred[0]) *
+                np.einsum('ij,ij->j', centred[1], centred[1]))
+        return pd.DataFrame({
+            'rows': count,
+            'bias': bias,
+            'rmse': rmse,
+            'max': largest,
+            'corr': correlation}, index=pd.Index(self.columns, name='column'))
+
+    def diff(self) -> pd.DataFrame:
+        """
+        Return the difference of each column for every aligned row,
+        with the depth of the row in each result
+
+        Returns
+        -------
+        pd.DataFrame
+            A row for each aligned pair of rows
+        """
+        diff = pd.DataFrame(self.differences, columns=self.columns)
+        for index, suffix in reversed(list(enumerate(SUFFIXES))):
+            diff.insert(
+                0, RequiredFields.DEPTH.value + suffix, self.depths[:, index])
+        return diff
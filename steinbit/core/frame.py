@@ -4,10 +4,17 @@
 Encapsulate frame types from sets of mappings
 """
 
-from typing import List, Tuple, Any, Dict, Iterable, Optional
+from typing import List, Tuple, Any, Dict, Iterable, Optional, Union
 from PIL import Image
 from .imagedataextractor import ImageDataExtractor
+from .mineralmap import MineralMap
+from .raster import Raster
+from .buffer import ColumnBuffer
+from .routing import PaletteIndex
+from .translation import Translation
+from .instrument import stage
 import math
+import numpy as np
 import pandas as pd
 from enum import Enum
 
@@ -27,12 +34,6 @@ class ConsistencyException(Exception):
     """
 
 
-class InvalidTranslationException(Exception):
-    """
-    Thrown if an invalid translation is supplied
-    """
-
-
 class RequiredFields(Enum):
     """
     Fields that absolutely must be included in the configuration
@@ -56,13 +57,23 @@ class RequiredFields(Enum):
 
 class Frame:
     """
-    A frame holds a list of Pandas Dataframes and a
+    A frame holds a list of column buffers and a
     list of extractors that are used to construct rows
-    in each frame.
+    in each buffer. Each buffer is only converted to a
+    Pandas Dataframe when a result is requested.
+
+    An extractor whose minerals are all among those of an
+    earlier extractor, such as a supplier palette, shares the
+    buffer of that extractor.
     """
 
-    data: List[pd.DataFrame]
+    data: List[ColumnBuffer]
     extractors: List[ImageDataExtractor]
+    sections: List[int]
+    router: Optional[PaletteIndex]
+    __consistent: List[Dict[RequiredFields, Any]]
+    __matched: List[Tuple[int, Dict[RequiredFields, Optional[str]]]]
+    __result: Optional[pd.DataFrame]
 
     def __init__(self, extractors: List[ImageDataExtractor]):
         """
@@ -77,7 +88,20 @@ class Frame:
             A non-empty list of image data extractors
         """
         self.extractors = extractors
-        self.data = [pd.DataFrame() for _ in self.extractors]
+        self.sections = []
+        for extractor in extractors:
+            minerals = set(extractor.minerals)
+            shared = [
+                i for i in dict.fromkeys(self.sections)
+                if minerals <= set(extractors[i].minerals)]
+            self.sections.append(shared[0] if shared else len(self.sections))
+        self.router = None
+        if len(extractors) > 1:
+            self.router = PaletteIndex([e.mapping for e in extractors])
+        self.data = [ColumnBuffer() for _ in self.extractors]
+        self.__consistent = [{} for _ in self.extractors]
+        self.__matched = [(0, {}) for _ in self.extractors]
+        self.__result = None
 
     def __eindex_by_cols(self, columns: List[str]):
         """
@@ -99,32 +123,68 @@ class Frame:
             else:
                 unmatched.append((idx, next((eset - cset).__iter__())))
         if matches:
-            return sorted(matches, key=lambda x: x[0])[0][1]
+            return self.sections[sorted(matches, key=lambda x: x[0])[0][1]]
         raise ColumnMismatchException(
             "Unmatched columns: {%s} not in [%s]" % (
                 ", ".join("%d: %s" % (i, v) for i, v in unmatched),
                 ", ".join(cset)))
 
-    def __check_frame(self):
-        """
-        Check consistency of frame
-        """
-        for column in RequiredFields.__members__.values():
-            for data in self.data:
-                if len(data.columns) == 0:
-                    continue
-                matched = column.match_name(data.columns)
-                if not matched:
-                    raise ConsistencyException(
-                        "Required column %s is missing" % column.value)
-                if not column.is_consistent():
-                    continue
-                items = data[matched].drop_duplicates()
-                if len(items) > 1:
-                    raise ConsistencyException(
-                        "%s is not consistent, values: [%s]" % (
-                            column.value,
-                            ", ".join(items.tolist())))
+    def __check_frame(self, index: int, start: int):
+        """
+        Check consistency of the rows appended to a section of the
+        frame from a given row onwards
+
+        Parameters
+        ----------
+        index: int
+            The section of the frame rows were appended to
+        start: int
+            The first row appended
+        """
+        data = self.data[index]
+        consistent = self.__consistent[index]
+        columns = data.columns
+        if self.__matched[index][0] != len(columns):
+            self.__matched[index] = (len(columns), {
+                x: x.match_name(columns)
+                for x in RequiredFields.__members__.values()})
+        for column, matched in self.__matched[index][1].items():
+            if not matched:
+                raise ConsistencyException(
+                    "Required column %s is missing" % column.value)
+            if not column.is_consistent():
+                continue
+            items = data.distinct(matched, start)
+            if column in consistent:
+                items = [consistent[column]] + [
+                    x for x in items if x != consistent[column]]
+            if len(items) > 1:
+                raise ConsistencyException(
+                    "%s is not consistent, values: [%s]" % (
+                        column.value,
+                        ", ".join(str(x) for x in items)))
+            consistent[column] = items[0]
+
+    def __append(self, index: int, rows: Any):
+        """
+        Append a row or a data frame to a section of the frame
+
+        Parameters
+        ----------
+        index: int
+            The section of the frame to append to
+        rows: Any
+            A mapping from column names to values or a data frame
+        """
+        with stage('append', 'rows') as timer:
+            start = len(self.data[index])
+            if isinstance(rows, pd.DataFrame):
+                self.data[index].extend(rows)
+            else:
+                self.data[index].append(rows)
+            self.__result = None
+            self.__check_frame(index, start)
+            timer.count(len(self.data[index]) - start)
 
     @staticmethod
     def __sq_diff(value):
@@ -158,8 +218,7 @@ class Frame:
         index = self.__eindex_by_cols(row.columns)
         if RequiredFields.BACKGROUND.value not in row.columns:
             self.add_background(row, index)
-        self.data[index] = self.data[index].append(row)
-        self.__check_frame()
+        self.__append(index, row)
 
     def __min_error_index(self, counts: List[Tuple[float, Any]]):
         """
@@ -172,58 +231,156 @@ class Frame:
             for i, c in enumerate(counts)]
         return errors.index(min(errors))
 
-    def append_image(self, image_data: Image):
+    def describe(
+            self,
+            image_data: Image
+            ) -> Tuple[List[Tuple[float, Dict[str, int]]], Dict[str, Any]]:
         """
-        Append an image
+        Score an image against the extractors it is routed to and read
+        its metadata, without appending it
 
         Parameters
         ----------
         image: Image
-            An image to be appended
+            An image to be described
+
+        Returns
+        -------
+        Tuple[List[Tuple[float, Dict[str, int]]], Dict[str, Any]]
+            The composition from each extractor, with an infinite error
+            for those not scored, and the metadata read by the
+            extractor that fits best
+        """
+        results = ImageDataExtractor.compositions(
+            image_data, self.extractors, self.router)
+        index = self.__min_error_index(results)
+        return results, self.extractors[index].metadata(image_data)
+
+    def map(
+            self,
+            image_data: Union[Image.Image, Raster]
+            ) -> Tuple[Tuple[List[Tuple[float, Dict[str, int]]],
+                             Dict[str, Any]], MineralMap]:
+        """
+        Describe an image as describe does and make its mineral map in
+        the same pass, classifying each pixel once with every extractor
+        it is routed to. The composition from each extractor is counted
+        from its map, and the map of the extractor that fits best is
+        the one returned.
+
+        Parameters
+        ----------
+        image: Union[Image.Image, Raster]
+            An image or raster to be described and mapped
+
+        Returns
+        -------
+        Tuple[Tuple[List[Tuple[float, Dict[str, int]]], Dict[str, Any]],
+              MineralMap]
+            The description of the image, as from describe, and the
+            mineral map of the image from the extractor that fits best
         """
-        results = [e.composition(image_data) for e in self.extractors]
+        info = MineralMap.image_info(image_data)
+        maps: List[Optional[MineralMap]] = []
+        results: List[Tuple[float, Dict[str, int]]] = []
+        for extractor, (error, indices) in zip(
+                self.extractors, ImageDataExtractor.classify(
+                    image_data, self.extractors, self.router)):
+            if indices is None:
+                maps.append(None)
+                results.append((error, {}))
+                continue
+            with stage('count'):
+                mineral_map = MineralMap(indices, extractor.minerals, info)
+                counts = mineral_map.counts()
+            maps.append(mineral_map)
+            used = np.flatnonzero(counts)
+            last = used[-1] + 1 if len(used) else 0
+            results.append(
+                (error, dict(zip(extractor.minerals, counts[:last]))))
         index = self.__min_error_index(results)
-        fields = self.extractors[index].metadata(image_data)
+        best = maps[index]
+        assert best is not None
+        return (results, self.extractors[index].metadata(image_data)), best
+
+    def append_scores(
+            self,
+            results: List[Tuple[float, Dict[str, int]]],
+            fields: Dict[str, Any]):
+        """
+        Append an image that has already been described
 
+        Parameters
+        ----------
+        results: List[Tuple[float, Dict[str, int]]]
+            The composition from each extractor
+        fields: Dict[str, Any]
+            The image metadata
+        """
+        index = self.__min_error_index(results)
+        section = self.sections[index]
         row: Dict[str, Any] = {}
+        if section != index:
+            row.update(dict.fromkeys(self.extractors[section].minerals, 0))
         row.update(results[index][1])
         row.update(fields)
         if RequiredFields.BACKGROUND.value not in row:
             row[RequiredFields.BACKGROUND.value] = 0
-        self.data[index] = self.data[index].append(row, ignore_index=True)
-        self.__check_frame()
+        self.__append(section, row)
 
-    def apply_translation(self, translation: pd.DataFrame):
+    def append_image(self, image_data: Image):
+        """
+        Append an image
+
+        Parameters
+        ----------
+        image: Image
+            An image to be appended
+        """
+        self.append_scores(*self.describe(image_data))
+
+    def apply_translation(
+            self,
+            translation: Union[Translation, pd.DataFrame]):
         """
         Apply a translation matrix to reduce one form of
         extraction to another.
 
         Parameters
         ----------
-        translation: pd.DataFrame
-            A translation such that for a pair of extractors
-            each element in one extractor is injectively mapped to some
-            element in the other.
-        """
-        if len(translation.columns) != 2:
-            raise InvalidTranslationException()
-        source_columns = translation[translation.columns[1]].tolist()
-        source = self.__eindex_by_cols(source_columns)
-        target_columns = translation[translation.columns[0]].tolist()
-        target = self.__eindex_by_cols(target_columns)
-
-        df = self.data[source]
-        grouped = translation.groupby(by=translation.columns[0])
-        extra = [c for c in df.columns if c not in source_columns]
-        result = pd.DataFrame()
-        result[extra] = df[extra]
-        for reduced, basic in grouped:
-            result[reduced] = sum(
-                    df[b[2]]
-                    for b in basic.itertuples()
-                    if b[2] in df.columns)
-        self.data[target] = self.data[target].append(result)
-        self.data[source].drop(df.index, inplace=True)
+        translation: Union[Translation, pd.DataFrame]
+            A compiled translation, or a table to compile, such that for
+            a pair of extractors each element in one extractor is
+            injectively mapped to some element in the other.
+        """
+        if not isinstance(translation, Translation):
+            translation = Translation(translation)
+        source = self.__eindex_by_cols(translation.detailed)
+        target = self.__eindex_by_cols(translation.reduced)
+
+        with stage('translate', 'rows') as timer:
+            result = translation.translate_frame(self.data[source].frame())
+            self.data[target].extend(result)
+            timer.count(len(result.index))
+        self.data[source].clear()
+        self.__consistent[source] = {}
+        self.__matched[source] = (0, {})
+        self.__result = None
+
+    def order_by_depth(self):
+        """
+        Sort the rows of each section of the frame by depth, keeping
+        rows at the same depth in the order they were appended
+        """
+        for data in self.data:
+            if len(data) == 0:
+                continue
+            df = data.frame()
+            depth = RequiredFields.DEPTH.match_name(df.columns)
+            df = df.sort_values(depth, kind='mergesort')
+            data.clear()
+            data.extend(df)
+        self.__result = None
 
     def requires_translation(self) -> bool:
         """
@@ -234,14 +391,34 @@ class Frame:
             True, if there are multiple types of data and a translation
             must be performed
         """
-        return sum(1 for x in self.data if len(x.index) > 0) > 1
+        return sum(1 for x in self.data if len(x) > 0) > 1
 
     def result(self) -> pd.DataFrame:
         """
         Return the final resulting dataframe after all translations
-        have been applied
+        have been applied. The dataframe is constructed on the first
+        call and the same dataframe is returned until more rows are
+        appended.
+        """
+        if self.__result is None:
+            self.__result = [x for x in self.data if len(x) > 0][0].frame()
+        return self.__result
+
+    def take(self) -> pd.DataFrame:
+        """
+        Return the rows appended since they were last taken, as result
+        does, and remove them from the frame. The values of consistent
+        fields are kept, so that rows appended afterwards must still
+        agree with the rows taken.
         """
-        return [x for x in self.data if len(x.index) > 0][0]
+        result = self.result()
+        for data in self.data:
+            data.clear()
+        self.__result = None
+        return result
+
+    def __len__(self) -> int:
+        return sum(len(x) for x in self.data)
 
     def minerals(self) -> List[str]:
         """
@@ -249,4 +426,4 @@ class Frame:
         """
         return [x.minerals
                 for x, d in zip(self.extractors, self.data)
-                if len(d.index) > 0][0]
+                if len(d) > 0][0]
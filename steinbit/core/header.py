@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""
+Image metadata read from file headers without decoding any pixels
+"""
+
+from typing import BinaryIO, Dict, Any
+import struct
+import zlib
+from PIL import Image
+from .raster import Raster
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# The PNG chunks holding text, which may come before or after the pixels
+PNG_TEXT = [b'tEXt', b'zTXt', b'iTXt']
+
+
+def png_text(handle: BinaryIO) -> Dict[str, str]:
+    """
+    Read the text items of a PNG file, seeking past the image data
+    rather than reading it, as PIL only finds the items after the image
+    data once the pixels are decoded
+
+    Parameters
+    ----------
+    handle: BinaryIO
+        A PNG file open for reading, just after its signature
+
+    Returns
+    -------
+    Dict[str, str]
+        The value of each text item by its keyword
+    """
+    text = {}
+    while True:
+        header = handle.read(8)
+        if len(header) < 8:
+            break
+        length, kind = struct.unpack('>I4s', header)
+        if kind == b'IEND':
+            break
+        if kind not in PNG_TEXT:
+            handle.seek(length + 4, 1)
+            continue
+        data = handle.read(length)
+        handle.seek(4, 1)
+        key, _, value = data.partition(b'\0')
+        if kind == b'tEXt':
+            text[key.decode('latin-1')] = value.decode('latin-1')
+        elif kind == b'zTXt':
+            text[key.decode('latin-1')] = zlib.decompress(
+                value[1:]).decode('latin-1')
+        else:
+            compressed, value = value[0], value[2:]
+            value = value.split(b'\0', 2)[-1]
+            if compressed:
+                value = zlib.decompress(value)
+            text[key.decode('latin-1')] = value.decode('utf-8')
+    return text
+
+
+def read_info(filepath: str) -> Dict[str, Any]:
+    """
+    Read the metadata of an image, as found in the info of the image
+    once it is loaded, from the header of the file alone. Rasters are
+    described by their sidecars and PNG files by their text items,
+    wherever they are in the file. Other images give the metadata PIL
+    reads when opening them, before any pixels are decoded.
+
+    Parameters
+    ----------
+    filepath: str
+        An image or raster file
+
+    Returns
+    -------
+    Dict[str, Any]
+        The metadata items of the image
+    """
+    if Raster.supports(filepath):
+        return Raster.sidecar(filepath)
+    with open(filepath, 'rb') as handle:
+        if handle.read(len(PNG_SIGNATURE)) == PNG_SIGNATURE:
+            return png_text(handle)
+    with Image.open(filepath) as image:
+        return {k: v for k, v in image.info.items() if isinstance(k, str)}
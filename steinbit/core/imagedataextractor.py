@@ -4,11 +4,74 @@
 Image transformations and statistics
 """
 
-from typing import Dict, List, Tuple, Optional, Union
+from typing import (
+    Any, Dict, List, Tuple, Optional, Union, Iterator, TYPE_CHECKING
+)
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
 from .types import ColourMapping, Field
+from .lookup import ColourLookup, Tally
+from .tiles import raw_tiles, strips, TILE_BUDGET
+from .routing import PaletteIndex
+from .raster import Raster
+from .instrument import stage
 from PIL import Image
+from enum import Enum
+import itertools
+import math
+
+if TYPE_CHECKING:
+    from sklearn.neighbors import NearestNeighbors
+
+
+# Images with more distinct colours than this are classified per pixel
+HISTOGRAM_LIMIT = 1 << 16
+
+# The number of pixels classified at a time when scoring several mappings
+CHUNK = 1 << 20
+
+
+def pixel_rows(
+        image: Union[Image.Image, Raster],
+        budget: int = TILE_BUDGET) -> Iterator[np.ndarray]:
+    """
+    Pack the pixels of an image or raster into 24-bit colour values a
+    block of whole rows at a time, from the top of the image down, so
+    that the parts follow one another in the order of the pixels
+
+    Parameters
+    ----------
+    image: Union[Image.Image, Raster]
+        The image or raster to pack
+    budget: int
+        The largest number of pixels to pack at a time
+
+    Returns
+    -------
+    Iterator[np.ndarray]
+        Flat arrays of packed colours which together cover the image
+    """
+    if isinstance(image, Raster):
+        yield from image.strips(budget)
+        return
+    width = image.size[0]
+    tiles = raw_tiles(image)
+    if tiles is not None:
+        boxes = [x[0] for x in tiles]
+        if any(x[0] != 0 or x[2] != width for x in boxes) or \
+                [x[1] for x in boxes] != sorted(x[1] for x in boxes):
+            yield ColourLookup.pack(image)
+            return
+    yield from strips(image, budget)
+
+
+class CompositionMode(Enum):
+    """
+    Methods of classifying the pixels of an image
+    """
+    LOOKUP = 'lookup'
+    HISTOGRAM = 'histogram'
+    TILED = 'tiled'
+    NEIGHBOURS = 'neighbours'
 
 
 class ImageDataExtractor:
@@ -18,13 +81,18 @@ class ImageDataExtractor:
     """
 
     minerals: List[str]
-    __neighbours: NearestNeighbors
+    mapping: ColourMapping
+    mode: CompositionMode
+    budget: int
+    __neighbours: Optional['NearestNeighbors']
     fields: Dict[str, Field]
 
     def __init__(
             self,
             mapping: ColourMapping,
-            fields: Optional[Dict[str, Field]] = None):
+            fields: Optional[Dict[str, Field]] = None,
+            mode: CompositionMode = CompositionMode.LOOKUP,
+            budget: int = TILE_BUDGET):
         """
         Construct the extractor using a colour mapping appropriate
         to the images to be supplied. The mapping should assign a
@@ -34,9 +102,25 @@ class ImageDataExtractor:
         ----------
         mapping :
             A mapping between minerals and colours
+        fields :
+            Metadata fields to extract from each image
+        mode :
+            The method used to classify pixels: a lookup table by
+            default, a lookup of each distinct colour weighted by its
+            pixel count, a lookup of the image a tile at a time or a
+            nearest neighbour search
+        budget :
+            The largest number of pixels classified at a time in
+            tiled mode
         """
-        self.__neighbours = NearestNeighbors(n_neighbors=1)
-        self.__neighbours.fit(mapping.colours)
+        self.__neighbours = None
+        if mode == CompositionMode.NEIGHBOURS:
+            from sklearn.neighbors import NearestNeighbors
+            self.__neighbours = NearestNeighbors(n_neighbors=1)
+            self.__neighbours.fit(mapping.colours)
+        self.mapping = mapping
+        self.mode = mode
+        self.budget = budget
         self.minerals = list(mapping.minerals)
         self.fields = fields or {}
 
@@ -48,7 +132,7 @@ class ImageDataExtractor:
         Parameters
         ----------
         image:
-            An image with colours in the mapping
+            An image or raster with colours in the mapping
 
         Returns
         -------
@@ -56,14 +140,223 @@ class ImageDataExtractor:
             A tuple of the RMS error in the translation and a mapping from
             mineral names to counts
         """
-        data = image.convert('RGB').tobytes()
-        array = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
-        distances, indices = self.__neighbours.kneighbors(array)
+        return ImageDataExtractor.compositions(image, [self])[0]
+
+    def __neighbour_composition(
+            self, image: Image) -> Tuple[float, Dict[str, int]]:
+        """
+        Find the composition of an image by a nearest neighbour
+        search over every pixel
+        """
+        with stage('convert', 'pixels') as timer:
+            if isinstance(image, Raster):
+                array = image.rgb()
+            else:
+                data = image.convert('RGB').tobytes()
+                array = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+            timer.count(len(array))
+        neighbours = self.__neighbours
+        assert neighbours is not None
+        with stage('classify', 'pixels') as timer:
+            distances, indices = neighbours.kneighbors(array)
+            timer.count(len(array))
         counts = np.bincount(indices.flatten())
         mapping = dict(zip(self.minerals, counts))
         error = np.sqrt(np.mean(np.square(distances.flatten())))
         return error, mapping
 
+    @staticmethod
+    def __timed(
+            parts: Iterator[np.ndarray]
+            ) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray]]]:
+        "Time the reading and packing of each part of a streamed image"
+        while True:
+            with stage('convert', 'pixels') as timer:
+                packed = next(parts, None)
+                if packed is not None:
+                    timer.count(len(packed))
+            if packed is None:
+                return
+            yield packed, None
+
+    @staticmethod
+    def __parts(
+            image: Image,
+            extractors: List['ImageDataExtractor'],
+            pixels: bool = False
+            ) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray]]]:
+        """
+        Split an image into parts to classify, as packed colours and
+        optionally the number of pixels of each colour. The parts are
+        streamed from the image in tiled mode, taken from the colour
+        histogram in histogram mode and otherwise the whole image is a
+        single part. Rasters are always streamed from the array. If
+        pixels is true the histogram is never used and the parts follow
+        one another in the order of the pixels.
+        """
+        if not extractors:
+            return
+        modes = set(e.mode for e in extractors)
+        if isinstance(image, Raster):
+            budget = CHUNK
+            if CompositionMode.TILED in modes:
+                budget = min(e.budget for e in extractors)
+            yield from ImageDataExtractor.__timed(image.strips(budget))
+            return
+        if CompositionMode.TILED in modes:
+            budget = min(e.budget for e in extractors)
+            yield from ImageDataExtractor.__timed(
+                pixel_rows(image, budget) if pixels
+                else strips(image, budget))
+            return
+        if getattr(image, 'tile', None):
+            with stage('decode'):
+                image.load()
+        if CompositionMode.HISTOGRAM in modes and not pixels:
+            with stage('convert', 'pixels') as timer:
+                histogram = ColourLookup.histogram(image, HISTOGRAM_LIMIT)
+                if histogram is not None:
+                    timer.count(int(histogram[1].sum()))
+            if histogram is not None:
+                yield histogram
+                return
+        with stage('convert', 'pixels') as timer:
+            packed = ColourLookup.pack(image)
+            timer.count(len(packed))
+        yield packed, None
+
+    @staticmethod
+    def compositions(
+            image: Image,
+            extractors: List['ImageDataExtractor'],
+            index: Optional[PaletteIndex] = None
+            ) -> List[Tuple[float, Dict[str, int]]]:
+        """
+        Find the composition of an image for several extractors at once.
+        The image is converted once and each part of it is classified
+        against every lookup table in turn, so the pixels are only
+        traversed a single time whatever the number of extractors.
+
+        Parameters
+        ----------
+        image:
+            An image or raster with colours in the mappings
+        extractors:
+            The extractors to score the image with
+        index:
+            An index of the extractor mappings. If given, the image is
+            only scored with the extractors it is routed to, from a
+            sample of the first part of the image, and the others are
+            given an infinite error and no composition.
+
+        Returns
+        -------
+        List[Tuple[float, Dict[str, int]]]
+            The composition from each extractor, as returned by
+            composition
+        """
+        parts = ImageDataExtractor.__parts(image, [
+            e for e in extractors if e.__neighbours is None])
+        first = next(parts, None)
+        chosen = set(range(len(extractors)))
+        if index is not None and first is not None:
+            with stage('route'):
+                chosen = set(index.route(*first))
+
+        tallies = {
+            i: Tally(e.mapping.lookup())
+            for i, e in enumerate(extractors)
+            if i in chosen and e.__neighbours is None}
+        if first is not None:
+            parts = itertools.chain([first], parts)
+        for packed, weights in parts:
+            with stage('classify', 'pixels') as timer:
+                timer.count(
+                    len(packed) if weights is None else int(weights.sum()))
+                for start in range(0, len(packed), CHUNK):
+                    stop = start + CHUNK
+                    chunk = None if weights is None else weights[start:stop]
+                    for tally in tallies.values():
+                        tally.add(packed[start:stop], chunk)
+
+        results = []
+        for i, extractor in enumerate(extractors):
+            if i in tallies:
+                error, counts = tallies[i].result()
+                results.append((error, dict(zip(extractor.minerals, counts))))
+            elif i in chosen:
+                results.append(extractor.__neighbour_composition(image))
+            else:
+                results.append((math.inf, {}))
+        return results
+
+    @staticmethod
+    def classify(
+            image: Union[Image.Image, Raster],
+            extractors: List['ImageDataExtractor'],
+            index: Optional[PaletteIndex] = None
+            ) -> List[Tuple[float, Optional[np.ndarray]]]:
+        """
+        Classify every pixel of an image for several extractors at once,
+        as compositions does, keeping the index of the colour each pixel
+        is nearest to in each mapping instead of counting them. Every
+        extractor, whatever its mode, classifies with its lookup table
+        and the image is converted a pixel at a time, never through its
+        histogram, so that the indices are in the order of the pixels.
+
+        Parameters
+        ----------
+        image:
+            An image or raster with colours in the mappings
+        extractors:
+            The extractors to classify the image with
+        index:
+            An index of the extractor mappings, routing the image to
+            the extractors it is classified with as compositions does
+
+        Returns
+        -------
+        List[Tuple[float, Optional[np.ndarray]]]
+            The RMS error from each extractor and the (H, W) array of
+            the index of each pixel into its mapping, or an infinite
+            error and None for the extractors not routed to
+        """
+        parts = ImageDataExtractor.__parts(image, extractors, True)
+        first = next(parts, None)
+        chosen = set(range(len(extractors)))
+        if index is not None and first is not None:
+            with stage('route'):
+                chosen = set(index.route(*first))
+
+        width, height = image.size
+        lookups = {
+            i: e.mapping.lookup()
+            for i, e in enumerate(extractors) if i in chosen}
+        indices = {
+            i: np.empty(width * height, dtype=x.indices.dtype)
+            for i, x in lookups.items()}
+        squared = dict.fromkeys(lookups, 0.0)
+        if first is not None:
+            parts = itertools.chain([first], parts)
+        position = 0
+        for packed, _ in parts:
+            with stage('classify', 'pixels') as timer:
+                timer.count(len(packed))
+                for start in range(0, len(packed), CHUNK):
+                    chunk = packed[start:start + CHUNK]
+                    stop = position + len(chunk)
+                    for i, lookup in lookups.items():
+                        indices[i][position:stop] = lookup.indices[chunk]
+                        squared[i] += lookup.distances[chunk].sum(
+                            dtype=np.float64)
+                    position = stop
+
+        return [
+            (np.sqrt(squared[i] / position),
+             indices[i].reshape(height, width)) if i in lookups
+            else (math.inf, None)
+            for i in range(len(extractors))]
+
     def metadata(self, image: Image) -> Dict[str, Optional[Union[str, float]]]:
         """
         Extract the metadata from the image's exif data. Metadata is
@@ -89,11 +382,31 @@ class ImageDataExtractor:
         Dict[str, Optional[Any]]
             A dictionary of metadata items
         """
-        if 'Description' not in image.info:
+        return self.parse_metadata(image.info)
+
+    def parse_metadata(
+            self,
+            info: Dict[str, Any]) -> Dict[str, Optional[Union[str, float]]]:
+        """
+        Extract the metadata fields from the info of an image, as
+        metadata does, for info read without opening the image
+
+        Parameters
+        ----------
+        info: Dict[str, Any]
+            The metadata items of an image
+
+        Returns
+        -------
+        Dict[str, Optional[Any]]
+            A dictionary of metadata items
+        """
+        if 'Description' not in info:
             return {}
-        items = image.info['Description'].split(';')
-        metadata = {k.strip("' \t\v"): v[0].strip("' \t\v")
-                    for k, *v in
-                    [i.split(':') for i in items]
-                    if len(v) == 1}
-        return {k: v.extract(metadata) for k, v in self.fields.items()}
+        with stage('metadata'):
+            items = info['Description'].split(';')
+            metadata = {k.strip("' \t\v"): v[0].strip("' \t\v")
+                        for k, *v in
+                        [i.split(':') for i in items]
+                        if len(v) == 1}
+            return {k: v.extract(metadata) for k, v in self.fields.items()}
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+"""
+Timing and memory instrumentation of the stages of processing
+"""
+
+from typing import Dict, List, Any, Optional
+import threading
+import time
+import tracemalloc
+import numpy as np
+
+
+class Stage:
+    """
+    The totals for a stage: the wall time spent in it, the number of
+    times it was entered, the number of items, such as pixels or rows,
+    it processed and the largest amount of memory allocated within it
+    """
+
+    seconds: float
+    calls: int
+    items: int
+    unit: Optional[str]
+    peak: int
+    latencies: Optional[List[float]]
+
+    def __init__(self, unit: Optional[str] = None, latency: bool = False):
+        self.seconds = 0.0
+        self.calls = 0
+        self.items = 0
+        self.unit = unit
+        self.peak = 0
+        self.latencies = [] if latency else None
+
+    def merge(self, other: 'Stage'):
+        "Add the totals of another stage to this one"
+        self.seconds += other.seconds
+        self.calls += other.calls
+        self.items += other.items
+        self.unit = self.unit or other.unit
+        self.peak = max(self.peak, other.peak)
+        if other.latencies is not None:
+            self.latencies = (self.latencies or []) + other.latencies
+
+    def report(self) -> Dict[str, Any]:
+        "Summarise the stage"
+        report: Dict[str, Any] = {
+            'seconds': self.seconds,
+            'calls': self.calls,
+            'peak_mb': self.peak / (1 << 20)}
+        if self.unit:
+            report[self.unit] = self.items
+            report['%s_per_second' % self.unit] = (
+                self.items / self.seconds if self.seconds else None)
+        if self.latencies:
+            latencies = np.array(self.latencies)
+            report['latency'] = {
+                'mean': float(latencies.mean()),
+                'p50': float(np.percentile(latencies, 50)),
+                'p90': float(np.percentile(latencies, 90)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(latencies.max())}
+        return report
+
+
+class Timer:
+    """
+    A single entry into a stage, used as a context manager
+    """
+
+    stage: Stage
+    profiler: 'Profiler'
+    start: float
+    base: int
+    peak: int
+
+    def __init__(self, profiler: 'Profiler', stage: Stage):
+        self.profiler = profiler
+        self.stage = stage
+        self.peak = 0
+
+    def count(self, items: int):
+        "Record items processed in the stage"
+        self.stage.items += items
+
+    def __enter__(self) -> 'Timer':
+        if self.profiler.memory:
+            self.profiler.enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        with self.profiler.lock:
+            self.stage.seconds += elapsed
+            self.stage.calls += 1
+            if self.stage.latencies is not None:
+                self.stage.latencies.append(elapsed)
+        if self.profiler.memory:
+            self.profiler.exit(self)
+
+
+class NullTimer:
+    """
+    A stage entered while instrumentation is off, which does nothing
+    """
+
+    def count(self, items: int):
+        pass
+
+    def __enter__(self) -> 'NullTimer':
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class Profiler:
+    """
+    The Profiler collects the totals of every stage. Memory is traced
+    with tracemalloc; the peak of each stage is measured from the memory
+    in use when it was entered. Where tracemalloc cannot reset its peak
+    the peak of a stage is the highest since profiling began. Stages may
+    be entered from several threads; each thread nests its own stages,
+    but the memory of stages running at the same time is not separated.
+    """
+
+    stages: Dict[str, Stage]
+    memory: bool
+    started: float
+    lock: threading.Lock
+    __local: threading.local
+
+    def __init__(self, memory: bool = True):
+        """
+        Start profiling
+
+        Parameters
+        ----------
+        memory: bool
+            Trace memory allocations as well as time
+        """
+        self.stages = {}
+        self.memory = memory
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.__local = threading.local()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def timer(
+            self,
+            name: str,
+            unit: Optional[str] = None,
+            latency: bool = False) -> Timer:
+        "Return a timer for an entry into a stage"
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = Stage(unit, latency)
+        return Timer(self, stage)
+
+    @property
+    def __stack(self) -> List[Timer]:
+        "The stages entered by the current thread"
+        if not hasattr(self.__local, 'stack'):
+            self.__local.stack = []
+        return self.__local.stack
+
+    def enter(self, timer: Timer):
+        "Start measuring the memory of a stage"
+        current, peak = tracemalloc.get_traced_memory()
+        if self.__stack:
+            parent = self.__stack[-1]
+            parent.peak = max(parent.peak, peak)
+        timer.base = current
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self.__stack.append(timer)
+
+    def exit(self, timer: Timer):
+        "Finish measuring the memory of a stage"
+        peak = max(timer.peak, tracemalloc.get_traced_memory()[1])
+        self.__stack.pop()
+        if self.__stack:
+            parent = self.__stack[-1]
+            parent.peak = max(parent.peak, peak)
+        timer.stage.peak = max(timer.stage.peak, peak - timer.base)
+
+    def take(self) -> Dict[str, Stage]:
+        "Return the stages measured so far and start afresh"
+        with self.lock:
+            stages = self.stages
+            self.stages = {}
+        return stages
+
+    def merge(self, stages: Dict[str, Stage]):
+        "Add stages measured elsewhere, such as in a worker process"
+        with self.lock:
+            for name, stage in stages.items():
+                if name in self.stages:
+                    self.stages[name].merge(stage)
+                else:
+                    self.stages[name] = stage
+
+    def report(self) -> Dict[str, Any]:
+        "Summarise every stage"
+        return {
+            'seconds': time.perf_counter() - self.started,
+            'memory': self.memory,
+            'stages': {
+                name: stage.report() for name, stage in self.stages.items()}}
+
+    def stop(self):
+        "Stop tracing memory"
+        if self.memory:
+            tracemalloc.stop()
+
+
+# The profiler in use, if instrumentation is on
+PROFILER: Optional[Profiler] = None
+
+
+def start(memory: bool = True) -> Profiler:
+    """
+    Turn instrumentation on
+
+    Parameters
+    ----------
+    memory: bool
+        Trace memory allocations as well as time
+    """
+    global PROFILER
+    PROFILER = Profiler(memory)
+    return PROFILER
+
+
+def stop() -> Optional[Profiler]:
+    "Turn instrumentation off, returning the profiler that was in use"
+    global PROFILER
+    profiler, PROFILER = PROFILER, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+def stage(name: str, unit: Optional[str] = None, latency: bool = False):
+    """
+    Measure a stage of processing, used as a context manager. When
+    instrumentation is off a shared timer that does nothing is returned.
+
+    Parameters
+    ----------
+    name: str
+        The name of the stage
+    unit: Optional[str]
+        The name of the items the stage processes, counted with the
+        count method of the timer
+    latency: bool
+        Keep the time of each entry, to report percentiles
+
+    >>> with stage('decode', 'pixels') as timer:
+    ...     timer.count(100)
+    """
+    if PROFILER is None:
+        return NULL_TIMER
+    return PROFILER.timer(name, unit, latency)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+
+"""
+Precomputed nearest-colour lookup tables
+"""
+
+from typing import Tuple, Optional
+import hashlib
+import os
+import tempfile
+import numpy as np
+from PIL import Image
+
+
+COLOURS = 1 << 24
+BLOCK = 16
+
+
+class ColourLookup:
+    """
+    The ColourLookup class holds, for every possible 24-bit colour,
+    the index of the nearest colour in a mapping and the squared
+    distance to it. Colours are packed little-endian, i.e. as
+    ``r | g << 8 | b << 16``, which is the layout of an RGBX buffer
+    read as 32-bit words.
+
+    Where a colour is equidistant from several mapping colours the
+    one appearing first in the mapping is chosen. Distances are kept
+    as 16-bit integers when the furthest colour is close enough.
+    """
+
+    size: int
+    indices: np.ndarray  # NDArray[(2**24,), UInt[8 | 16]]
+    distances: np.ndarray  # NDArray[(2**24,), UInt[16 | 32]]
+
+    def __init__(self, colours: np.ndarray):
+        """
+        Build the lookup table for a set of colours
+
+        Parameters
+        ----------
+        colours: np.ndarray
+            An (N, 3) array of R, G, B colours
+        """
+        colours = np.asarray(colours, dtype=np.int32).reshape(-1, 3)
+        count = len(colours)
+        dtype = np.uint8 if count <= 256 else np.uint16
+        indices = np.empty((256, 256, 256), dtype=dtype)
+        distances = np.empty((256, 256, 256), dtype=np.uint32)
+
+        # Squared distance along each channel for every channel value,
+        # in table order: blue, green, red
+        squares = np.square(
+            np.arange(256)[None, :, None] - colours.T[::-1, None, :])
+        candidates = ColourLookup.__candidates(colours[:, ::-1])
+        blocks = 256 // BLOCK
+        for block in np.ndindex(blocks, blocks, blocks):
+            slices = tuple(slice(x * BLOCK, (x + 1) * BLOCK) for x in block)
+            nearest = np.flatnonzero(candidates[block])
+            distance = (
+                squares[0, slices[0]][:, None, None, nearest] +
+                squares[1, slices[1]][None, :, None, nearest] +
+                squares[2, slices[2]][None, None, :, nearest])
+            choice = distance.argmin(axis=-1)
+            indices[slices] = nearest[choice]
+            distances[slices] = np.take_along_axis(
+                distance, choice[..., None], axis=-1)[..., 0]
+
+        self.size = count
+        self.indices = indices.reshape(-1)
+        self.distances = distances.reshape(-1)
+        if self.distances.max() <= np.iinfo(np.uint16).max:
+            self.distances = self.distances.astype(np.uint16)
+
+    @classmethod
+    def stored(cls, colours: np.ndarray, directory: str) -> 'ColourLookup':
+        """
+        Return the lookup table for a set of colours from a directory of
+        stored tables, memory mapped so that every process using it
+        shares the one copy. The table is built and stored first if it
+        is not there, and its files are touched when it is used, so the
+        cache can remove the least recently used tables.
+
+        Parameters
+        ----------
+        colours: np.ndarray
+            An (N, 3) array of R, G, B colours
+        directory: str
+            The directory holding the stored tables
+
+        Returns
+        -------
+        ColourLookup
+            The lookup table
+        """
+        colours = np.asarray(colours, dtype=np.int32).reshape(-1, 3)
+        path = os.path.join(
+            directory, hashlib.sha256(colours.tobytes()).hexdigest())
+        suffixes = ['.indices.npy', '.distances.npy']
+        try:
+            lookup = cls.__new__(cls)
+            lookup.size = len(colours)
+            lookup.indices, lookup.distances = (
+                np.load(path + suffix, mmap_mode='r')
+                for suffix in suffixes)
+        except (OSError, ValueError):
+            pass
+        else:
+            for suffix in suffixes:
+                try:
+                    os.utime(path + suffix)
+                except OSError:
+                    pass
+            return lookup
+        lookup = cls(colours)
+        os.makedirs(directory, exist_ok=True)
+        for suffix, table in [
+                ('.distances.npy', lookup.distances),
+                ('.indices.npy', lookup.indices)]:
+            with tempfile.NamedTemporaryFile(
+                    dir=directory, suffix='.tmp', delete=False) as handle:
+                np.save(handle, table)
+            os.replace(handle.name, path + suffix)
+        return lookup
+
+    @staticmethod
+    def __candidates(colours: np.ndarray) -> np.ndarray:
+        """
+        Find the colours that could be nearest to some point in each
+        block of the colour cube. A colour is a candidate if its
+        closest approach to the block is no further than the furthest
+        approach of the best colour, so every colour that can be, or
+        tie for, the nearest is included.
+
+        Parameters
+        ----------
+        colours: np.ndarray
+            An (N, 3) array of colours in table channel order
+
+        Returns
+        -------
+        np.ndarray
+            A boolean array indexed by block and then colour
+        """
+        low = np.arange(0, 256, BLOCK)[:, None]
+        high = low + BLOCK - 1
+        nearest = []
+        furthest = []
+        for channel in colours.T:
+            gap = np.clip(low - channel, 0, None)
+            gap += np.clip(channel - high, 0, None)
+            nearest.append(np.square(gap))
+            furthest.append(np.maximum(
+                np.square(channel - low), np.square(channel - high)))
+        near = (
+            nearest[0][:, None, None] + nearest[1][None, :, None] +
+            nearest[2][None, None, :])
+        far = (
+            furthest[0][:, None, None] + furthest[1][None, :, None] +
+            furthest[2][None, None, :])
+        return near <= far.min(axis=-1)[..., None]
+
+    @staticmethod
+    def pack(image: Image) -> np.ndarray:
+        """
+        Pack the pixels of an image into 24-bit colour values
+
+        Parameters
+        ----------
+        image:
+            An image in any mode that can be converted to RGB
+
+        Returns
+        -------
+        np.ndarray
+            A flat array of packed colours, one per pixel
+        """
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        data = image.convert('RGBX').tobytes()
+        packed = np.frombuffer(data, dtype='<u4')
+        return np.bitwise_and(packed, COLOURS - 1)
+
+    @staticmethod
+    def pack_colours(colours: np.ndarray) -> np.ndarray:
+        """
+        Pack an array of colours into 24-bit colour values
+
+        Parameters
+        ----------
+        colours: np.ndarray
+            An (N, 3) array of R, G, B colours
+
+        Returns
+        -------
+        np.ndarray
+            A flat array of N packed colours
+        """
+        colours = np.asarray(colours, dtype=np.uint32).reshape(-1, 3)
+        return colours[:, 0] | (colours[:, 1] << 8) | (colours[:, 2] << 16)
+
+    @staticmethod
+    def histogram(
+            image: Image,
+            limit: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Count the distinct colours of an image without expanding
+        it into a per-pixel array
+
+        Parameters
+        ----------
+        image:
+            An image in any mode that can be converted to RGB
+        limit: int
+            The largest number of distinct colours to count
+
+        Returns
+        -------
+        Optional[Tuple[np.ndarray, np.ndarray]]
+            A tuple of the packed distinct colours and the number of
+            pixels of each, or None if there are more than limit colours
+        """
+        if image.mode == 'P':
+            found = image.getcolors(256)
+            palette = np.array(image.getpalette()).reshape(-1, 3)
+            weights, values = zip(*found)
+            colours = palette[list(values)]
+        else:
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            found = image.getcolors(limit)
+            if found is None:
+                return None
+            weights, values = zip(*found)
+            colours = np.array(values)
+        return (
+            ColourLookup.pack_colours(colours),
+            np.array(weights, dtype=np.int64))
+
+    def score(
+            self,
+            packed: np.ndarray,
+            weights: Optional[np.ndarray] = None) -> Tuple[float, np.ndarray]:
+        """
+        Classify a set of packed colours
+
+        Parameters
+        ----------
+        packed: np.ndarray
+            A flat array of packed colours
+        weights: Optional[np.ndarray]
+            The number of pixels of each colour, if not one each
+
+        Returns
+        -------
+        Tuple[float, np.ndarray]
+            A tuple of the RMS distance to the nearest colours and the
+            number of pixels assigned to each colour, up to the last
+            colour used
+        """
+        return Tally(self).add(packed, weights).result()
+
+
+class Tally:
+    """
+    Running totals of the pixels classified by a lookup table, so
+    that an image can be scored a part at a time
+    """
+
+    lookup: ColourLookup
+    counts: np.ndarray
+    squared: float
+    pixels: int
+
+    def __init__(self, lookup: ColourLookup):
+        """
+        Construct an empty tally
+
+        Parameters
+        ----------
+        lookup: ColourLookup
+            The lookup table used to classify colours
+        """
+        self.lookup = lookup
+        self.counts = np.zeros(lookup.size, dtype=np.int64)
+        self.squared = 0.0
+        self.pixels = 0
+
+    def add(
+            self,
+            packed: np.ndarray,
+            weights: Optional[np.ndarray] = None) -> 'Tally':
+        """
+        Classify a set of packed colours and add them to the totals
+
+        Parameters
+        ----------
+        packed: np.ndarray
+            A flat array of packed colours
+        weights: Optional[np.ndarray]
+            The number of pixels of each colour, if not one each
+
+        Returns
+        -------
+        Tally
+            This tally
+        """
+        indices = self.lookup.indices[packed]
+        distances = self.lookup.distances[packed]
+        if weights is None:
+            self.counts += np.bincount(indices, minlength=self.lookup.size)
+            self.squared += distances.sum(dtype=np.float64)
+            self.pixels += len(packed)
+        else:
+            self.counts += np.bincount(
+                indices, weights=weights,
+                minlength=self.lookup.size).astype(np.int64)
+            self.squared += np.dot(distances, weights.astype(np.float64))
+            self.pixels += int(weights.sum())
+        return self
+
+    def result(self) -> Tuple[float, np.ndarray]:
+        """
+        Return the RMS distance to the nearest colours and the number
+        of pixels assigned to each colour, up to the last colour used
+        """
+        used = np.flatnonzero(self.counts)
+        last = used[-1] + 1 if len(used) else 0
+        return np.sqrt(self.squared / self.pixels), self.counts[:last]
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+
+"""
+Per-pixel mineral index maps, stored so that the composition of any
+region of an image can be counted without classifying it again
+"""
+
+from typing import Any, Dict, List, Optional, Tuple, Union
+import json
+import os
+import tempfile
+import numpy as np
+from PIL import Image
+from .imagedataextractor import ImageDataExtractor, pixel_rows
+from .raster import Raster
+from .tiles import TILE_BUDGET
+
+
+# The width and height in pixels of the blocks counted in advance
+BLOCK_SIZE = 64
+
+# The extension of maps written compressed rather than memory mapped
+COMPRESSED_EXTENSION = '.npz'
+
+# A region of a map: left, upper, right and lower, as cropped by PIL
+Box = Tuple[int, int, int, int]
+
+
+class MineralMapException(Exception):
+    """
+    Raised if a mineral map or its sidecar cannot be read
+    """
+
+
+class MineralMap:
+    """
+    A MineralMap holds, for every pixel of an image, the index of the
+    mineral it was classified as in the mineral list of an extractor,
+    as 8-bit integers for mappings of up to 256 colours. A summed-area
+    table of the pixels of each mineral over blocks of BLOCK_SIZE by
+    BLOCK_SIZE pixels is kept alongside, so that the composition of a
+    region is found from four rows of the table and only the pixels
+    along its edges, which do not fill a block, are counted.
+
+    A map is saved as a .npy file, memory mapped when it is opened,
+    with its table in a .blocks.npy file beside it, or compressed into
+    a single .npz file. Its minerals and the metadata of the image are
+    kept in a JSON sidecar named after the file with .json appended,
+    as for a raster.
+    """
+
+    indices: np.ndarray  # NDArray[(H, W), UInt[8 | 16]]
+    minerals: List[str]
+    info: Dict[str, Any]
+    block: int
+    blocks: np.ndarray  # NDArray[(H / block + 1, W / block + 1, M), Int]
+
+    def __init__(
+            self,
+            indices: np.ndarray,
+            minerals: List[str],
+            info: Optional[Dict[str, Any]] = None,
+            block: int = BLOCK_SIZE,
+            blocks: Optional[np.ndarray] = None):
+        """
+        Construct a map from the mineral index of each pixel
+
+        Parameters
+        ----------
+        indices: np.ndarray
+            An (H, W) array of indices into the minerals
+        minerals: List[str]
+            The minerals of the extractor the pixels were classified by
+        info: Optional[Dict[str, Any]]
+            The metadata of the image
+        block: int
+            The size of the blocks of the summed-area table
+        blocks: Optional[np.ndarray]
+            The summed-area table, if already counted
+        """
+        self.indices = indices
+        self.minerals = list(minerals)
+        self.info = info or {}
+        self.block = block
+        self.blocks = self.count_blocks() if blocks is None else blocks
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        "The width and height of the map"
+        return self.indices.shape[1], self.indices.shape[0]
+
+    @staticmethod
+    def classify(
+            image: Union[Image.Image, Raster],
+            extractor: ImageDataExtractor,
+            budget: int = TILE_BUDGET) -> 'MineralMap':
+        """
+        Classify every pixel of an image with the lookup table of an
+        extractor, whatever its mode, a block of rows at a time
+
+        Parameters
+        ----------
+        image: Union[Image.Image, Raster]
+            The image or raster to classify
+        extractor: ImageDataExtractor
+            The extractor whose minerals the pixels are classified as
+        budget: int
+            The largest number of pixels classified at a time
+
+        Returns
+        -------
+        MineralMap
+            The map of the image, holding the string items of its
+            metadata
+        """
+        lookup = extractor.mapping.lookup()
+        width, height = image.size
+        indices = np.empty(width * height, dtype=lookup.indices.dtype)
+        start = 0
+        for packed in pixel_rows(image, budget):
+            indices[start:start + len(packed)] = lookup.indices[packed]
+            start += len(packed)
+        return MineralMap(
+            indices.reshape(height, width), extractor.minerals,
+            MineralMap.image_info(image))
+
+    @staticmethod
+    def image_info(image: Union[Image.Image, Raster]) -> Dict[str, Any]:
+        "Return the string items of the metadata of an image, for a map"
+        return {
+            str(k): v for k, v in image.info.items() if isinstance(v, str)}
+
+    def count_blocks(self) -> np.ndarray:
+        """
+        Count the pixels of each mineral in every block and sum them
+        over the blocks above and to the left, so that entry (i, j)
+        holds the counts of the first i rows and j columns of blocks
+        """
+        height, width = self.indices.shape
+        count = len(self.minerals)
+        rows, columns = (-(-x // self.block) for x in (height, width))
+        dtype = np.uint32 if height * width <= np.iinfo(np.uint32).max \
+            else np.uint64
+        blocks = np.zeros((rows + 1, columns + 1, count), dtype=dtype)
+        offsets = (np.arange(width) // self.block) * count
+        for row in range(rows):
+            band = self.indices[row * self.block:(row + 1) * self.block]
+            keys = band.astype(np.intp) + offsets
+            blocks[row + 1, 1:] = np.bincount(
+                keys.ravel(), minlength=columns * count
+                )[:columns * count].reshape(columns, count)
+        np.cumsum(blocks, axis=0, out=blocks)
+        np.cumsum(blocks, axis=1, out=blocks)
+        return blocks
+
+    def clip(self, box: Optional[Box]) -> Box:
+        "Clip a region to the map, the whole map if there is no region"
+        width, height = self.size
+        if box is None:
+            return 0, 0, width, height
+        left, upper, right, lower = box
+        left, right = (min(max(x, 0), width) for x in (left, right))
+        upper, lower = (min(max(x, 0), height) for x in (upper, lower))
+        return left, upper, max(left, right), max(upper, lower)
+
+    def __blocks_within(
+            self, low: int, high: int, size: int) -> Tuple[int, int]:
+        "The first and last block, plus one, between two pixels"
+        last = -(-size // self.block) if high == size else high // self.block
+        return -(-low // self.block), last
+
+    def counts(self, box: Optional[Box] = None) -> np.ndarray:
+        """
+        Count the pixels of each mineral in a region of the map. The
+        blocks within the region are counted from the summed-area table
+        and the pixels around them directly.
+
+        Parameters
+        ----------
+        box: Optional[Box]
+            The left, upper, right and lower edges of the region, or
+            None for the whole map
+
+        Returns
+        -------
+        np.ndarray
+            The number of pixels of each mineral
+        """
+        left, upper, right, lower = self.clip(box)
+        width, height = self.size
+        count = len(self.minerals)
+        top, bottom = self.__blocks_within(upper, lower, height)
+        first, last = self.__blocks_within(left, right, width)
+        counts = np.zeros(count, dtype=np.int64)
+        if top < bottom and first < last:
+            table = self.blocks
+            corners = [
+                table[bottom, last], table[top, first],
+                table[top, last], table[bottom, first]]
+            counts += corners[0].astype(np.int64) + corners[1]
+            counts -= corners[2].astype(np.int64) + corners[3]
+            y0, y1 = (min(x * self.block, height) for x in (top, bottom))
+            x0, x1 = (min(x * self.block, width) for x in (first, last))
+            edges = [
+                (left, upper, right, y0), (left, y1, right, lower),
+                (left, y0, x0, y1), (x1, y0, right, y1)]
+        else:
+            edges = [(left, upper, right, lower)]
+        for x0, y0, x1, y1 in edges:
+            if x0 < x1 and y0 < y1:
+                counts += np.bincount(
+                    self.indices[y0:y1, x0:x1].ravel(),
+                    minlength=count)[:count]
+        return counts
+
+    def composition(self, box: Optional[Box] = None) -> Dict[str, int]:
+        """
+        Construct a mapping from each mineral to the number of pixels
+        of it in a region of the map, as counts does
+        """
+        return dict(zip(self.minerals, self.counts(box).tolist()))
+
+    def crop(self, box: Optional[Box] = None) -> np.ndarray:
+        "Return the mineral indices of a region of the map"
+        left, upper, right, lower = self.clip(box)
+        return self.indices[upper:lower, left:right]
+
+    @staticmethod
+    def blocks_path(filepath: str) -> str:
+        "The file holding the summed-area table of an uncompressed map"
+        return os.path.splitext(filepath)[0] + '.blocks.npy'
+
+    @staticmethod
+    def is_compressed(filepath: str) -> bool:
+        "Return true if a map file is compressed"
+        return filepath.lower().endswith(COMPRESSED_EXTENSION)
+
+    def save(self, filepath: str):
+        """
+        Save the map to a .npy file, with its summed-area table beside
+        it, or to a compressed .npz file, and write its sidecar. Each
+        file is written to a temporary file first and then replaced.
+
+        Parameters
+        ----------
+        filepath: str
+            The file to save the map to
+        """
+        if MineralMap.is_compressed(filepath):
+            arrays = [(filepath, lambda x: np.savez_compressed(
+                x, indices=self.indices, blocks=self.blocks))]
+        else:
+            arrays = [
+                (MineralMap.blocks_path(filepath),
+                 lambda x: np.save(x, self.blocks)),
+                (filepath, lambda x: np.save(x, self.indices))]
+        sidecar = dict(self.info, Minerals=self.minerals, Block=self.block)
+        arrays.append((filepath + '.json', lambda x: x.write(
+            json.dumps(sidecar).encode('utf-8'))))
+        directory = os.path.dirname(filepath) or '.'
+        for path, write in arrays:
+            with tempfile.NamedTemporaryFile(
+                    dir=directory, suffix='.tmp', delete=False) as handle:
+                write(handle)
+            os.replace(handle.name, path)
+
+    @staticmethod
+    def open(filepath: str) -> 'MineralMap':
+        """
+        Open a map saved by save, memory mapping it unless it is
+        compressed
+
+        Parameters
+        ----------
+        filepath: str
+            A .npy or .npz file written by save
+
+        Returns
+        -------
+        MineralMap
+            The map, with the metadata of the image it was made from
+        """
+        info = Raster.sidecar(filepath)
+        try:
+            minerals = info.pop('Minerals')
+            block = int(info.pop('Block'))
+        except (KeyError, ValueError):
+            raise MineralMapException(
+                "The sidecar of mineral map %s must give its Minerals "
+                "and Block" % filepath)
+        if MineralMap.is_compressed(filepath):
+            with np.load(filepath) as data:
+                indices, blocks = data['indices'], data['blocks']
+        else:
+            indices, blocks = (
+                np.load(x, mmap_mode='r')
+                for x in [filepath, MineralMap.blocks_path(filepath)])
+        return MineralMap(indices, minerals, info, block, blocks)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+"""
+Arrays of pixels read directly from NumPy and raw files
+"""
+
+from typing import Dict, Iterator, Tuple, Any, Optional
+import json
+import os
+import numpy as np
+from .tiles import pack_raw
+
+
+# File extensions read as rasters rather than as images
+RASTER_EXTENSIONS = ['.npy', '.raw', '.rgb']
+
+
+class RasterFormatException(Exception):
+    """
+    Raised if a raster file or its sidecar cannot be interpreted
+    as an array of 8-bit RGB pixels
+    """
+
+
+class Raster:
+    """
+    A Raster is an (H, W, 3) or (H, W, 4) array of 8-bit R, G, B and
+    optionally padding or alpha pixels, usually memory mapped from a
+    file so that it is classified without being read or copied as a
+    whole. Its metadata is taken from a JSON sidecar beside the file,
+    for example ``core.npy.json``, holding the same items as the
+    metadata of an image, such as the Description. The sidecar of a raw
+    file also gives its Width, Height and optionally its Channels.
+    """
+
+    pixels: np.ndarray  # NDArray[(H, W, 3 | 4), UInt[8]]
+    info: Dict[str, Any]
+    filename: Optional[str]
+    mode: str = 'RGB'
+
+    def __init__(
+            self,
+            pixels: np.ndarray,
+            info: Optional[Dict[str, Any]] = None,
+            filename: Optional[str] = None):
+        """
+        Construct a raster from an array of pixels
+
+        Parameters
+        ----------
+        pixels: np.ndarray
+            An (H, W, 3) or (H, W, 4) array of uint8 pixels
+        info: Optional[Dict[str, Any]]
+            The metadata of the raster
+        filename: Optional[str]
+            The file the pixels were read from
+        """
+        if pixels.dtype != np.uint8 or pixels.ndim != 3 or \
+                pixels.shape[2] not in [3, 4]:
+            raise RasterFormatException(
+                "Expected an (H, W, 3) or (H, W, 4) uint8 array, "
+                "found %s %s" % (pixels.dtype, pixels.shape))
+        self.pixels = pixels
+        self.info = info or {}
+        self.filename = filename
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        "The width and height of the raster"
+        return self.pixels.shape[1], self.pixels.shape[0]
+
+    @staticmethod
+    def supports(filepath: str) -> bool:
+        "Return true if a file should be read as a raster"
+        return os.path.splitext(filepath)[1].lower() in RASTER_EXTENSIONS
+
+    @staticmethod
+    def sidecar(filepath: str) -> Dict[str, Any]:
+        "Read the metadata of a raster from its sidecar, if it has one"
+        if not os.path.isfile(filepath + '.json'):
+            return {}
+        with open(filepath + '.json') as handle:
+            return json.load(handle)
+
+    @staticmethod
+    def open(filepath: str) -> 'Raster':
+        """
+        Memory map a NumPy or raw file and read its sidecar
+
+        Parameters
+        ----------
+        filepath: str
+            A .npy file or a raw file of rows of pixels
+
+        Returns
+        -------
+        Raster
+            The raster, mapped read-only
+        """
+        info = Raster.sidecar(filepath)
+        if filepath.lower().endswith('.npy'):
+            pixels = np.load(filepath, mmap_mode='r')
+        else:
+            try:
+                shape = (
+                    int(info['Height']), int(info['Width']),
+                    int(info.get('Channels', 3)))
+            except (KeyError, ValueError):
+                raise RasterFormatException(
+                    "The sidecar of raw file %s must give its Width "
+                    "and Height" % filepath)
+            pixels = np.memmap(filepath, dtype=np.uint8, mode='r', shape=shape)
+        return Raster(pixels, info, filepath)
+
+    def strips(self, budget: int) -> Iterator[np.ndarray]:
+        """
+        Pack the pixels of the raster into 24-bit colour values a block
+        of rows at a time
+
+        Parameters
+        ----------
+        budget: int
+            The largest number of pixels to pack at a time
+
+        Returns
+        -------
+        Iterator[np.ndarray]
+            Flat arrays of packed colours which together cover the raster
+        """
+        width, height = self.size
+        rawmode = 'RGB' if self.pixels.shape[2] == 3 else 'RGBX'
+        rows = max(1, budget // max(1, width))
+        for top in range(0, height, rows):
+            yield pack_raw(self.pixels[top:top + rows], rawmode, None)
+
+    def rgb(self) -> np.ndarray:
+        "Return the pixels as an (N, 3) array"
+        return np.asarray(self.pixels[..., :3]).reshape(-1, 3)
+
+    def __enter__(self) -> 'Raster':
+        return self
+
+    def __exit__(self, *args):
+        pass
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""
+Route images to the colour mappings they were drawn with
+"""
+
+from typing import List, Optional
+import numpy as np
+from .types import ColourMapping
+from .lookup import ColourLookup
+
+
+# The number of pixels sampled from an image to route it
+SAMPLE = 1 << 12
+
+# The fraction of sampled pixels that must be exactly a mapping colour
+# for the image to be routed rather than scored against every mapping
+MATCHED = 0.5
+
+# Mappings covering this fraction of the sample less than the best
+# mapping are still scored
+MARGIN = 0.01
+
+
+class PaletteIndex:
+    """
+    The PaletteIndex records which mappings contain each colour. An
+    image drawn with a single mapping has most of its pixels exactly
+    one of the mapping colours, so a small sample of its pixels shows
+    which mappings could fit it best and only those need be scored.
+    Images in which few sampled pixels exactly match a mapping colour,
+    or which several mappings cover equally well, are ambiguous and
+    every candidate is scored.
+    """
+
+    size: int
+    colours: np.ndarray  # NDArray[(Any,), UInt[32]]
+    members: np.ndarray  # NDArray[(Any, size), Float[64]]
+
+    def __init__(self, mappings: List[ColourMapping]):
+        """
+        Build the index for a list of mappings
+
+        Parameters
+        ----------
+        mappings: List[ColourMapping]
+            The mappings to route images between
+        """
+        packed = [ColourLookup.pack_colours(m.colours) for m in mappings]
+        self.size = len(mappings)
+        self.colours = np.unique(np.concatenate(packed))
+        self.members = np.zeros((len(self.colours), self.size))
+        for index, colours in enumerate(packed):
+            self.members[np.searchsorted(self.colours, colours), index] = 1
+
+    def route(
+            self,
+            packed: np.ndarray,
+            weights: Optional[np.ndarray] = None) -> List[int]:
+        """
+        Find the mappings that could fit a set of pixels best
+
+        Parameters
+        ----------
+        packed: np.ndarray
+            A flat array of packed colours, which is sampled
+        weights: Optional[np.ndarray]
+            The number of pixels of each colour, if not one each
+
+        Returns
+        -------
+        List[int]
+            The indices of the mappings to score the pixels with
+        """
+        if weights is None:
+            step = max(1, len(packed) // SAMPLE)
+            packed, weights = np.unique(packed[::step], return_counts=True)
+        total = weights.sum()
+        position = np.searchsorted(self.colours, packed)
+        position = np.minimum(position, len(self.colours) - 1)
+        found = self.colours[position] == packed
+        if not total or weights[found].sum() < MATCHED * total:
+            return list(range(self.size))
+        coverage = np.dot(
+            weights[found].astype(np.float64), self.members[position[found]])
+        return np.flatnonzero(
+            coverage >= coverage.max() - MARGIN * total).tolist()
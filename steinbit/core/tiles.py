@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+
+"""
+Read images a part at a time so that the memory used to
+classify them is bounded
+"""
+
+from typing import Iterator, List, Tuple, Optional, Any
+import numpy as np
+from PIL import Image
+from .lookup import ColourLookup, COLOURS
+
+
+# The number of pixels classified at a time when streaming an image
+TILE_BUDGET = 1 << 22
+
+# Raw pixel layouts that can be read directly, with their sizes in bytes
+RAW_MODES = {'RGB': 3, 'RGBX': 4, 'RGBA': 4, 'BGR': 3, 'L': 1, 'P': 1}
+
+
+def raw_tiles(image: Image) -> Optional[List[Tuple[Any, ...]]]:
+    """
+    Return the tiles of an image that has not been decoded if every
+    tile is stored uncompressed in a layout that can be read directly,
+    as for uncompressed TIFF strips and tiles and for BMP files, whose
+    rows are stored from the bottom up.
+
+    Parameters
+    ----------
+    image:
+        An image opened from a file
+
+    Returns
+    -------
+    Optional[List[Tuple[Any, ...]]]
+        A list of tuples of the tile extents, offset in the file, raw
+        mode, row stride and orientation, 1 if the rows are stored from
+        the top down and -1 if from the bottom up, or None if the image
+        must be decoded
+    """
+    if not getattr(image, 'filename', None) or not image.tile:
+        return None
+    tiles = []
+    for name, extents, offset, args in image.tile:
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        if name != 'raw' or args[0] not in RAW_MODES:
+            return None
+        width = extents[2] - extents[0]
+        stride = args[1] or width * RAW_MODES[args[0]]
+        orientation = args[2] if len(args) > 2 else 1
+        tiles.append((extents, offset, args[0], stride, orientation))
+    return tiles
+
+
+def pack_raw(
+        block: np.ndarray,
+        rawmode: str,
+        palette: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Pack a block of raw pixels into 24-bit colour values. Contiguous
+    blocks of four byte pixels are read as words in place.
+
+    Parameters
+    ----------
+    block: np.ndarray
+        An (H, W, N) array of raw pixel bytes
+    rawmode: str
+        The raw mode of the pixels
+    palette: Optional[np.ndarray]
+        The packed palette of a paletted image
+    """
+    if rawmode == 'P' and palette is not None:
+        return palette[block[..., 0]].reshape(-1)
+    if rawmode == 'L':
+        return block[..., 0].reshape(-1).astype(np.uint32) * 0x010101
+    if RAW_MODES[rawmode] == 4 and block.flags['C_CONTIGUOUS']:
+        return np.bitwise_and(block.reshape(-1).view('<u4'), COLOURS - 1)
+    red, blue = (2, 0) if rawmode == 'BGR' else (0, 2)
+    pixels = block.reshape(-1, block.shape[-1])
+    packed = pixels[:, red].astype(np.uint32)
+    packed |= pixels[:, 1].astype(np.uint32) << np.uint32(8)
+    packed |= pixels[:, blue].astype(np.uint32) << np.uint32(16)
+    return packed
+
+
+def strips(image: Image, budget: int = TILE_BUDGET) -> Iterator[np.ndarray]:
+    """
+    Pack the pixels of an image into 24-bit colour values a part at a
+    time. Uncompressed images are memory mapped and never read into
+    memory as a whole. Other images are decoded once, in their own
+    mode, and converted a strip at a time.
+
+    Parameters
+    ----------
+    image:
+        An image in any mode that can be converted to RGB
+    budget: int
+        The largest number of pixels to convert at a time
+
+    Returns
+    -------
+    Iterator[np.ndarray]
+        Flat arrays of packed colours which together cover the image
+    """
+    tiles = raw_tiles(image)
+    if tiles is None:
+        width, height = image.size
+        rows = max(1, budget // max(1, width))
+        for top in range(0, height, rows):
+            yield ColourLookup.pack(
+                image.crop((0, top, width, min(height, top + rows))))
+        return
+
+    filename: str = image.filename
+    mapped = np.memmap(filename, dtype=np.uint8, mode='r')
+    palette = np.zeros(256, dtype=np.uint32)
+    if image.mode == 'P':
+        colours = ColourLookup.pack_colours(image.getpalette())
+        palette[:len(colours)] = colours
+    for (x0, y0, x1, y1), offset, rawmode, stride, orientation in tiles:
+        width = x1 - x0
+        size = RAW_MODES[rawmode]
+        rows = max(1, budget // max(1, width))
+        for top in range(0, y1 - y0, rows):
+            count = min(rows, y1 - y0 - top)
+            first = top if orientation > 0 else y1 - y0 - top - count
+            start = offset + first * stride
+            block = mapped[start:start + count * stride]
+            block = block.reshape(count, stride)[::orientation, :width * size]
+            yield pack_raw(
+                block.reshape(count, width, size), rawmode, palette)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+Compiled translations from detailed to reduced mineral lists
+"""
+
+from typing import Dict, List, Sequence, TYPE_CHECKING
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from scipy import sparse
+
+
+class InvalidTranslationException(Exception):
+    """
+    Thrown if an invalid translation is supplied
+    """
+
+
+class Translation:
+    """
+    A Translation is a table of reduced and detailed mineral pairs,
+    with the reduced mineral in the first column, compiled into a
+    sparse aggregation matrix with a row for each detailed mineral and
+    a column for each reduced mineral. Translating a block of counts is
+    then a single sparse matrix product.
+    """
+
+    table: pd.DataFrame
+    detailed: List[str]
+    reduced: List[str]
+    matrix: 'sparse.csr_matrix'  # (len(detailed), len(reduced))
+    __rows: Dict[str, int]
+
+    def __init__(self, table: pd.DataFrame):
+        """
+        Compile a translation table
+
+        Parameters
+        ----------
+        table: pd.DataFrame
+            A table of two columns, the reduced mineral and the detailed
+            mineral that is counted towards it
+        """
+        from scipy import sparse
+        if len(table.columns) != 2:
+            raise InvalidTranslationException()
+        self.table = table
+        targets = table[table.columns[0]].tolist()
+        sources = table[table.columns[1]].tolist()
+        self.detailed = list(dict.fromkeys(sources))
+        self.reduced = sorted(set(targets))
+        self.__rows = {x: i for i, x in enumerate(self.detailed)}
+        columns = {x: i for i, x in enumerate(self.reduced)}
+        self.matrix = sparse.coo_matrix(
+            (np.ones(len(sources), dtype=np.int64),
+             ([self.__rows[x] for x in sources],
+              [columns[x] for x in targets])),
+            shape=(len(self.detailed), len(self.reduced))).tocsr()
+
+    def __weights(self, minerals: Sequence[str]) -> 'sparse.csr_matrix':
+        "The rows of the matrix for a list of detailed minerals"
+        return self.matrix[[self.__rows[x] for x in minerals]]
+
+    def apply(
+            self,
+            counts: np.ndarray,
+            minerals: Sequence[str]) -> np.ndarray:
+        """
+        Translate a block of detailed counts
+
+        Parameters
+        ----------
+        counts: np.ndarray
+            An (N, len(minerals)) array of counts
+        minerals: Sequence[str]
+            The detailed mineral of each column of counts
+
+        Returns
+        -------
+        np.ndarray
+            An (N, len(reduced)) array of reduced counts
+        """
+        return np.asarray(self.__weights(minerals).T.dot(counts.T)).T
+
+    def translate(self, counts: Dict[str, int]) -> Dict[str, int]:
+        """
+        Translate the detailed composition of a single image,
+        ignoring minerals the translation does not contain
+
+        Parameters
+        ----------
+        counts: Dict[str, int]
+            The number of pixels of each detailed mineral
+
+        Returns
+        -------
+        Dict[str, int]
+            The number of pixels of each reduced mineral
+        """
+        minerals = [x for x in counts if x in self.__rows]
+        totals = self.apply(
+            np.array([[counts[x] for x in minerals]]).reshape(1, -1),
+            minerals)[0]
+        return dict(zip(self.reduced, totals.tolist()))
+
+    def translate_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Translate every row of a data frame, keeping the columns that
+        are not detailed minerals and replacing the detailed minerals
+        with the reduced ones. A reduced mineral is an integer where all
+        of its detailed minerals are.
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            Rows with a column for some or all of the detailed minerals
+
+        Returns
+        -------
+        pd.DataFrame
+            The rows with a column for each of the reduced minerals
+        """
+        minerals = [c for c in df.columns if c in self.__rows]
+        extra = [c for c in df.columns if c not in self.__rows]
+        reduced = self.apply(df[minerals].to_numpy(), minerals)
+        integers = np.ones(len(self.reduced), dtype=bool)
+        if reduced.dtype.kind == 'f':
+            floats = np.array(
+                [df[c].dtype.kind == 'f' for c in minerals], dtype=np.int64)
+            integers = self.__weights(minerals).T.dot(floats) == 0
+        columns = {
+            name: reduced[:, i].astype(np.int64) if integers[i]
+            else reduced[:, i]
+            for i, name in enumerate(self.reduced)}
+        return pd.concat([
+            df[extra],
+            pd.DataFrame(columns, index=df.index, columns=self.reduced)],
+            axis=1)
@@ -10,6 +10,8 @@ import numpy as np
 import pandas as pd
 import re
 from PIL import ImageColor
+from .lookup import ColourLookup
+from .instrument import stage
 
 
 class ColourMapping:
@@ -20,6 +22,8 @@ class ColourMapping:
 
     colours: np.ndarray  # NDArray[(Any, 3), Int[8]]
     minerals: List[str]
+    lookup_directory: Optional[str]
+    __lookup: Optional[ColourLookup]
 
     @staticmethod
     def __asrgb(colour: str) -> Tuple[int, int, int]:
@@ -61,6 +65,52 @@ class ColourMapping:
         else:
             raise TypeError("Mapping must be an (N,2) or (N,4) array")
         self.minerals = list(mapping[cols[0]])
+        self.lookup_directory = None
+        self.__lookup = None
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Return the mapping as a table of mineral names and R, G, B
+        values, from which an identical mapping can be constructed
+
+        Returns
+        -------
+        pd.DataFrame
+            A row for each mineral
+        """
+        frame = pd.DataFrame(self.colours, columns=['R', 'G', 'B'])
+        frame.insert(0, 'Name', self.minerals)
+        return frame
+
+    def lookup(self) -> ColourLookup:
+        """
+        Return the lookup table from every colour to the nearest
+        mineral, building it on first use. If the mapping has a lookup
+        directory the table is memory mapped from there, and stored
+        there the first time it is built.
+
+        Returns
+        -------
+        ColourLookup
+            The lookup table shared by all users of this mapping
+        """
+        if self.__lookup is None:
+            with stage('lookup_table'):
+                if self.lookup_directory:
+                    self.__lookup = ColourLookup.stored(
+                        self.colours, self.lookup_directory)
+                else:
+                    self.__lookup = ColourLookup(self.colours)
+        return self.__lookup
+
+    def __getstate__(self):
+        """
+        Leave the lookup table out when pickling, the copy builds its
+        own on first use or maps the stored one
+        """
+        state = self.__dict__.copy()
+        state['_ColourMapping__lookup'] = None
+        return state
 
 
 class Field:
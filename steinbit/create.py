@@ -1,18 +1,88 @@
 #!/usr/bin/env python3
 
 from .core import (
-    ImageDataExtractor, Frame, ConsistencyException, RequiredFields
+    ImageDataExtractor, Frame, ConsistencyException, RequiredFields,
+    CompositionMode, Raster, read_info
 )
+from .core import instrument
+from .core.instrument import stage
 from .config import Config
-from .mnemonic import mnemonics
+from .cache import CompositionCache, file_digest
+from .manifest import Manifest, Sample, SAMPLE_ID
+from .index import ImageIndex, as_text
+from .pipeline import Pipeline
+from .stream import StreamWriter, STREAM_ROWS
+from .columnar import is_columnar, read_columnar, write_columnar
+from .las import read_las, write_las
 
 from argparse import ArgumentParser, Namespace
-from typing import Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+)
+from typing import (
+    BinaryIO, Collection, Iterable, Iterator, List, Set, Tuple, Dict, Any,
+    Optional, Union
+)
 import pandas as pd
 from PIL import Image
-from tqdm import tqdm
+import hashlib
+import io
+import itertools
 import mimetypes
-import lasio
+import os
+import re
+
+
+# The part of an output filename replaced by the name of each well
+WELL_TEMPLATE = '{well}'
+
+# The name given to the well of rows that do not name one
+UNKNOWN_WELL = 'unknown'
+
+# The number of files read ahead of the file being classified
+PREFETCH = 4
+
+# The extension of the mineral map of each image, and of a compressed map
+MAP_EXTENSION = '.minerals.npy'
+COMPRESSED_MAP_EXTENSION = '.minerals.npz'
+
+# The frame used to describe files in a worker process
+WORKER_FRAME: Optional[Frame] = None
+
+
+def initialise_worker(config: Config, profile: Optional[bool] = None):
+    """
+    Build the extractors for a worker process once, before any
+    files are handed to it
+
+    Parameters
+    ----------
+    config: Config
+        The configuration to build extractors from
+    profile: Optional[bool]
+        Instrument the worker, tracing memory if true
+    """
+    global WORKER_FRAME
+    WORKER_FRAME = Frame(SteinbitCreate(config).extractors())
+    if profile is not None:
+        instrument.start(profile)
+
+
+def read_in_worker(
+        filepath: str,
+        output: Optional[str] = None
+        ) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """
+    Read a single file in a worker process, saving the mineral map of
+    an image to output if given, and return what was read and the
+    stages measured if the worker is instrumented
+    """
+    if WORKER_FRAME is None:
+        raise RuntimeError("Worker process has not been initialised")
+    with stage('file', latency=True):
+        read = SteinbitCreate.read_file(filepath, WORKER_FRAME, output)
+    profiler = instrument.PROFILER
+    return read, None if profiler is None else profiler.take()
 
 
 class SteinbitCreate:
@@ -23,40 +93,494 @@ class SteinbitCreate:
         self.config = config
 
     @staticmethod
-    def read_las(filepath: str) -> pd.DataFrame:
+    def read_las(
+            filepath: str,
+            curves: Optional[Collection[str]] = None) -> pd.DataFrame:
         """
         Read a LAS file and apply adjustments to keep the
-        required fields
+        required fields, reading only the curves given if any
         """
         try:
-            lasfile = lasio.read(filepath)
+            return read_las(filepath, curves)
         except KeyError:
             return None
-        frame = lasfile.df().reset_index().rename(
-            columns={x.mnemonic: x.descr for x in lasfile.curves})
-        headers = {
-                RequiredFields.D_UNIT.value: lasfile.well.STEP.unit,
-                RequiredFields.WELL.value: lasfile.well.WELL.value}
-        for field, header in headers.items():
-            frame[field] = [header for _ in frame.index]
+
+    @staticmethod
+    def read_table(
+            filepath: str,
+            curves: Optional[Collection[str]] = None) -> pd.DataFrame:
+        """
+        Read a LAS, CSV, Parquet or Arrow file. Of a LAS file only the
+        curves given are read, if any.
+        """
+        with stage('read_table', 'rows') as timer:
+            frame = None
+            if is_columnar(filepath):
+                frame = read_columnar(filepath)
+            elif SteinbitCreate.is_las(filepath):
+                frame = SteinbitCreate.read_las(filepath, curves)
+            if frame is None:
+                frame = pd.read_csv(filepath)
+            timer.count(len(frame.index))
         return frame
 
     @staticmethod
-    def append_file(filepath: str, result: Frame):
+    def is_las(filepath: str) -> bool:
         """
-        Append a single file to the frame
+        Return true if a file starts with a LAS section, after any
+        blank or comment lines
+        """
+        with open(filepath, 'rb') as handle:
+            for line in handle:
+                line = line.strip()
+                if line and not line.startswith(b'#'):
+                    return line.startswith(b'~')
+        return False
+
+    @staticmethod
+    def is_image(filepath: str) -> bool:
+        """
+        Return true if a file should be read as an image or raster
+        rather than as a CSV, LAS, Parquet or Arrow file
         """
+        if Raster.supports(filepath):
+            return True
+        if is_columnar(filepath):
+            return False
         mimetypes.init()
         mime = mimetypes.guess_type(filepath)[0]
-        if mime and not mime.startswith('image'):
-            frame = SteinbitCreate.read_las(filepath)
-            if frame is None:
-                frame = pd.read_csv(filepath)
-            result.append_frame(frame)
+        return not (mime and not mime.startswith('image'))
+
+    @staticmethod
+    def read_file(
+            filepath: str,
+            result: Frame,
+            output: Optional[str] = None) -> Any:
+        """
+        Read a single file ready to be appended to the frame, saving
+        the mineral map of an image to output if given
+
+        Returns
+        -------
+        Any
+            A data frame for a CSV or LAS file, or the description
+            of an image from Frame.describe
+        """
+        if not SteinbitCreate.is_image(filepath):
+            return SteinbitCreate.read_table(filepath)
+        tiled = any(
+            e.mode == CompositionMode.TILED for e in result.extractors)
+        with stage('open'):
+            image = SteinbitCreate.open_image(filepath, tiled)
+        return SteinbitCreate.describe_image(image, result, output)
+
+    @staticmethod
+    def describe_image(
+            image: Union[Image.Image, Raster],
+            result: Frame,
+            output: Optional[str] = None) -> Any:
+        """
+        Describe an opened image with Frame.describe or, if there is an
+        output for its mineral map, with Frame.map in the same pass as
+        its map, which is then saved to the output
+        """
+        if output is None:
+            return result.describe(image)
+        read, mineral_map = result.map(image)
+        with stage('save_map'):
+            mineral_map.save(output)
+        return read
+
+    @staticmethod
+    def map_outputs(
+            files: Iterable[str],
+            directory: str,
+            compress: bool = False) -> Dict[str, str]:
+        """
+        Name the mineral map of each image in a directory after the
+        image, raising ValueError if two images would share a map
+        """
+        extension = COMPRESSED_MAP_EXTENSION if compress else MAP_EXTENSION
+        outputs: Dict[str, str] = {}
+        for filepath in files:
+            if not SteinbitCreate.is_image(filepath):
+                continue
+            output = os.path.join(directory, os.path.splitext(
+                os.path.basename(filepath))[0] + extension)
+            if output in outputs.values():
+                raise ValueError(
+                    "Images would write the same mineral map %s" % output)
+            outputs[filepath] = output
+        return outputs
+
+    @staticmethod
+    def open_image(
+            filepath: str,
+            unbounded: bool = False,
+            data: Optional[BinaryIO] = None) -> Image:
+        """
+        Open an image without decoding it, or memory map a raster
+
+        Parameters
+        ----------
+        filepath: str
+            The image or raster file to open
+        unbounded: bool
+            Lift the limit on the number of pixels PIL will open, for
+            mosaics that are only ever read a tile at a time
+        data: Optional[BinaryIO]
+            The content of the image, if already read into memory
+        """
+        if Raster.supports(filepath):
+            return Raster.open(filepath)
+        if not unbounded:
+            return Image.open(data or filepath)
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            return Image.open(data or filepath)
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
+    @staticmethod
+    def fetch_file(
+            filepath: str,
+            tiled: bool,
+            hashed: bool = False
+            ) -> Tuple[
+                str, Optional[BinaryIO], Optional[Tuple[str, int, int]]]:
+        """
+        Read the content of an image into memory, the first stage of
+        the pipeline of read_files. Tables, rasters and images streamed
+        a tile at a time are read as they are used instead. If hashed
+        is true the content is also hashed, as by file_digest, from the
+        bytes read rather than by reading the file again.
+        """
+        if tiled or Raster.supports(filepath) or \
+                not SteinbitCreate.is_image(filepath):
+            return filepath, None, file_digest(filepath) if hashed else None
+        with stage('fetch', 'bytes') as timer:
+            stat = os.stat(filepath)
+            with open(filepath, 'rb') as handle:
+                data = handle.read()
+            timer.count(len(data))
+        digest = None
+        if hashed:
+            with stage('hash', 'bytes') as timer:
+                digest = (
+                    hashlib.sha256(data).hexdigest(), stat.st_size,
+                    stat.st_mtime_ns)
+                timer.count(len(data))
+        return filepath, io.BytesIO(data), digest
+
+    @staticmethod
+    def decode_file(
+            fetched: Tuple[
+                str, Optional[BinaryIO], Optional[Tuple[str, int, int]]],
+            tiled: bool) -> Tuple[Any, Optional[Tuple[str, int, int]]]:
+        """
+        Read a table, or open and decode an image returned by
+        fetch_file, the second stage of the pipeline of read_files
+
+        Returns
+        -------
+        Tuple[Any, Optional[Tuple[str, int, int]]]
+            A data frame for a CSV or LAS file, or the image or raster,
+            decoded unless it is streamed a tile at a time, with the
+            hash made by fetch_file if any
+        """
+        filepath, data, digest = fetched
+        if not SteinbitCreate.is_image(filepath):
+            return SteinbitCreate.read_table(filepath), digest
+        with stage('open'):
+            image = SteinbitCreate.open_image(filepath, tiled, data)
+        if not tiled and not isinstance(image, Raster):
+            with stage('decode'):
+                image.load()
+        return image, digest
+
+    @staticmethod
+    def append_read(read: Any, result: Frame):
+        """
+        Append a file returned by read_file to the frame
+        """
+        if isinstance(read, pd.DataFrame):
+            result.append_frame(read)
         else:
-            result.append_image(Image.open(filepath))
+            result.append_scores(*read)
+
+    @staticmethod
+    def append_file(filepath: str, result: Frame):
+        """
+        Append a single file to the frame
+        """
+        SteinbitCreate.append_read(
+            SteinbitCreate.read_file(filepath, result), result)
+
+    def extractors(self) -> List[ImageDataExtractor]:
+        """
+        Construct the extractors for each mapping in the configuration,
+        the detailed and reduced mappings first and then any palettes
+        """
+        cfg = self.config
+        mappings = [cfg.detailed_mapping, cfg.reduced_mapping]
+        mappings += list(cfg.palettes.values())
+        return [
+            ImageDataExtractor(mapping, cfg.fields, cfg.mode, cfg.budget)
+            for mapping in mappings]
+
+    def open_cache(
+            self,
+            extractors: List[ImageDataExtractor]
+            ) -> Optional[CompositionCache]:
+        """
+        Open the composition cache for a list of extractors, unless
+        caching is disabled
+        """
+        if not self.config.cache_directory:
+            return None
+        return CompositionCache(
+            self.config.cache_directory, extractors, self.config.cache_size,
+            self.config.table_size)
+
+    @staticmethod
+    def read_cached(
+            filepath: str,
+            result: Frame,
+            cache: Optional[CompositionCache],
+            output: Optional[str] = None) -> Any:
+        """
+        Read a single file as read_file does, taking the description
+        of an image from the cache if it is there. An image with an
+        output for its mineral map is always read, to make the map,
+        and its description stored in the cache.
+        """
+        if cache is None or not SteinbitCreate.is_image(filepath):
+            return SteinbitCreate.read_file(filepath, result, output)
+        with stage('cache'):
+            key = cache.key(filepath)
+            read = None if output else cache.get(key)
+        if read is None:
+            read = SteinbitCreate.read_file(filepath, result, output)
+            cache.put(key, read)
+        return read
+
+    def read_files(
+            self,
+            files: List[str],
+            result: Frame,
+            jobs: int = 1,
+            cache: Optional[CompositionCache] = None,
+            prefetch: int = PREFETCH,
+            maps: Optional[Dict[str, str]] = None
+            ) -> Iterator[Tuple[str, Any]]:
+        """
+        Read files, in a pool of worker processes if there is more
+        than one job. Files in the cache are not read at all, unless
+        their mineral map is to be written. Of the
+        others the largest files are started first so that no worker is
+        left with a long file at the end, while the results are always
+        returned in the order of the files. Files not hashed before are
+        hashed by the workers too, and each is only read once its hash
+        is found not to be in the cache.
+
+        In a single process files are read in a pipeline: threads read
+        the content of the next few files into memory and another
+        decodes them while this process classifies the file before, so
+        that waiting on files overlaps with classification.
+
+        Parameters
+        ----------
+        files: List[str]
+            A list of filenames to read
+        result: Frame
+            The frame used to describe images read in this process
+        jobs: int
+            The number of worker processes
+        cache: Optional[CompositionCache]
+            A cache of image descriptions
+        prefetch: int
+            The number of files read ahead in a single process, or 0 to
+            read each file only once the one before is classified
+        maps: Optional[Dict[str, str]]
+            The file to save the mineral map of each image to, made as
+            the image is read, for the images to map
+
+        Returns
+        -------
+        Iterator[Tuple[str, Any]]
+            Each filename with the result of read_file
+        """
+        outputs = maps or {}
+        if jobs <= 1 and prefetch > 0:
+            yield from self.read_pipelined(
+                files, result, cache, prefetch, outputs)
+            return
+        if jobs <= 1:
+            for filepath in files:
+                with stage('file', latency=True):
+                    read = SteinbitCreate.read_cached(
+                        filepath, result, cache, outputs.get(filepath))
+                yield filepath, read
+            return
+
+        keys: Dict[int, str] = {}
+        reads: Dict[int, Any] = {}
+        unhashed: List[int] = []
+        if cache is not None:
+            for index, filepath in enumerate(files):
+                if SteinbitCreate.is_image(filepath):
+                    with stage('cache'):
+                        digest = cache.stored_digest(filepath)
+                        if digest is None:
+                            unhashed.append(index)
+                            continue
+                        keys[index] = cache.digest_key(digest)
+                        read = None if filepath in outputs \
+                            else cache.get(keys[index])
+                    if read is not None:
+                        reads[index] = read
+
+        def largest(indices: Iterable[int]) -> List[int]:
+            return sorted(
+                indices, key=lambda i: os.path.getsize(files[i]),
+                reverse=True)
+
+        profiler = instrument.PROFILER
+        profile = None if profiler is None else profiler.memory
+        with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=initialise_worker,
+                initargs=(self.config, profile)) as executor:
+            futures = {
+                i: executor.submit(
+                    read_in_worker, files[i], outputs.get(files[i]))
+                for i in largest(
+                    i for i in range(len(files))
+                    if i not in reads and i not in unhashed)}
+            hashing = {
+                executor.submit(file_digest, files[i]): i
+                for i in largest(unhashed)}
+
+            def look_up() -> None:
+                "Look up each file whose hash is made in the cache"
+                if cache is None:
+                    return
+                for done in [x for x in hashing if x.done()]:
+                    index = hashing.pop(done)
+                    digest, size, mtime = done.result()
+                    with stage('cache'):
+                        cache.remember(files[index], digest, size, mtime)
+                        keys[index] = cache.digest_key(digest)
+                        read = None if files[index] in outputs \
+                            else cache.get(keys[index])
+                    if read is None:
+                        futures[index] = executor.submit(
+                            read_in_worker, files[index],
+                            outputs.get(files[index]))
+                    else:
+                        reads[index] = read
+
+            for index, filepath in enumerate(files):
+                while True:
+                    look_up()
+                    if index in reads or index in futures and (
+                            futures[index].done() or not hashing):
+                        break
+                    waiting: List[Future] = list(hashing)
+                    if index in futures:
+                        waiting.append(futures[index])
+                    wait(waiting, return_when=FIRST_COMPLETED)
+                if index in reads:
+                    yield filepath, reads.pop(index)
+                    continue
+                read, stages = futures.pop(index).result()
+                if profiler is not None and stages is not None:
+                    profiler.merge(stages)
+                if cache is not None and index in keys:
+                    cache.put(keys[index], read)
+                yield filepath, read
+
+    def read_pipelined(
+            self,
+            files: List[str],
+            result: Frame,
+            cache: Optional[CompositionCache],
+            prefetch: int,
+            maps: Optional[Dict[str, str]] = None
+            ) -> Iterator[Tuple[str, Any]]:
+        """
+        Read files in this process as read_files does, through a
+        pipeline of threads that fetch the content of files into memory
+        and decode them. No more than prefetch files are fetched ahead
+        of the file being classified, which bounds the memory used. The
+        cache is only used from this thread. Images not hashed before
+        are hashed by the fetch stage from the bytes it reads, and are
+        looked up in the cache once they reach this thread.
+        """
+        outputs = maps or {}
+        tiled = any(
+            e.mode == CompositionMode.TILED for e in result.extractors)
+        keys: Dict[str, str] = {}
+        unhashed: Set[str] = set()
+
+        def sources() -> Iterator[Any]:
+            for filepath in files:
+                if cache is not None and SteinbitCreate.is_image(filepath):
+                    with stage('cache'):
+                        digest = cache.stored_digest(filepath)
+                        if digest is None:
+                            unhashed.add(filepath)
+                            yield filepath
+                            continue
+                        keys[filepath] = cache.digest_key(digest)
+                        read = None if filepath in outputs \
+                            else cache.get(keys[filepath])
+                    if read is not None:
+                        cached: Future = Future()
+                        cached.set_result((read, None))
+                        yield cached
+                        continue
+                yield filepath
+
+        pipeline = Pipeline([
+            (lambda f: SteinbitCreate.fetch_file(
+                f, tiled, f in unhashed), prefetch),
+            (lambda f: SteinbitCreate.decode_file(f, tiled), 1)],
+            prefetch)
+        reads = pipeline.run(sources())
+        try:
+            for filepath in files:
+                with stage('file', latency=True):
+                    read, digest = next(reads)
+                    if cache is not None and digest is not None:
+                        with stage('cache'):
+                            cache.remember(filepath, *digest)
+                            keys[filepath] = cache.digest_key(digest[0])
+                            cached = None if filepath in outputs \
+                                else cache.get(keys[filepath])
+                        if cached is not None:
+                            del keys[filepath]
+                            read = cached
+                    if isinstance(read, (Image.Image, Raster)):
+                        read = SteinbitCreate.describe_image(
+                            read, result, outputs.get(filepath))
+                        if cache is not None and filepath in keys:
+                            cache.put(keys.pop(filepath), read)
+                yield filepath, read
+        finally:
+            reads.close()
 
-    def process_files(self, files: Iterator[str]) -> pd.DataFrame:
+    def process_files(
+            self,
+            files: Iterable[str],
+            jobs: int = 1,
+            progress: bool = False,
+            manifest: Optional[Manifest] = None,
+            extractors: Optional[List[ImageDataExtractor]] = None,
+            prefetch: int = PREFETCH,
+            maps: Optional[Dict[str, str]] = None
+            ) -> Frame:
         """
         Process a list of images or CSVs and print out a combined CSV
 
@@ -64,6 +588,21 @@ class SteinbitCreate:
         ----------
         files: List[str]
             A list of filenames to process
+        jobs: int
+            The number of worker processes used to read files,
+            or 1 to read them in this process
+        progress: bool
+            Show a progress bar
+        manifest: Optional[Manifest]
+            A manifest to record each file read in
+        extractors: Optional[List[ImageDataExtractor]]
+            Extractors built earlier to reuse, rather than building them
+            from the configuration
+        prefetch: int
+            The number of files read ahead in a single process
+        maps: Optional[Dict[str, str]]
+            The file to save the mineral map of each image to, as
+            from map_outputs, for the images to map as they are read
 
         Returns
         -------
@@ -71,19 +610,320 @@ class SteinbitCreate:
             A table mapping well depths to their compositions for
             each extractor used (detailed or reduced)
         """
-        cfg = self.config
-        result = Frame([
-                ImageDataExtractor(cfg.detailed_mapping, cfg.fields),
-                ImageDataExtractor(cfg.reduced_mapping, cfg.fields)
-            ])
-        for filepath in files:
+        result = Frame(extractors or self.extractors())
+        for filepath, read in self.read_all(
+                files, result, jobs, progress, prefetch, maps):
             try:
-                SteinbitCreate.append_file(filepath, result)
+                SteinbitCreate.append_read(read, result)
             except ConsistencyException:
                 print("Consistency error processing: %s" % filepath)
                 raise
+            if manifest is not None:
+                fields = {} if isinstance(read, pd.DataFrame) else read[1]
+                manifest.record(filepath, SteinbitCreate.sample_of(fields))
         return result
 
+    def read_all(
+            self,
+            files: Iterable[str],
+            result: Frame,
+            jobs: int,
+            progress: bool,
+            prefetch: int,
+            maps: Optional[Dict[str, str]] = None
+            ) -> Iterator[Tuple[str, Any]]:
+        """
+        Read files as read_files does, through the composition cache
+        and showing a progress bar if asked to
+        """
+        files = list(files)
+        cache = self.open_cache(result.extractors)
+        reads = self.read_files(files, result, jobs, cache, prefetch, maps)
+        if progress:
+            from tqdm import tqdm
+            reads = tqdm(reads, desc="Processing files", total=len(files))
+        try:
+            yield from reads
+        finally:
+            if cache is not None:
+                cache.close()
+
+    def process_wells(
+            self,
+            files: Iterable[str],
+            jobs: int = 1,
+            progress: bool = False,
+            prefetch: int = PREFETCH,
+            maps: Optional[Dict[str, str]] = None
+            ) -> Dict[Optional[str], Frame]:
+        """
+        Process images, CSVs and LAS files of any number of wells,
+        keeping a separate frame for each well. Files of every well are
+        read together, by the same worker processes or pipeline, and
+        each row is appended to the frame of the well it names, so that
+        files need not be sorted by well. Rows without a well are kept
+        in a frame of their own, under None.
+
+        Parameters
+        ----------
+        files: Iterable[str]
+            A list of filenames to process
+        jobs: int
+            The number of worker processes used to read files,
+            or 1 to read them in this process
+        progress: bool
+            Show a progress bar
+        prefetch: int
+            The number of files read ahead in a single process
+        maps: Optional[Dict[str, str]]
+            The file to save the mineral map of each image to
+
+        Returns
+        -------
+        Dict[Optional[str], Frame]
+            The frame of each well, by the name of the well, in the
+            order the wells are first found
+        """
+        extractors = self.extractors()
+        frames: Dict[Optional[str], Frame] = {}
+
+        def frame_of(well: Any) -> Frame:
+            name = as_text(well) or None
+            if name not in frames:
+                frames[name] = Frame(extractors)
+            return frames[name]
+
+        for filepath, read in self.read_all(
+                files, Frame(extractors), jobs, progress, prefetch, maps):
+            try:
+                if not isinstance(read, pd.DataFrame):
+                    well = read[1].get(RequiredFields.WELL.value)
+                    frame_of(well).append_scores(*read)
+                    continue
+                column = RequiredFields.WELL.match_name(read.columns)
+                if column is None or read[column].nunique(dropna=False) < 2:
+                    well = None if column is None or not len(read.index) \
+                        else read[column].iloc[0]
+                    frame_of(well).append_frame(read)
+                    continue
+                for well, rows in read.groupby(
+                        read[column].fillna(''), sort=False):
+                    frame_of(None if well == '' else well).append_frame(
+                        rows.copy())
+            except ConsistencyException:
+                print("Consistency error processing: %s" % filepath)
+                raise
+        return frames
+
+    @staticmethod
+    def well_output(template: str, well: str) -> str:
+        """
+        Return the output filename of a well from a template such as
+        ``out/{well}.csv``, replacing characters of the well name that
+        cannot be in a filename, such as the / of 25/2-18, with _
+        """
+        return template.replace(
+            WELL_TEMPLATE, re.sub(r'[^\w.-]+', '_', well).strip('.'))
+
+    @staticmethod
+    def well_outputs(
+            template: str,
+            wells: Iterable[Optional[str]]) -> Dict[Optional[str], str]:
+        """
+        Name the output of each well from a template, as well_output
+        does, naming rows without a well by UNKNOWN_WELL and raising
+        ValueError if two wells would share an output
+        """
+        outputs: Dict[Optional[str], str] = {}
+        for well in wells:
+            output = SteinbitCreate.well_output(
+                template, UNKNOWN_WELL if well is None else well)
+            named = [x for x, o in outputs.items() if o == output]
+            if named:
+                raise ValueError(
+                    "Wells %s and %s would write the same output %s" % (
+                        named[0], well, output))
+            outputs[well] = output
+        return outputs
+
+    @staticmethod
+    def sample_of(fields: Dict[str, Any]) -> Optional[Sample]:
+        """
+        Return the depth and sample ID from the metadata of an image,
+        or None if it has no depth
+        """
+        try:
+            depth = float(fields[RequiredFields.DEPTH.value])
+        except (KeyError, TypeError, ValueError):
+            return None
+        rtid = fields.get(SAMPLE_ID)
+        return depth, None if rtid is None else str(rtid)
+
+    @staticmethod
+    def samples_in(df: pd.DataFrame) -> List[Sample]:
+        """
+        Return the depth and sample ID of every row in a data frame. The
+        sample ID is None where the data frame has no sample IDs.
+        """
+        depth = RequiredFields.DEPTH.match_name(df.columns)
+        if depth is None:
+            return []
+        rtids = df[SAMPLE_ID] if SAMPLE_ID in df.columns else [None]
+        return [
+            (float(d), None if pd.isna(r) else str(r))
+            for d, r in zip(df[depth], itertools.cycle(rtids))]
+
+    def update_files(
+            self,
+            existing: str,
+            files: Iterable[str],
+            jobs: int = 1,
+            progress: bool = False,
+            prefetch: int = PREFETCH,
+            maps: Optional[Dict[str, str]] = None
+            ) -> Tuple[Frame, Manifest]:
+        """
+        Update an existing output with files that are new or have
+        changed since it was written. Files recorded in the manifest of
+        the output with their current size and modification time are
+        skipped, as are images with no manifest entry whose depth and
+        sample ID, read from the image header, are already in the
+        output. Rows of the existing output are replaced by rows from
+        images of the same sample that are read again.
+
+        Parameters
+        ----------
+        existing: str
+            A CSV or LAS file written by a previous run
+        files: List[str]
+            A list of filenames to process
+        jobs: int
+            The number of worker processes used to read files
+        progress: bool
+            Show a progress bar
+        prefetch: int
+            The number of files read ahead in a single process
+        maps: Optional[Dict[str, str]]
+            The file to save the mineral map of each image to, only
+            made for the images that are read again
+
+        Returns
+        -------
+        Tuple[Frame, Manifest]
+            The frame with the existing and new rows, which still
+            need to be ordered by depth, and the updated manifest
+        """
+        manifest = Manifest(existing)
+        previous = SteinbitCreate.read_table(existing)
+        rows = SteinbitCreate.samples_in(previous)
+        pending = self.pending_files(files, manifest, set(rows))
+        replaced = [manifest.sample(f) for f in pending]
+        frame = self.process_files(
+            pending, jobs, progress, manifest, prefetch=prefetch, maps=maps)
+        replaced += [manifest.sample(f) for f in pending]
+        samples = {x for x in replaced if x is not None}
+        if rows:
+            previous = previous[SteinbitCreate.kept(rows, samples)]
+        if len(previous.index):
+            frame.append_frame(previous)
+        return frame, manifest
+
+    def pending_files(
+            self,
+            files: Iterable[str],
+            manifest: Manifest,
+            known: Set[Sample]) -> List[str]:
+        """
+        Return the files that must be read to update an output, those
+        that are not unchanged since the manifest recorded them and,
+        for images with no manifest entry, whose sample is not in the
+        output. Images whose sample is found are recorded in the
+        manifest.
+
+        Parameters
+        ----------
+        files: Iterable[str]
+            A list of filenames to update the output with
+        manifest: Manifest
+            The manifest of the output
+        known: Set[Sample]
+            The samples of the rows of the output
+        """
+        extractor = self.extractors()[0]
+        pending = []
+        for filepath in files:
+            if manifest.unchanged(filepath):
+                continue
+            if manifest.sample(filepath) is None and \
+                    SteinbitCreate.is_image(filepath):
+                sample = SteinbitCreate.sample_of(
+                    extractor.parse_metadata(read_info(filepath)))
+                if sample and (
+                        sample in known or (sample[0], None) in known):
+                    manifest.record(filepath, sample)
+                    continue
+            pending.append(filepath)
+        return pending
+
+    @staticmethod
+    def kept(rows: List[Sample], samples: Set[Sample]) -> List[bool]:
+        """
+        Return whether each row of an output is kept when the images
+        of some samples are read again, a row without a sample ID being
+        replaced by any image at its depth
+        """
+        depths = {x[0] for x in samples}
+        return [
+            x not in samples and not (x[1] is None and x[0] in depths)
+            for x in rows]
+
+    def select_files(
+            self,
+            files: Iterable[str],
+            index: Optional[str] = None,
+            wells: Optional[List[str]] = None,
+            depth_min: Optional[float] = None,
+            depth_max: Optional[float] = None) -> List[str]:
+        """
+        Select the images of a list of files in any of a list of wells
+        and within a range of depths, reading only the image headers, so
+        that no pixels of the images left out are decoded. CSV and LAS
+        files are always kept.
+
+        Parameters
+        ----------
+        files: Iterable[str]
+            A list of filenames to select from
+        index: Optional[str]
+            An index file to take the headers of unchanged images from,
+            updated with the headers read
+        wells: Optional[List[str]]
+            The wells to select, or None for all wells
+        depth_min: Optional[float]
+            The least depth to select
+        depth_max: Optional[float]
+            The greatest depth to select
+
+        Returns
+        -------
+        List[str]
+            The files selected, in the order given
+        """
+        files = list(files)
+        if not (index or wells or depth_min is not None or
+                depth_max is not None):
+            return files
+        images = ImageIndex(index, self.extractors()[0])
+        entries = images.update(
+            f for f in files if SteinbitCreate.is_image(f))
+        images.save()
+        selected = set(ImageIndex.select(
+            entries, wells, depth_min, depth_max)['path'])
+        return [
+            f for f in files
+            if not SteinbitCreate.is_image(f) or
+            os.path.abspath(f) in selected]
+
     def percentages(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Convert an output in pixel numbers to an output in percentages
@@ -111,53 +951,278 @@ class SteinbitCreate:
         Output a LAS file
         """
         df = frame.result()
-        unit = df[RequiredFields.D_UNIT.value][0]
-        depths = df[RequiredFields.DEPTH.value]
-        strt = depths.min()
-        stop = depths.max()
-        step = (stop - strt) / len(df.index)
-        las = lasio.LASFile()
-        las.well.STRT.unit = unit
-        las.well.STRT.value = strt
-        las.well.STOP.unit = unit
-        las.well.STOP.value = stop
-        las.well.STEP.unit = unit
-        las.well.STEP.value = step or 1.0
-        las.well.WELL.value = df[RequiredFields.WELL.value][0]
-
         columns = [RequiredFields.DEPTH.value] + frame.minerals()
-        for mnemonic, column in zip(mnemonics(columns), columns):
-            las.append_curve(mnemonic, df[column], descr=column)
-        with open(output, mode="w") as handle:
-            las.write(handle)
+        write_las(
+            output, df, columns, str(df[RequiredFields.D_UNIT.value][0]),
+            df[RequiredFields.WELL.value][0])
 
     @classmethod
     def add_arguments(cls, parser: ArgumentParser):
         parser.add_argument(
             '-o', '--output', type=str,
-            help='the output file to write to')
+            help='the output file to write to, or a template containing '
+                 '{well} to write a file for each well')
         parser.add_argument(
             '-t', '--translate', action='store_true',
             help='Reduce the output list by applying the transformation')
         parser.add_argument(
             '-p', '--percent', action='store_true',
             help='Write percentages rather than raw pixel counts')
+        parser.add_argument(
+            '-j', '--jobs', type=int, default=1,
+            help='the number of processes used to read files')
+        parser.add_argument(
+            '--prefetch', type=int, default=PREFETCH,
+            help='the number of files read ahead of the one being '
+                 'classified, when reading in a single process')
+        parser.add_argument(
+            '--stream', action='store_true',
+            help='write rows to a CSV output as they are read, in '
+                 'constant memory')
+        parser.add_argument(
+            '-u', '--update', type=str,
+            help='an existing output to add new or changed files to')
+        parser.add_argument(
+            '--index', type=str,
+            help='an index of image headers, written by the index '
+                 'command, to select images by')
+        parser.add_argument(
+            '--maps', type=str,
+            help='a directory to write the mineral map of each image to, '
+                 'for regions to be counted without classifying again')
+        parser.add_argument(
+            '--compress-maps', action='store_true',
+            help='compress the mineral maps rather than writing them to '
+                 'be memory mapped')
+        ImageIndex.add_filters(parser)
         parser.add_argument(
             'files', type=str, nargs='+',
-            help='images, csv or las files to parse')
+            help='images, csv, las, parquet or arrow files to parse')
         parser.set_defaults(clazz=cls)
 
-    def run(self, args: Namespace):
-        frame = self.process_files(tqdm(args.files, desc="Processing files"))
-        if args.translate or frame.requires_translation():
+    def write(
+            self,
+            frame: Frame,
+            output: Optional[str],
+            translate: bool = False,
+            percent: bool = False,
+            order: bool = False):
+        """
+        Write a frame to a CSV, LAS, Parquet or Arrow file, or print it
+
+        Parameters
+        ----------
+        frame: Frame
+            The frame to write
+        output: Optional[str]
+            The file to write to, or None to print the frame
+        translate: bool
+            Reduce the frame by applying the translation, which is
+            always done if the frame holds both detailed and reduced rows
+        percent: bool
+            Write percentages rather than raw pixel counts
+        order: bool
+            Order the rows of the frame by depth first
+        """
+        if translate or frame.requires_translation():
             frame.apply_translation(self.config.translation)
+        if order:
+            frame.order_by_depth()
         result = frame.result()
-        if args.percent:
-            result = self.percentages(result)
-        if args.output:
-            if args.output.lower().endswith('las'):
-                self.output_las(frame, args.output)
-            else:
-                result.to_csv(args.output, index=False)
+        if percent:
+            with stage('percentages', 'rows') as timer:
+                result = self.percentages(result)
+                timer.count(len(result.index))
+        if output:
+            with stage('write', 'rows') as timer:
+                if output.lower().endswith('las'):
+                    self.output_las(frame, output)
+                elif is_columnar(output):
+                    write_columnar(result, output, frame.minerals())
+                else:
+                    result.to_csv(output, index=False)
+                timer.count(len(result.index))
         else:
             print(result)
+
+    def flush(
+            self,
+            frame: Frame,
+            writer: StreamWriter,
+            translate: bool = False,
+            percent: bool = False):
+        """
+        Translate the rows of a frame and convert them to percentages
+        as write does, then take them from the frame and write them
+
+        Parameters
+        ----------
+        frame: Frame
+            The frame holding the rows to write
+        writer: StreamWriter
+            The output being streamed to
+        translate: bool
+            Reduce the rows by applying the translation
+        percent: bool
+            Write percentages rather than raw pixel counts
+        """
+        if not len(frame):
+            return
+        if translate:
+            frame.apply_translation(self.config.translation)
+        elif frame.requires_translation():
+            raise ConsistencyException(
+                "Detailed and reduced rows cannot be streamed to one "
+                "output without a translation")
+        result = frame.take()
+        if percent:
+            with stage('percentages', 'rows') as timer:
+                result = self.percentages(result)
+                timer.count(len(result.index))
+        with stage('write', 'rows') as timer:
+            writer.write(result)
+            timer.count(len(result.index))
+
+    def stream_files(
+            self,
+            files: Iterable[str],
+            output: Optional[str],
+            translate: bool = False,
+            percent: bool = False,
+            jobs: int = 1,
+            progress: bool = False,
+            existing: Optional[str] = None,
+            prefetch: int = PREFETCH,
+            rows: int = STREAM_ROWS,
+            maps: Optional[Dict[str, str]] = None) -> Optional[Manifest]:
+        """
+        Process files as process_files does, writing rows to a CSV file
+        a chunk at a time as they are read rather than once every file
+        is read. Each chunk is translated and converted to percentages
+        before it is written, so the memory used does not grow with
+        the number of files. Since the columns of the output are fixed
+        by the first chunk, detailed and reduced rows can only be
+        written together with a translation.
+
+        When an existing output is updated its rows are read a chunk
+        at a time too, and every row is ordered by depth through an
+        external merge sort, holding no more than a run of rows at once.
+
+        Parameters
+        ----------
+        files: Iterable[str]
+            A list of filenames to process
+        output: Optional[str]
+            The CSV file to write, or None to print it
+        translate: bool
+            Reduce the rows by applying the translation
+        percent: bool
+            Write percentages rather than raw pixel counts
+        jobs: int
+            The number of worker processes used to read files
+        progress: bool
+            Show a progress bar
+        existing: Optional[str]
+            An existing CSV output to update, as update_files does
+        prefetch: int
+            The number of files read ahead in a single process
+        rows: int
+            The number of rows held before they are written
+        maps: Optional[Dict[str, str]]
+            The file to save the mineral map of each image read to
+
+        Returns
+        -------
+        Optional[Manifest]
+            The updated manifest of the existing output, if any
+        """
+        manifest = None
+        replaced: List[Optional[Sample]] = []
+        if existing:
+            manifest = Manifest(existing)
+            known: Set[Sample] = set()
+            for chunk in pd.read_csv(existing, chunksize=rows):
+                known.update(SteinbitCreate.samples_in(chunk))
+            files = self.pending_files(files, manifest, known)
+            replaced = [manifest.sample(f) for f in files]
+        files = list(files)
+        writer = StreamWriter(output, manifest is not None, rows)
+        frame = Frame(self.extractors())
+        try:
+            for filepath, read in self.read_all(
+                    files, frame, jobs, progress, prefetch, maps):
+                try:
+                    SteinbitCreate.append_read(read, frame)
+                except ConsistencyException:
+                    print("Consistency error processing: %s" % filepath)
+                    raise
+                if manifest is not None:
+                    fields = {} if isinstance(read, pd.DataFrame) \
+                        else read[1]
+                    manifest.record(
+                        filepath, SteinbitCreate.sample_of(fields))
+                if len(frame) >= rows:
+                    self.flush(frame, writer, translate, percent)
+            if existing and manifest is not None:
+                replaced += [manifest.sample(f) for f in files]
+                samples = {x for x in replaced if x is not None}
+                for chunk in pd.read_csv(existing, chunksize=rows):
+                    previous = SteinbitCreate.samples_in(chunk)
+                    if previous:
+                        chunk = chunk[SteinbitCreate.kept(previous, samples)]
+                    if len(chunk.index):
+                        frame.append_frame(chunk.copy())
+                        self.flush(frame, writer, translate, percent)
+            self.flush(frame, writer, translate, percent)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        return manifest
+
+    def run(self, args: Namespace):
+        files = self.select_files(
+            args.files, args.index, args.well, args.depth_min,
+            args.depth_max)
+        maps = None
+        if args.maps:
+            maps = SteinbitCreate.map_outputs(
+                files, args.maps, args.compress_maps)
+            os.makedirs(args.maps, exist_ok=True)
+        if args.output and WELL_TEMPLATE in args.output:
+            if args.update or args.stream:
+                raise ValueError(
+                    "An output per well, %s, cannot be updated or "
+                    "streamed" % args.output)
+            frames = self.process_wells(
+                files, args.jobs, True, args.prefetch, maps)
+            outputs = SteinbitCreate.well_outputs(args.output, frames)
+            for well, frame in frames.items():
+                self.write(
+                    frame, outputs[well], args.translate, args.percent)
+            return
+        output = args.output or args.update
+        if args.stream:
+            for path in [output, args.update]:
+                if path and (
+                        path.lower().endswith('las') or is_columnar(path)):
+                    raise ValueError(
+                        "Only a CSV output can be streamed, not %s" % path)
+            manifest = self.stream_files(
+                files, output, args.translate, args.percent, args.jobs,
+                True, args.update, args.prefetch, maps=maps)
+            if output and manifest is not None:
+                manifest.save(output)
+            return
+        manifest = None
+        if args.update:
+            frame, manifest = self.update_files(
+                args.update, files, args.jobs, True, args.prefetch, maps)
+        else:
+            frame = self.process_files(
+                files, args.jobs, True, prefetch=args.prefetch, maps=maps)
+        self.write(
+            frame, output, args.translate, args.percent,
+            manifest is not None)
+        if output and manifest is not None:
+            manifest.save(output)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+"""
+An index of the well, depth and sample ID of images, read from their
+headers alone
+"""
+
+from argparse import ArgumentParser, Namespace
+from typing import Dict, Iterable, List, Any, Optional
+import mimetypes
+import os
+import sys
+import zlib
+import pandas as pd
+
+from .core import ImageDataExtractor, RequiredFields, Raster, read_info
+from .core.instrument import stage
+from .manifest import SAMPLE_ID
+from .tool import SteinbitTool
+
+
+# The index file used when none is given
+DEFAULT_INDEX = 'steinbit-index.csv'
+
+# The columns of an index
+COLUMNS = ['path', 'well', 'depth', SAMPLE_ID, 'size', 'mtime']
+
+
+def as_text(value: Any) -> Optional[str]:
+    """
+    Return a metadata value as text, writing whole numbers without a
+    decimal point so that a well named 7 matches 7 and not 7.0
+    """
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class ImageIndex:
+    """
+    The ImageIndex records the well, depth and sample ID of images,
+    read from the image headers without decoding any pixels, along
+    with the size and modification time of each file. It is kept in a
+    CSV file so that unchanged images are not read again, and lets a
+    selection of images be made by well and depth before any of them
+    are classified.
+    """
+
+    path: Optional[str]
+    extractor: ImageDataExtractor
+    entries: Dict[str, Dict[str, Any]]
+
+    def __init__(self, path: Optional[str], extractor: ImageDataExtractor):
+        """
+        Load an index, or start an empty index if there is none
+
+        Parameters
+        ----------
+        path: Optional[str]
+            The CSV file holding the index, or None to keep the index
+            in memory only
+        extractor: ImageDataExtractor
+            The extractor whose fields are read from image headers
+        """
+        self.path = path
+        self.extractor = extractor
+        self.entries = {}
+        if path and os.path.isfile(path):
+            frame = pd.read_csv(
+                path, dtype={'well': str, SAMPLE_ID: str},
+                keep_default_na=False, na_values=[''])
+            frame = frame.astype(object).where(frame.notna(), None)
+            self.entries = {
+                row['path']: row for row in frame.to_dict('records')}
+
+    @staticmethod
+    def walk(paths: Iterable[str]) -> List[str]:
+        """
+        Find the images in a list of files and directory trees, in
+        sorted order within each directory
+        """
+        mimetypes.init()
+        found = []
+        for path in paths:
+            if not os.path.isdir(path):
+                found.append(path)
+                continue
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    mime = mimetypes.guess_type(name)[0]
+                    if Raster.supports(name) or (
+                            mime and mime.startswith('image')):
+                        found.append(os.path.join(root, name))
+        return found
+
+    def read(self, filepath: str) -> Dict[str, Any]:
+        """
+        Return the entry for an image, reading its header only if it
+        is not in the index with its current size and modification time
+
+        Parameters
+        ----------
+        filepath: str
+            An image or raster file
+
+        Returns
+        -------
+        Dict[str, Any]
+            The path, well, depth, sample ID, size and modification
+            time of the image. Fields missing from the header are None.
+        """
+        path = os.path.abspath(filepath)
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is not None and entry['size'] == stat.st_size and \
+                entry['mtime'] == stat.st_mtime_ns:
+            return entry
+        with stage('header'):
+            try:
+                fields = self.extractor.parse_metadata(read_info(path))
+            except (OSError, zlib.error, UnicodeDecodeError):
+                fields = {}
+        depth = fields.get(RequiredFields.DEPTH.value)
+        entry = {
+            'path': path,
+            'well': as_text(fields.get(RequiredFields.WELL.value)),
+            'depth': depth if isinstance(depth, float) else None,
+            SAMPLE_ID: as_text(fields.get(SAMPLE_ID)),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns}
+        self.entries[path] = entry
+        return entry
+
+    def update(self, files: Iterable[str]) -> pd.DataFrame:
+        """
+        Bring the index up to date with a list of images
+
+        Parameters
+        ----------
+        files: Iterable[str]
+            The images to index
+
+        Returns
+        -------
+        pd.DataFrame
+            The entry of each image, in the order given
+        """
+        return pd.DataFrame(
+            [self.read(f) for f in files], columns=COLUMNS)
+
+    def save(self):
+        "Write the index to its CSV file, if it has one"
+        if self.path:
+            frame = pd.DataFrame(
+                sorted(self.entries.values(), key=lambda x: x['path']),
+                columns=COLUMNS)
+            frame.to_csv(self.path, index=False)
+
+    @staticmethod
+    def select(
+            entries: pd.DataFrame,
+            wells: Optional[List[str]] = None,
+            depth_min: Optional[float] = None,
+            depth_max: Optional[float] = None) -> pd.DataFrame:
+        """
+        Select the entries of an index in any of a list of wells and
+        within a range of depths. An entry without a well or a depth is
+        not selected by a filter on it.
+
+        Parameters
+        ----------
+        entries: pd.DataFrame
+            Entries returned by update
+        wells: Optional[List[str]]
+            The wells to select, or None for all wells
+        depth_min: Optional[float]
+            The least depth to select
+        depth_max: Optional[float]
+            The greatest depth to select
+
+        Returns
+        -------
+        pd.DataFrame
+            The entries selected
+        """
+        keep = pd.Series(True, index=entries.index)
+        if wells:
+            keep &= entries['well'].isin([as_text(w) for w in wells])
+        depths = pd.to_numeric(entries['depth'], errors='coerce')
+        if depth_min is not None:
+            keep &= depths >= depth_min
+        if depth_max is not None:
+            keep &= depths <= depth_max
+        return entries[keep]
+
+    @staticmethod
+    def add_filters(parser: ArgumentParser):
+        "Add command line arguments selecting images by well and depth"
+        parser.add_argument(
+            '--well', type=str, action='append',
+            help='only use images of this well, may be given more than once')
+        parser.add_argument(
+            '--depth-min', type=float,
+            help='only use images at this depth or deeper')
+        parser.add_argument(
+            '--depth-max', type=float,
+            help='only use images at this depth or shallower')
+
+
+class SteinbitIndex(SteinbitTool):
+    """
+    Index the images of directory trees by well and depth, reading only
+    their headers, and list those selected by the filters given
+    """
+
+    @classmethod
+    def add_arguments(cls, parser: ArgumentParser):
+        """
+        Add command line arguments for the index tool
+        """
+        parser.set_defaults(clazz=cls)
+        parser.add_argument(
+            '-i', '--index', type=str, default=DEFAULT_INDEX,
+            help='the CSV file to keep the index in')
+        parser.add_argument(
+            '-o', '--output', type=str,
+            help='a CSV file to write the selected entries to')
+        ImageIndex.add_filters(parser)
+        parser.add_argument(
+            'paths', type=str, nargs='+',
+            help='images, or directories to search for images')
+
+    def run(self, args: Namespace):
+        cfg = self.config
+        extractor = ImageDataExtractor(
+            cfg.detailed_mapping, cfg.fields, cfg.mode, cfg.budget)
+        index = ImageIndex(args.index, extractor)
+        entries = index.update(ImageIndex.walk(args.paths))
+        index.save()
+        selected = ImageIndex.select(
+            entries, args.well, args.depth_min, args.depth_max)
+        selected.to_csv(args.output or sys.stdout, index=False)
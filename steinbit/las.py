@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+
+"""
+Read and write LAS 2.0 files, parsing and formatting the data section
+a block of rows at a time
+"""
+
+from typing import Any, Collection, Iterator, List, Optional, Tuple
+import io
+import numpy as np
+import pandas as pd
+
+from .mnemonic import mnemonics
+
+
+# The width of the lines that begin each section
+HEADER_WIDTH = 60
+
+# The format of each value in the data section
+DATA_FORMAT = '%.5f'
+
+# The width each value in the data section is padded to
+DATA_WIDTH = 10
+
+# The value written in place of missing values
+NULL = -9999.25
+
+# The number of rows of the data section formatted at a time
+CHUNK_ROWS = 1024
+
+# The number of rows of the data section parsed at a time
+READ_ROWS = 65536
+
+# The items of the ~Version section: mnemonic, unit, value, description
+VERSION = [
+    ('VERS', '', 2.0, 'CWLS log ASCII Standard -VERSION 2.0'),
+    ('WRAP', '', 'NO', 'One line per depth step'),
+    ('DLM', '', 'SPACE', 'Column Data Section Delimiter')]
+
+# The mnemonic and description of each item of the ~Well section
+# after STRT, STOP, STEP, NULL and COMP, which are left empty
+WELL = [
+    ('FLD', 'FIELD'), ('LOC', 'LOCATION'), ('PROV', 'PROVINCE'),
+    ('CNTY', 'COUNTY'), ('STAT', 'STATE'), ('CTRY', 'COUNTRY'),
+    ('SRVC', 'SERVICE COMPANY'), ('DATE', 'DATE'),
+    ('UWI', 'UNIQUE WELL ID'), ('API', 'API NUMBER')]
+
+# A header item: mnemonic, unit, value and description
+Item = Tuple[str, str, Any, str]
+
+
+def section(
+        title: str,
+        items: List[Item],
+        standardize: bool = True) -> List[str]:
+    """
+    Format a header section with its items aligned in columns, the
+    value of each before the colon and its description after it. If
+    standardize is true an empty value of an item with a unit is
+    written as 0, although the columns are aligned to the value before
+    it is replaced, as lasio does.
+
+    >>> section('Params', []) == ['~Params '.ljust(HEADER_WIDTH, '-')]
+    True
+    >>> section('Curve Information', [
+    ...     ('DEPTH', 'm', '', 'depth'), ('QUARTZ', '', '', 'Quartz')],
+    ...     False)[1:]
+    ['DEPTH .m  : depth', 'QUARTZ.   : Quartz']
+    """
+    lines = [('~%s ' % title).ljust(HEADER_WIDTH, '-')]
+    if not items:
+        return lines
+    left = max(len(x[0]) for x in items)
+    middle = max(len(x[1]) + 1 + len(str(x[2])) for x in items)
+    for mnemonic, unit, value, descr in items:
+        if standardize and unit and not value and value != 0:
+            value = 0
+        if value is None:
+            value = ''
+        value = str(value)
+        lines.append('%s.%s%s%s : %s' % (
+            mnemonic.ljust(left), unit,
+            ' ' * (middle - len(unit) - len(value)), value, descr))
+    return lines
+
+
+def header(
+        depths: np.ndarray,
+        unit: str,
+        well: Any,
+        curves: List[Item]) -> List[str]:
+    """
+    Format the header sections of a LAS file. The start and stop depths
+    are those of the first and last rows and the step is the difference
+    between the first two rows.
+
+    Parameters
+    ----------
+    depths: np.ndarray
+        The depth of each row
+    unit: str
+        The unit of depth
+    well: Any
+        The name of the well
+    curves: List[Item]
+        The items of the ~Curve Information section
+    """
+    start = stop = step = None
+    if len(depths):
+        start = DATA_FORMAT % depths[0]
+        stop = DATA_FORMAT % depths[-1]
+        if start != stop:
+            step = DATA_FORMAT % (depths[1] - depths[0])
+    well_items: List[Item] = [
+        ('STRT', unit, start, 'START DEPTH'),
+        ('STOP', unit, stop, 'STOP DEPTH'),
+        ('STEP', unit, step, 'STEP'),
+        ('NULL', '', NULL, 'NULL VALUE'),
+        ('COMP', '', '', 'COMPANY'),
+        ('WELL', '', well, 'WELL')]
+    well_items += [(x, '', '', descr) for x, descr in WELL]
+    return (
+        section('Version', VERSION) + section('Well', well_items) +
+        section('Curve Information', curves, False) +
+        section('Params', []) +
+        section('Other', []))
+
+
+def format_value(value: Any) -> str:
+    "Format a single value of the data section that may not be a number"
+    try:
+        text = str(NULL) if np.isnan(value) else DATA_FORMAT % value
+    except TypeError:
+        text = str(value)
+    return ' ' + text.rjust(DATA_WIDTH)
+
+
+def format_rows(data: np.ndarray) -> str:
+    """
+    Format rows of the data section. Rows of numbers are formatted
+    together, with a single format applied to every value at once.
+
+    >>> format_rows(np.array([[1590.0, 1.5], [1591.0, np.nan]]))
+    ' 1590.00000    1.50000\\n 1591.00000   -9999.25\\n'
+    """
+    rows, columns = data.shape
+    if data.dtype.kind not in 'iuf':
+        return ''.join(
+            ''.join(format_value(x) for x in row) + '\n' for row in data)
+    field = ' %' + str(DATA_WIDTH) + DATA_FORMAT[1:]
+    text = ((field * columns + '\n') * rows) % tuple(data.ravel().tolist())
+    return text.replace(
+        (field[1:] % np.nan), str(NULL).rjust(DATA_WIDTH))
+
+
+def write_las(
+        output: str,
+        df: pd.DataFrame,
+        columns: List[str],
+        unit: str,
+        well: Any):
+    """
+    Write columns of a data frame to a LAS 2.0 file, the first column
+    being the depth. Each column is named by a mnemonic from mnemonics
+    and described by its name. The file is the same as lasio writes,
+    but the data section is formatted a block of rows at a time rather
+    than value by value.
+
+    Parameters
+    ----------
+    output: str
+        The file to write
+    df: pd.DataFrame
+        The rows to write
+    columns: List[str]
+        The columns to write, starting with the depth
+    unit: str
+        The unit of depth
+    well: Any
+        The name of the well
+    """
+    curves: List[Item] = [
+        (mnemonic, unit if index == 0 else '', '', column)
+        for index, (mnemonic, column) in enumerate(
+            zip(mnemonics(columns), columns))]
+    data = np.column_stack([df[x].to_numpy() for x in columns])
+    lines = header(data[:, 0], unit, well, curves)
+    lines.append('~ASCII '.ljust(HEADER_WIDTH, '-'))
+    with open(output, mode='w') as handle:
+        handle.write('\n'.join(lines) + '\n')
+        for start in range(0, len(data), CHUNK_ROWS):
+            handle.write(format_rows(data[start:start + CHUNK_ROWS]))
+
+
+class LASReader:
+    """
+    The LASReader reads a LAS file a block of rows at a time. Only the
+    header sections are parsed by lasio, so that they are read exactly
+    as lasio reads them, and the data section is parsed by the pandas
+    CSV parser into float columns, keeping only the curves asked for.
+    Each curve is named by its description, and the depth unit and the
+    well name from the header are added as constant columns.
+
+    Files whose data section cannot be parsed this way, such as wrapped
+    files, are not supported and should be read with lasio instead.
+    """
+
+    filepath: str
+    names: List[str]
+    unit: Any
+    well: Any
+    null: Any
+    usecols: List[int]
+    offset: Optional[int]
+    supported: bool
+
+    def __init__(
+            self,
+            filepath: str,
+            curves: Optional[Collection[str]] = None):
+        """
+        Read the header of a LAS file
+
+        Parameters
+        ----------
+        filepath: str
+            The LAS file to read
+        curves: Optional[Collection[str]]
+            The descriptions of the curves to read, in any case, or None
+            to read every curve. The first curve, the depth, is always
+            read.
+        """
+        import lasio
+        self.filepath = filepath
+        self.offset = None
+        lines = []
+        with open(filepath, 'rb') as handle:
+            offset = 0
+            for line in handle:
+                offset += len(line)
+                lines.append(line)
+                if line.lstrip().upper().startswith(b'~A'):
+                    self.offset = offset
+                    break
+        content = b''.join(lines)
+        try:
+            text = content.decode('utf-8')
+        except UnicodeDecodeError:
+            text = content.decode('latin-1')
+        header = lasio.read(io.StringIO(text), ignore_data=True)
+        self.names = [x.descr for x in header.curves]
+        self.unit = header.well.STEP.unit
+        self.well = header.well.WELL.value
+        self.null = header.well.NULL.value if 'NULL' in header.well \
+            else None
+        wanted = None if curves is None else {x.lower() for x in curves}
+        self.usecols = [
+            i for i, name in enumerate(self.names)
+            if i == 0 or wanted is None or name.lower() in wanted]
+        wrapped = str(header.version.WRAP.value).strip().upper() == 'YES'
+        self.supported = self.offset is not None and bool(self.names) and \
+            not wrapped and float(header.version.VERS.value) < 3
+
+    def chunks(self, rows: int = READ_ROWS) -> Iterator[pd.DataFrame]:
+        """
+        Read the data section a block of rows at a time
+
+        Parameters
+        ----------
+        rows: int
+            The number of rows in each block
+
+        Returns
+        -------
+        Iterator[pd.DataFrame]
+            Each block of rows, with a float column for each curve read
+            and a column for the depth unit and well name
+        """
+        from .core import RequiredFields
+        names = [self.names[i] for i in self.usecols]
+        with open(self.filepath, 'rb') as handle:
+            handle.seek(self.offset or 0)
+            try:
+                reader = pd.read_csv(
+                    handle, sep=r'\s+', header=None, comment='#',
+                    names=list(range(len(self.names))),
+                    usecols=self.usecols, dtype=np.float64,
+                    chunksize=rows)
+                blocks = iter(reader)
+            except pd.errors.EmptyDataError:
+                blocks = iter([pd.DataFrame(
+                    {i: np.empty(0) for i in self.usecols})])
+            for block in blocks:
+                values = block[self.usecols].to_numpy()
+                if self.null is not None:
+                    values[values == float(self.null)] = np.nan
+                frame = pd.DataFrame(values, columns=names)
+                frame[RequiredFields.D_UNIT.value] = self.unit
+                frame[RequiredFields.WELL.value] = self.well
+                yield frame
+
+    def read(self) -> pd.DataFrame:
+        "Read the whole data section"
+        blocks = list(self.chunks())
+        return blocks[0] if len(blocks) == 1 else \
+            pd.concat(blocks, ignore_index=True)
+
+
+def read_lasio(
+        filepath: str,
+        curves: Optional[Collection[str]] = None) -> pd.DataFrame:
+    """
+    Read a LAS file entirely with lasio, with the same columns as the
+    LASReader, for files the reader does not support
+
+    Parameters
+    ----------
+    filepath: str
+        The LAS file to read
+    curves: Optional[Collection[str]]
+        The descriptions of the curves to read, or None for every curve
+    """
+    import lasio
+    from .core import RequiredFields
+    lasfile = lasio.read(filepath)
+    frame = lasfile.df().reset_index().rename(
+        columns={x.mnemonic: x.descr for x in lasfile.curves})
+    if curves is not None:
+        wanted = {x.lower() for x in curves}
+        frame = frame[[
+            x for i, x in enumerate(frame.columns)
+            if i == 0 or str(x).lower() in wanted]]
+    frame[RequiredFields.D_UNIT.value] = lasfile.well.STEP.unit
+    frame[RequiredFields.WELL.value] = lasfile.well.WELL.value
+    return frame
+
+
+def iter_las(
+        filepath: str,
+        curves: Optional[Collection[str]] = None,
+        rows: int = READ_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Read a LAS file a block of rows at a time with the LASReader, or
+    in a single block with lasio if the reader does not support it
+
+    Parameters
+    ----------
+    filepath: str
+        The LAS file to read
+    curves: Optional[Collection[str]]
+        The descriptions of the curves to read, or None for every curve
+    rows: int
+        The number of rows in each block
+    """
+    reader = LASReader(filepath, curves)
+    if reader.supported:
+        yield from reader.chunks(rows)
+    else:
+        yield read_lasio(filepath, curves)
+
+
+def read_las(
+        filepath: str,
+        curves: Optional[Collection[str]] = None) -> pd.DataFrame:
+    """
+    Read a LAS file with the LASReader, falling back to lasio for files
+    the reader does not support or whose data section is not numeric
+
+    Parameters
+    ----------
+    filepath: str
+        The LAS file to read
+    curves: Optional[Collection[str]]
+        The descriptions of the curves to read, or None for every curve
+
+    Returns
+    -------
+    pd.DataFrame
+        A column for each curve read, named by its description, and
+        the depth unit and well name
+    """
+    reader = LASReader(filepath, curves)
+    if reader.supported:
+        try:
+            return reader.read()
+        except ValueError:
+            pass
+    return read_lasio(filepath, curves)
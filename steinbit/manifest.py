@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+A record of the files an output was built from
+"""
+
+from typing import Dict, Tuple, Any, Optional
+import json
+import os
+
+
+# The metadata field that, with the depth, identifies a sample
+SAMPLE_ID = 'rtid'
+
+# The identity of a sample: its depth and its sample ID, if any
+Sample = Tuple[float, Optional[str]]
+
+
+class Manifest:
+    """
+    The Manifest is kept beside an output file and records the size
+    and modification time of every file the output was built from,
+    along with the depth and sample ID of each image. When the output
+    is updated, files whose size and modification time are unchanged
+    are not read again and rows from changed images can be replaced.
+    """
+
+    files: Dict[str, Dict[str, Any]]
+
+    def __init__(self, output: str):
+        """
+        Load the manifest of an output file, or start an empty
+        manifest if there is none
+
+        Parameters
+        ----------
+        output: str
+            The output file the manifest describes
+        """
+        path = Manifest.path_for(output)
+        self.files = {}
+        if os.path.isfile(path):
+            with open(path) as handle:
+                self.files = json.load(handle).get('files', {})
+
+    @staticmethod
+    def path_for(output: str) -> str:
+        "Return the manifest filename for an output file"
+        return output + '.manifest.json'
+
+    @staticmethod
+    def identity(filepath: str) -> Dict[str, Any]:
+        "Return the size and modification time of a file"
+        stat = os.stat(filepath)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def unchanged(self, filepath: str) -> bool:
+        """
+        Return true if a file is recorded with its current size and
+        modification time
+        """
+        entry = self.files.get(os.path.abspath(filepath))
+        if entry is None:
+            return False
+        identity = Manifest.identity(filepath)
+        return all(entry.get(k) == v for k, v in identity.items())
+
+    def sample(self, filepath: str) -> Optional[Sample]:
+        "Return the sample last recorded for a file, if any"
+        entry = self.files.get(os.path.abspath(filepath), {})
+        if entry.get('depth') is None:
+            return None
+        return entry['depth'], entry.get('rtid')
+
+    def record(self, filepath: str, sample: Optional[Sample] = None):
+        """
+        Record the current identity of a file
+
+        Parameters
+        ----------
+        filepath: str
+            The file read
+        sample: Optional[Sample]
+            The depth and sample ID of an image
+        """
+        entry = Manifest.identity(filepath)
+        if sample is not None:
+            entry['depth'], entry['rtid'] = sample
+        self.files[os.path.abspath(filepath)] = entry
+
+    def save(self, output: str):
+        "Write the manifest beside an output file"
+        with open(Manifest.path_for(output), 'w') as handle:
+            json.dump({'files': self.files}, handle, indent=1, sort_keys=True)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+A pipeline of stages run by threads, overlapping the input and output
+of some items with the computation of others
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import (
+    Any, Callable, Deque, Generator, Iterable, List, Tuple
+)
+import collections
+import threading
+
+
+class Pipeline:
+    """
+    A Pipeline passes each item through a sequence of stages, each run
+    by its own pool of threads, so that one item can be read while
+    another is decoded and the caller works on a third. Stages that
+    wait on files, even on network filesystems with a high latency for
+    each file, then overlap with those that compute. No more than a
+    fixed number of items are in the pipeline at once, which caps the
+    memory used: the next item is only started as the caller takes the
+    result of an earlier one. Results are returned in the order of the
+    items, and an exception raised by a stage is raised to the caller
+    in place of the result of its item.
+    """
+
+    stages: List[Tuple[Callable[[Any], Any], int]]
+    capacity: int
+
+    def __init__(
+            self,
+            stages: List[Tuple[Callable[[Any], Any], int]],
+            capacity: int):
+        """
+        Construct a pipeline
+
+        Parameters
+        ----------
+        stages: List[Tuple[Callable[[Any], Any], int]]
+            The function of each stage, applied to the result of the
+            stage before, and the number of threads that run it
+        capacity: int
+            The largest number of items in the pipeline at once
+        """
+        self.stages = stages
+        self.capacity = max(1, capacity)
+
+    def run(self, items: Iterable[Any]) -> Generator[Any, None, None]:
+        """
+        Pass items through the pipeline
+
+        Parameters
+        ----------
+        items: Iterable[Any]
+            The items to pass to the first stage. Each item may instead
+            be a Future, whose result is returned in its place without
+            passing through the stages.
+
+        Returns
+        -------
+        Generator[Any, None, None]
+            The result of the last stage for each item, in order
+        """
+        executors = [
+            ThreadPoolExecutor(max_workers=max(1, threads))
+            for _, threads in self.stages]
+        functions = [function for function, _ in self.stages]
+        closed = threading.Event()
+
+        def step(index: int, value: Any, result: Future):
+            if closed.is_set():
+                return
+            if index == len(functions):
+                result.set_result(value)
+                return
+            try:
+                future = executors[index].submit(functions[index], value)
+            except RuntimeError:
+                return
+
+            def done(future: Future):
+                try:
+                    value = future.result()
+                except BaseException as error:
+                    result.set_exception(error)
+                    return
+                step(index + 1, value, result)
+            future.add_done_callback(done)
+
+        pending: Deque[Future] = collections.deque()
+        try:
+            for item in items:
+                if isinstance(item, Future):
+                    pending.append(item)
+                else:
+                    result: Future = Future()
+                    step(0, item, result)
+                    pending.append(result)
+                if len(pending) >= self.capacity:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            closed.set()
+            for executor in executors:
+                executor.shutdown(wait=True)
@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 
+# The tools import pandas and PIL with their modules, as each subcommand,
+# index included, reads or writes its tables and images with them; only
+# the dependencies of particular operations are imported when first used
 from .config import Config
+from .core import CompositionMode
+from .core import instrument
 from .create import SteinbitCreate
 from .compare import SteinbitCompare
+from .index import SteinbitIndex
 
 import traceback
 import argparse
+import json
 
 
 def main() -> int:
@@ -15,19 +22,46 @@ def main() -> int:
     parser.add_argument(
         '-c', '--config', type=str,
         help='a configuration file to use instead of the default')
+    parser.add_argument(
+        '-m', '--mode', type=str,
+        choices=[m.value for m in CompositionMode],
+        help='the method used to classify image pixels')
+    parser.add_argument(
+        '--cache-dir', type=str,
+        help='the directory to cache image compositions in')
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='classify every image instead of using cached compositions')
+    parser.add_argument(
+        '--profile', type=str, metavar='REPORT',
+        help='write a JSON report of the time and memory of each stage')
+    parser.add_argument(
+        '--profile-time', action='store_true',
+        help='profile time only, without tracing memory')
     subparsers = parser.add_subparsers()
     subparsers.required = True
     subparsers.dest = 'command'
     SteinbitCreate.add_arguments(subparsers.add_parser('create'))
     SteinbitCompare.add_arguments(subparsers.add_parser('compare'))
+    SteinbitIndex.add_arguments(subparsers.add_parser('index'))
 
     args = parser.parse_args()
-    obj = args.clazz(Config(args.config))
+    config = Config(args.config, args.cache_dir, not args.no_cache)
+    if args.mode:
+        config.mode = CompositionMode(args.mode)
+    obj = args.clazz(config)
+    if args.profile:
+        instrument.start(memory=not args.profile_time)
     try:
         obj.run(args)
     except Exception:
         traceback.print_exc()
         return 1
+    finally:
+        profiler = instrument.stop()
+        if profiler is not None:
+            with open(args.profile, 'w') as handle:
+                json.dump(profiler.report(), handle, indent=1)
     return 0
 
 
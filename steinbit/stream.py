@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+"""
+Write rows to a CSV file a chunk at a time, in constant memory
+"""
+
+from typing import Any, IO, List, Optional
+import csv
+import heapq
+import math
+import os
+import sys
+import tempfile
+import pandas as pd
+
+from .core import ConsistencyException, RequiredFields
+
+
+# The number of rows held in memory before they are written
+STREAM_ROWS = 4096
+
+# The largest number of sorted runs merged at once
+FAN_IN = 32
+
+
+class ExternalSort:
+    """
+    The ExternalSort orders rows by depth without holding them all in
+    memory. Rows are gathered into runs of a fixed number of rows, each
+    run is sorted and written to a temporary CSV file, and the runs are
+    then merged a line at a time. When there are more runs than can be
+    merged at once, runs are first merged into longer runs. Rows at the
+    same depth keep the order they were added in, as they do in
+    Frame.order_by_depth.
+    """
+
+    directory: str
+    columns: List[str]
+    rows: int
+    fan_in: int
+    __depth: int
+    __pending: List[pd.DataFrame]
+    __count: int
+    __runs: List[str]
+    __written: int
+
+    def __init__(
+            self,
+            directory: str,
+            columns: List[str],
+            rows: int = STREAM_ROWS,
+            fan_in: int = FAN_IN):
+        """
+        Construct an empty sort
+
+        Parameters
+        ----------
+        directory: str
+            The directory to write sorted runs to
+        columns: List[str]
+            The columns of every row, which must include the depth
+        rows: int
+            The number of rows in each sorted run
+        fan_in: int
+            The largest number of runs merged at once
+        """
+        depth = RequiredFields.DEPTH.match_name(columns)
+        if depth is None:
+            raise ConsistencyException(
+                "Required column %s is missing" %
+                RequiredFields.DEPTH.value)
+        self.directory = directory
+        self.columns = columns
+        self.rows = max(1, rows)
+        self.fan_in = max(2, fan_in)
+        self.__depth = columns.index(depth)
+        self.__pending = []
+        self.__count = 0
+        self.__runs = []
+        self.__written = 0
+
+    def add(self, df: pd.DataFrame):
+        """
+        Add rows to the sort, writing a sorted run once enough rows
+        are held
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            Rows with the columns of the sort
+        """
+        self.__pending.append(df)
+        self.__count += len(df.index)
+        if self.__count >= self.rows:
+            self.__spill()
+
+    def __spill(self):
+        "Sort the rows held and write them as a run"
+        if not self.__count:
+            return
+        df = pd.concat(self.__pending)
+        df = df.sort_values(self.columns[self.__depth], kind='mergesort')
+        path = self.__run()
+        df.to_csv(path, index=False, header=False)
+        self.__runs.append(path)
+        self.__pending = []
+        self.__count = 0
+
+    def __run(self) -> str:
+        "Return the filename of a new run"
+        self.__written += 1
+        return os.path.join(self.directory, 'run%06d.csv' % self.__written)
+
+    def __key(self, line: Any) -> float:
+        "The depth of a line of a run, missing depths last"
+        try:
+            depth = float(line[self.__depth])
+        except ValueError:
+            return math.inf
+        return math.inf if math.isnan(depth) else depth
+
+    def __merge(self, runs: List[str], handle: IO[str]):
+        "Merge sorted runs into a single sorted run"
+        handles = [open(path, newline='') for path in runs]
+        try:
+            writer = csv.writer(handle, lineterminator='\n')
+            writer.writerows(heapq.merge(
+                *[csv.reader(x) for x in handles], key=self.__key))
+        finally:
+            for x in handles:
+                x.close()
+        for path in runs:
+            os.remove(path)
+
+    def write(self, handle: IO[str]):
+        """
+        Write every row added, ordered by depth, without a header
+
+        Parameters
+        ----------
+        handle: IO[str]
+            The file to write to
+        """
+        self.__spill()
+        while len(self.__runs) > self.fan_in:
+            runs = []
+            for start in range(0, len(self.__runs), self.fan_in):
+                path = self.__run()
+                with open(path, 'w', newline='') as merged:
+                    self.__merge(
+                        self.__runs[start:start + self.fan_in], merged)
+                runs.append(path)
+            self.__runs = runs
+        self.__merge(self.__runs, handle)
+        self.__runs = []
+
+
+class StreamWriter:
+    """
+    The StreamWriter appends rows to a CSV file as they are produced,
+    so that the rows of an output need never be held in memory at once.
+    The columns are fixed by the first rows written; later rows are
+    written in the same order of columns, with any column they lack
+    left empty, and a row with a column that was not in the first rows
+    is an error. Rows may instead be ordered by depth through an
+    ExternalSort. The output is written to a temporary file and only
+    replaces the output file when the writer is closed, so that the
+    output being updated can be read while it is written.
+    """
+
+    output: Optional[str]
+    order: bool
+    rows: int
+    columns: Optional[List[str]]
+    __handle: Optional[IO[str]]
+    __directory: Optional[tempfile.TemporaryDirectory]
+    __sort: Optional[ExternalSort]
+
+    def __init__(
+            self,
+            output: Optional[str],
+            order: bool = False,
+            rows: int = STREAM_ROWS):
+        """
+        Construct a writer
+
+        Parameters
+        ----------
+        output: Optional[str]
+            The CSV file to write to, or None to write to standard output
+        order: bool
+            Order the rows by depth
+        rows: int
+            The number of rows in each sorted run, if ordering by depth
+        """
+        self.output = output
+        self.order = order
+        self.rows = rows
+        self.columns = None
+        self.__handle = None
+        self.__directory = None
+        self.__sort = None
+
+    def __open(self, columns: List[str]):
+        "Open the output and write the header"
+        self.columns = columns
+        handle: IO[str] = sys.stdout
+        if self.output is not None:
+            handle = tempfile.NamedTemporaryFile(
+                'w', dir=os.path.dirname(os.path.abspath(self.output)),
+                suffix='.tmp', delete=False, newline='')
+        csv.writer(handle, lineterminator='\n').writerow(columns)
+        self.__handle = handle
+        if self.order:
+            self.__directory = tempfile.TemporaryDirectory()
+            self.__sort = ExternalSort(
+                self.__directory.name, columns, self.rows)
+
+    def write(self, df: pd.DataFrame):
+        """
+        Write rows to the output
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            The rows to write
+        """
+        if self.columns is None:
+            self.__open([str(x) for x in df.columns])
+        assert self.columns is not None
+        extra = [x for x in df.columns if x not in self.columns]
+        if extra:
+            raise ConsistencyException(
+                "Columns [%s] are not in the output, "
+                "a translation may be needed" %
+                ", ".join(str(x) for x in extra))
+        df = df.reindex(columns=self.columns)
+        if self.__sort is not None:
+            self.__sort.add(df)
+        else:
+            df.to_csv(self.__handle, index=False, header=False)
+
+    def close(self):
+        """
+        Finish the output, merging the rows if they are ordered and
+        replacing the output file
+        """
+        if self.__handle is None:
+            return
+        try:
+            if self.__sort is not None:
+                self.__sort.write(self.__handle)
+        finally:
+            if self.__directory is not None:
+                self.__directory.cleanup()
+        if self.output is not None:
+            self.__handle.close()
+            os.replace(self.__handle.name, self.output)
+        self.__handle = None
+
+    def abort(self):
+        "Abandon the output, leaving any existing output file as it was"
+        if self.__directory is not None:
+            self.__directory.cleanup()
+        if self.__handle is not None and self.output is not None:
+            self.__handle.close()
+            os.remove(self.__handle.name)
+        self.__handle = None
@@ -0,0 +1,28 @@
+import unittest
+from steinbit.core.buffer import ColumnBuffer
+import pandas as pd
+import numpy as np
+
+
+class ColumnBufferTest(unittest.TestCase):
+
+    def test_rows_and_frames(self):
+        buffer = ColumnBuffer(capacity=1)
+        buffer.append({'a': 1, 'well': 'w'})
+        buffer.extend(pd.DataFrame({'a': [2, 3], 'b': [0.5, 1.5]}))
+        buffer.append({'a': 4, 'well': 'w'})
+        frame = buffer.frame()
+        self.assertListEqual(list(frame.columns), ['a', 'well', 'b'])
+        self.assertListEqual(frame['a'].tolist(), [1, 2, 3, 4])
+        self.assertEqual(frame['a'].dtype, np.int64)
+        self.assertListEqual(frame['well'].tolist()[::3], ['w', 'w'])
+        self.assertTrue(frame['well'][1:3].isna().all())
+        self.assertTrue(np.isnan(frame['b'][0]))
+        self.assertListEqual(buffer.distinct('well', 0)[::2], ['w'])
+
+    def test_promotion(self):
+        buffer = ColumnBuffer()
+        buffer.append({'a': 1})
+        buffer.append({'a': 2.5})
+        buffer.append({'a': 'x'})
+        self.assertListEqual(buffer.frame()['a'].tolist(), [1, 2.5, 'x'])
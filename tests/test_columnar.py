@@ -0,0 +1,76 @@
+import unittest
+import os
+import tempfile
+from steinbit.config import Config
+from steinbit.core import ColourMapping
+from steinbit.create import SteinbitCreate
+from steinbit.columnar import is_columnar
+from .test_create import DATA, write_config, write_image
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class ColumnarTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = Config(
+            write_config(self.directory.name), use_cache=False)
+        mapping = ColourMapping(pd.read_csv(os.path.join(DATA, 'bls.csv')))
+        self.files = [
+            write_image(
+                self.path('image%d.png' % i), mapping, 1590 + i, (10, 20),
+                seed=i)
+            for i in range(3)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_columnar_files_are_not_images(self):
+        for name in ['a.parquet', 'a.PQ', 'a.arrow', 'a.feather', 'a.ipc']:
+            self.assertTrue(is_columnar(name))
+            self.assertFalse(SteinbitCreate.is_image(name))
+        self.assertFalse(is_columnar('a.csv'))
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_round_trip_matches_csv(self):
+        create = SteinbitCreate(self.config)
+        for percent in [False, True]:
+            create.write(
+                create.process_files(self.files), self.path('expected.csv'),
+                percent=percent)
+            expected = SteinbitCreate.read_table(self.path('expected.csv'))
+            for name in ['sheet.parquet', 'sheet.arrow']:
+                create.write(
+                    create.process_files(self.files), self.path(name),
+                    percent=percent)
+                read = SteinbitCreate.read_table(self.path(name))
+                pd.testing.assert_frame_equal(
+                    read, expected, check_dtype=False, rtol=1e-6)
+                reread = create.process_files([self.path(name)]).result()
+                self.assertListEqual(
+                    list(reread.columns), list(expected.columns))
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_typed_columns(self):
+        import pyarrow.parquet
+        create = SteinbitCreate(self.config)
+        mineral = self.config.detailed_mapping.minerals[0]
+        for percent, kind in [(False, pyarrow.uint32()),
+                              (True, pyarrow.float32())]:
+            output = self.path('sheet.parquet')
+            create.write(
+                create.process_files(self.files), output, percent=percent)
+            schema = pyarrow.parquet.read_schema(output)
+            self.assertEqual(schema.field(mineral).type, kind)
+            self.assertTrue(pyarrow.types.is_dictionary(
+                schema.field('well').type))
+            self.assertTrue(pyarrow.types.is_dictionary(
+                schema.field('d_unit').type))
@@ -0,0 +1,73 @@
+import unittest
+import os
+import io
+import json
+import tempfile
+import contextlib
+from argparse import Namespace
+from steinbit.config import Config
+from steinbit.core import ColourMapping
+from steinbit.create import SteinbitCreate
+from steinbit.compare import SteinbitCompare
+from .test_create import DATA, write_config, write_image
+import pandas as pd
+
+
+class SteinbitCompareTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = Config(
+            write_config(self.directory.name), use_cache=False)
+        mapping = ColourMapping(pd.read_csv(os.path.join(DATA, 'bls.csv')))
+        images = [
+            write_image(
+                os.path.join(self.directory.name, 'image%d.png' % i),
+                mapping, 1590 + i, (10, 20), seed=i)
+            for i in range(3)]
+        result = SteinbitCreate(self.config).process_files(images).result()
+        for name in ['first', 'second']:
+            os.mkdir(self.path(name))
+        result.to_csv(self.path('first', 'a.csv'), index=False)
+        result['depth'] += 0.001
+        result.loc[1, mapping.minerals[2]] += 5
+        result.to_csv(self.path('second', 'b.csv'), index=False)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.directory.name, *names)
+
+    def run_compare(self, **kwargs):
+        args = Namespace(
+            file1=None, file2=None, tolerance=0.01, diff=None, pairs=None,
+            jobs=1, report=self.path('report.json'))
+        args.__dict__.update(kwargs)
+        compare = SteinbitCompare(self.config)
+        loaded = []
+        load = compare.load
+        compare.load = lambda x: loaded.append(x) or load(x)
+        with contextlib.redirect_stdout(io.StringIO()):
+            compare.run(args)
+        with open(args.report) as handle:
+            return json.load(handle)['pairs'], loaded
+
+    def test_pairs_parse_each_file_once(self):
+        with open(self.path('pairs.csv'), 'w') as handle:
+            handle.write(
+                'file1,file2\nfirst/a.csv,second/b.csv\n'
+                'first/a.csv,first/a.csv\n')
+        pairs, loaded = self.run_compare(pairs=self.path('pairs.csv'))
+        self.assertEqual(len(loaded), 2)
+        self.assertListEqual(pairs[0]['matched'], [3, 3])
+        mineral = self.config.detailed_mapping.minerals[2]
+        self.assertListEqual(list(pairs[0]['columns']), [mineral])
+        self.assertEqual(pairs[0]['columns'][mineral]['max'], 5)
+        self.assertDictEqual(pairs[1]['columns'], {})
+
+    def test_directories_are_paired_by_well(self):
+        pairs, _ = self.run_compare(
+            file1=self.path('first'), file2=self.path('second'))
+        self.assertEqual(len(pairs), 1)
+        self.assertEqual(pairs[0]['file2'], self.path('second', 'b.csv'))
@@ -0,0 +1,46 @@
+import unittest
+from steinbit.core import Comparison
+import pandas as pd
+import numpy as np
+from numpy.testing import assert_array_equal, assert_allclose
+
+FIRST = pd.DataFrame({
+    'depth': [1.0, 2.0, 3.0, 5.0],
+    'well': ['w', 'w', 'w', 'w'],
+    'A': [1, 2, 3, 4],
+    'B': [1.0, 2.0, np.nan, 4.0]
+})
+
+SECOND = pd.DataFrame({
+    'Depth': [2.004, 0.999, 3.02, 4.0],
+    'A': [2, 2, 3, 9],
+    'B': [1.0, 2.0, 3.0, 4.0],
+    'C': [0, 0, 0, 0]
+})
+
+
+class ComparisonTest(unittest.TestCase):
+
+    def test_aligns_by_nearest_depth(self):
+        comparison = Comparison(FIRST, SECOND, tolerance=0.05)
+        self.assertListEqual(comparison.columns, ['A', 'B'])
+        self.assertListEqual(comparison.rows, [4, 4])
+        self.assertListEqual(comparison.matched, [3, 3])
+        diff = comparison.diff()
+        self.assertListEqual(
+            list(diff.columns), ['depth_1', 'depth_2', 'A', 'B'])
+        assert_array_equal(diff['depth_2'], [0.999, 2.004, 3.02])
+        assert_array_equal(diff['A'], [1, 0, 0])
+        self.assertTrue(np.isnan(diff['B'][2]))
+
+    def test_tolerance_limits_matches(self):
+        comparison = Comparison(FIRST, SECOND, tolerance=0.01)
+        self.assertListEqual(comparison.matched, [2, 2])
+
+    def test_summary(self):
+        summary = Comparison(FIRST, SECOND).summary()
+        assert_array_equal(summary['rows'], [3, 2])
+        assert_allclose(summary['bias'], [1 / 3, 0])
+        assert_allclose(summary['rmse'], [np.sqrt(1 / 3), 1])
+        assert_allclose(summary['max'], [1, 1])
+        assert_allclose(summary['corr'], [np.sqrt(3) / 2, -1])
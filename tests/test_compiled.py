@@ -0,0 +1,106 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+from steinbit.cache import CompositionCache
+from steinbit.config import Config
+from steinbit.core import ColourMapping, ColourLookup
+from .test_create import DATA, CONFIG
+import pandas as pd
+import numpy as np
+from numpy.testing import assert_array_equal
+
+CACHE = """
+[Cache]
+Directory = {data}/cache
+"""
+
+
+class CompiledConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for name in ['bls.csv', 'rs.csv', 'translation.csv']:
+            shutil.copy(os.path.join(DATA, name), self.path(name))
+        with open(self.path('steinbit.cfg'), 'w') as handle:
+            handle.write((CONFIG + CACHE).format(data=self.directory.name))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.directory.name, *names)
+
+    def load(self):
+        with mock.patch('pandas.read_csv', side_effect=pd.read_csv) as read:
+            config = Config(self.path('steinbit.cfg'))
+        return config, read.call_count
+
+    def test_tables_are_read_once(self):
+        first, reads = self.load()
+        self.assertEqual(reads, 3)
+        second, reads = self.load()
+        self.assertEqual(reads, 0)
+        self.assertListEqual(
+            second.detailed_mapping.minerals, first.detailed_mapping.minerals)
+        assert_array_equal(
+            second.reduced_mapping.colours, first.reduced_mapping.colours)
+        self.assertListEqual(
+            second.translation.detailed, first.translation.detailed)
+        assert_array_equal(
+            second.translation.matrix.toarray(),
+            first.translation.matrix.toarray())
+
+    def test_changed_tables_are_read_again(self):
+        self.load()
+        os.utime(self.path('rs.csv'), ns=(0, 0))
+        self.assertEqual(self.load()[1], 0)
+        with open(self.path('translation.csv'), 'a') as handle:
+            handle.write('Quartz,Quartz\n')
+        self.assertEqual(self.load()[1], 3)
+
+    def test_cache_overrides_are_compiled_into(self):
+        config = Config(self.path('steinbit.cfg'), self.path('other'))
+        self.assertEqual(config.cache_directory, self.path('other'))
+        self.assertEqual(len(os.listdir(self.path('other', 'config'))), 4)
+        config = Config(self.path('steinbit.cfg'), use_cache=False)
+        self.assertIsNone(config.cache_directory)
+        self.assertIsNone(config.reduced_mapping.lookup_directory)
+        self.assertFalse(os.path.exists(self.path('cache')))
+
+    def test_lookup_is_stored(self):
+        colours = np.array([[0, 0, 0], [255, 0, 0], [0, 0, 255]])
+        mapping = ColourMapping(pd.DataFrame({
+            'Name': ['A', 'B', 'C'],
+            'R': colours[:, 0], 'G': colours[:, 1], 'B': colours[:, 2]}))
+        mapping.lookup_directory = self.path('lookup')
+        built = mapping.lookup()
+        stored = ColourLookup.stored(colours, self.path('lookup'))
+        self.assertIsInstance(stored.indices, np.memmap)
+        assert_array_equal(stored.indices, built.indices)
+        assert_array_equal(stored.distances, ColourLookup(colours).distances)
+
+    def test_tables_have_own_limit(self):
+        config = self.load()[0]
+        lookups = config.reduced_mapping.lookup_directory
+        unused = ColourLookup.stored(np.array([[0, 0, 0]]), lookups)
+        del unused
+        for name in os.listdir(lookups):
+            os.utime(os.path.join(lookups, name), ns=(0, 0))
+        config.reduced_mapping.lookup()
+
+        def stored():
+            return {
+                os.path.join(root, x)
+                for root in [self.path('cache', 'config'), lookups]
+                for x in os.listdir(root)}
+        used = {x for x in stored() if os.path.getmtime(x) > 0}
+        self.assertEqual((len(stored()), len(used)), (8, 6))
+        CompositionCache(self.path('cache'), [], 0).close()
+        self.assertEqual(len(stored()), 8)
+        CompositionCache(
+            self.path('cache'), [], table_limit=sum(
+                os.path.getsize(x) for x in used)).close()
+        self.assertSetEqual(stored(), used)
+        self.assertEqual(self.load()[1], 0)
@@ -0,0 +1,296 @@
+import unittest
+import os
+import shutil
+import tempfile
+from argparse import Namespace
+from unittest import mock
+from steinbit.config import Config
+from steinbit.core import ColourMapping, Frame, instrument
+from steinbit.create import SteinbitCreate
+from steinbit.cache import CompositionCache
+import pandas as pd
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+DATA = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+
+CONFIG = """
+[Mapping]
+DetailedMapping = {data}/bls.csv
+ReducedMapping = {data}/rs.csv
+Translation = {data}/translation.csv
+
+[Fields]
+Wellbore = Wellbore
+Well = Wellbore
+Depth = Depth
+D_unit = Depth
+RtID = RtID
+
+[Regexes]
+Well = [ _]*([0-9/-]*).*
+Depth = ([0-9][0-9\\.]*)
+D_unit = [0-9\\.]*(.*)
+"""
+
+
+def write_config(directory):
+    path = os.path.join(directory, 'steinbit.cfg')
+    with open(path, 'w') as handle:
+        handle.write(CONFIG.format(data=DATA))
+    return path
+
+
+def write_image(path, mapping, depth, size, seed=0, well='25/2-18'):
+    rng = np.random.default_rng(seed)
+    pixels = mapping.colours[rng.integers(0, len(mapping.colours), size)]
+    info = PngImagePlugin.PngInfo()
+    info.add_text(
+        'Description',
+        'Wellbore:_%s_C;Depth:%gm;RtID:RN2-%03d' % (well, depth, seed))
+    Image.fromarray(pixels, 'RGB').save(path, pnginfo=info)
+    return path
+
+
+class SteinbitCreateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = Config(
+            write_config(self.directory.name),
+            os.path.join(self.directory.name, 'cache'))
+        mapping = ColourMapping(pd.read_csv(os.path.join(DATA, 'bls.csv')))
+        self.files = [
+            write_image(
+                os.path.join(self.directory.name, 'image%d.png' % i),
+                mapping, 1590 + i, (10 + 5 * i, 20), seed=i)
+            for i in range(4)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_parallel_matches_serial(self):
+        create = SteinbitCreate(self.config)
+        serial = create.process_files(self.files).result()
+        parallel = create.process_files(self.files, jobs=2).result()
+        pd.testing.assert_frame_equal(serial, parallel)
+        self.assertListEqual(
+            serial['depth'].tolist(), [1590.0, 1591.0, 1592.0, 1593.0])
+
+    def test_pipeline_matches_serial(self):
+        create = SteinbitCreate(self.config)
+        serial = create.process_files(self.files, prefetch=0).result()
+        for _ in range(2):
+            pipelined = create.process_files(self.files, prefetch=2).result()
+            pd.testing.assert_frame_equal(serial, pipelined)
+
+    def test_output_per_well(self):
+        self.config.cache_directory = None
+        mapping = ColourMapping(pd.read_csv(os.path.join(DATA, 'bls.csv')))
+        other = [
+            write_image(
+                os.path.join(self.directory.name, 'other%d.png' % i),
+                mapping, 2000 + i, (10, 20), seed=i, well='7/11-1')
+            for i in range(2)]
+        create = SteinbitCreate(self.config)
+        table = os.path.join(self.directory.name, 'table.csv')
+        create.process_files(other[:1]).result().to_csv(table, index=False)
+        files = [self.files[0], other[1], self.files[1], table]
+        for jobs in [1, 2]:
+            template = os.path.join(
+                self.directory.name, '%d-{well}.csv' % jobs)
+            create.run(Namespace(
+                files=files, output=template, update=None, jobs=jobs,
+                translate=False, percent=False, index=None, well=None,
+                depth_min=None, depth_max=None, prefetch=2, stream=False,
+                maps=None, compress_maps=False))
+            first = pd.read_csv(template.format(well='25_2-18'))
+            second = pd.read_csv(template.format(well='7_11-1'))
+            self.assertListEqual(first['depth'].tolist(), [1590.0, 1591.0])
+            self.assertListEqual(second['depth'].tolist(), [2001.0, 2000.0])
+            self.assertListEqual(second['well'].tolist(), ['7/11-1'] * 2)
+
+    def test_wells_sharing_an_output(self):
+        template = os.path.join(self.directory.name, '{well}.csv')
+        for wells in [['25/2-18', '25 2-18'], ['unknown', None]]:
+            with self.assertRaises(ValueError):
+                SteinbitCreate.well_outputs(template, wells)
+        self.assertDictEqual(
+            SteinbitCreate.well_outputs(template, ['25/2-18', None]),
+            {'25/2-18': template.format(well='25_2-18'),
+             None: template.format(well='unknown')})
+        create = SteinbitCreate(self.config)
+        table = create.process_files(self.files[1:2]).result()
+        table['well'] = '25 2-18'
+        other = os.path.join(self.directory.name, 'table.csv')
+        table.to_csv(other, index=False)
+        with self.assertRaises(ValueError):
+            create.run(Namespace(
+                files=[self.files[0], other], output=template, update=None,
+                jobs=1, translate=False, percent=False, index=None,
+                well=None, depth_min=None, depth_max=None, prefetch=2,
+                stream=False, maps=None, compress_maps=False))
+        self.assertFalse(os.path.exists(template.format(well='25_2-18')))
+
+    def test_stream_matches_write(self):
+        self.config.cache_directory = None
+        create = SteinbitCreate(self.config)
+        expected = os.path.join(self.directory.name, 'expected.csv')
+        streamed = os.path.join(self.directory.name, 'streamed.csv')
+        for translate, percent in [(False, False), (True, True)]:
+            create.write(
+                create.process_files(self.files), expected, translate,
+                percent)
+            create.stream_files(
+                self.files, streamed, translate, percent, rows=3)
+            pd.testing.assert_frame_equal(
+                pd.read_csv(streamed), pd.read_csv(expected))
+
+    def test_stream_update(self):
+        self.config.cache_directory = None
+        create = SteinbitCreate(self.config)
+        output = os.path.join(self.directory.name, 'output.csv')
+        create.stream_files(self.files[2:], output)
+        manifest = create.stream_files(
+            self.files[::-1], output, existing=output, rows=1)
+        manifest.save(output)
+        expected = create.process_files(self.files).result()
+        updated = pd.read_csv(output)
+        self.assertListEqual(
+            updated['depth'].tolist(), [1590.0, 1591.0, 1592.0, 1593.0])
+        pd.testing.assert_frame_equal(
+            updated[expected.columns], expected, check_dtype=False)
+        self.assertListEqual(
+            create.pending_files(self.files, manifest, set()), [])
+
+    def test_profile_covers_workers(self):
+        self.config.cache_directory = None
+        create = SteinbitCreate(self.config)
+        pixels = sum((10 + 5 * i) * 20 for i in range(4))
+        for jobs in [1, 2]:
+            profiler = instrument.start(memory=False)
+            try:
+                create.process_files(self.files, jobs=jobs)
+            finally:
+                instrument.stop()
+            stages = profiler.report()['stages']
+            self.assertEqual(stages['file']['calls'], 4)
+            self.assertEqual(stages['decode']['calls'], 4)
+            self.assertEqual(stages['classify']['pixels'], pixels)
+            self.assertIn('p90', stages['file']['latency'])
+
+    def test_cache_skips_decoding(self):
+        create = SteinbitCreate(self.config)
+        first = create.process_files(self.files).result()
+
+        def fail(*args):
+            raise AssertionError("Image decoded despite cache")
+        open_image = SteinbitCreate.open_image
+        SteinbitCreate.open_image = staticmethod(fail)
+        try:
+            second = create.process_files(self.files).result()
+            parallel = create.process_files(self.files, jobs=2).result()
+        finally:
+            SteinbitCreate.open_image = staticmethod(open_image)
+        pd.testing.assert_frame_equal(first, second)
+        pd.testing.assert_frame_equal(first, parallel)
+
+        cache = CompositionCache(
+            self.config.cache_directory, create.extractors(), 0)
+        key = cache.key(self.files[0])
+        self.assertIsNotNone(cache.get(key))
+        cache.close()
+        cache = CompositionCache(
+            self.config.cache_directory, create.extractors())
+        self.assertIsNone(cache.get(key))
+        cache.close()
+
+    def test_parallel_cache_hashes_in_workers(self):
+        create = SteinbitCreate(self.config)
+        first = create.process_files(self.files, jobs=2).result()
+        cache = CompositionCache(
+            self.config.cache_directory, create.extractors())
+        for filepath in self.files:
+            self.assertIsNotNone(cache.stored_digest(filepath))
+        cache.close()
+
+        copies = []
+        for filepath in self.files:
+            copies.append(filepath + '.copy.png')
+            shutil.copyfile(filepath, copies[-1])
+
+        def fail(*args):
+            raise AssertionError("Image decoded despite cache")
+        open_image = SteinbitCreate.open_image
+        SteinbitCreate.open_image = staticmethod(fail)
+        try:
+            copied = create.process_files(copies, jobs=2).result()
+        finally:
+            SteinbitCreate.open_image = staticmethod(open_image)
+        pd.testing.assert_frame_equal(first, copied)
+
+    def test_pipelined_cache_hashes_bytes_read(self):
+        create = SteinbitCreate(self.config)
+        with mock.patch(
+                'steinbit.cache.file_digest', side_effect=AssertionError):
+            first = create.process_files(self.files, prefetch=2).result()
+        cache = CompositionCache(
+            self.config.cache_directory, create.extractors())
+        for filepath in self.files:
+            self.assertIsNotNone(cache.stored_digest(filepath))
+        cache.close()
+
+        copies = []
+        for filepath in self.files:
+            copies.append(filepath + '.copy.png')
+            shutil.copyfile(filepath, copies[-1])
+        with mock.patch.object(
+                Frame, 'describe', side_effect=AssertionError):
+            copied = create.process_files(copies, prefetch=2).result()
+        pd.testing.assert_frame_equal(first, copied)
+
+    def test_update_reads_only_new_files(self):
+        self.config.cache_directory = None
+        create = SteinbitCreate(self.config)
+        output = os.path.join(self.directory.name, 'output.csv')
+        create.run(Namespace(
+            files=self.files[2:], output=output, update=None, jobs=1,
+            translate=False, percent=False, index=None, well=None,
+            depth_min=None, depth_max=None, prefetch=0, stream=False,
+            maps=None, compress_maps=False))
+
+        read = []
+        read_file = SteinbitCreate.read_file
+
+        def counting(filepath, *args):
+            read.append(filepath)
+            return read_file(filepath, *args)
+        SteinbitCreate.read_file = staticmethod(counting)
+        try:
+            create.run(Namespace(
+                files=self.files[::-1], output=None, update=output,
+                jobs=1, translate=False, percent=False, index=None,
+                well=None, depth_min=None, depth_max=None, prefetch=0,
+                stream=False, maps=None, compress_maps=False))
+            self.assertListEqual(read, self.files[1::-1])
+            mapping = ColourMapping(
+                pd.read_csv(os.path.join(DATA, 'bls.csv')))
+            write_image(self.files[1], mapping, 1591, (30, 20), seed=9)
+            del read[:]
+            create.run(Namespace(
+                files=self.files, output=None, update=output, jobs=1,
+                translate=False, percent=False, index=None, well=None,
+                depth_min=None, depth_max=None, prefetch=0, stream=False,
+                maps=None, compress_maps=False))
+            self.assertListEqual(read, [self.files[1]])
+        finally:
+            SteinbitCreate.read_file = staticmethod(read_file)
+
+        expected = create.process_files(self.files).result()
+        updated = pd.read_csv(output)
+        self.assertListEqual(
+            updated['depth'].tolist(), [1590.0, 1591.0, 1592.0, 1593.0])
+        self.assertListEqual(
+            updated['rtid'].tolist(), expected['rtid'].tolist())
+        pd.testing.assert_frame_equal(
+            updated[expected.columns], expected, check_dtype=False)
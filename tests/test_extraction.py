@@ -1,6 +1,10 @@
 import unittest
-from steinbit.core import ImageDataExtractor, ColourMapping, Field
+import os
+import tempfile
+from steinbit.core import (
+        ImageDataExtractor, ColourMapping, Field, CompositionMode)
 import pandas as pd
+import numpy as np
 from PIL import Image
 
 MAPPING = ColourMapping(pd.DataFrame({
@@ -37,6 +41,58 @@ class ImageDataExtractorTest(unittest.TestCase):
                 {'A': 2, 'B': 2})
         self.assertNotEqual(error, 0)
 
+    def test_image_composition_histogram(self):
+        rng = np.random.default_rng(0)
+        pixels = rng.integers(0, 256, (40, 50, 3), dtype=np.uint8)
+        pixels[:20] = pixels[0, 0]
+        image = Image.fromarray(pixels, 'RGB')
+        lookup = ImageDataExtractor(MAPPING)
+        histogram = ImageDataExtractor(
+            MAPPING, mode=CompositionMode.HISTOGRAM)
+        for source in [image, image.quantize(64)]:
+            error, counts = histogram.composition(source)
+            expected_error, expected_counts = lookup.composition(source)
+            self.assertDictEqual(counts, expected_counts)
+            self.assertAlmostEqual(error, expected_error)
+
+    def test_image_composition_tiled(self):
+        rng = np.random.default_rng(2)
+        pixels = rng.integers(0, 256, (37, 23, 3), dtype=np.uint8)
+        lookup = ImageDataExtractor(MAPPING)
+        tiled = ImageDataExtractor(
+            MAPPING, mode=CompositionMode.TILED, budget=100)
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in ['RGB', 'P', 'L']:
+                for extension in ['png', 'tif', 'bmp']:
+                    path = os.path.join(directory, 'image.' + extension)
+                    image = Image.fromarray(pixels, 'RGB')
+                    if mode == 'P':
+                        image = image.quantize(32)
+                    image.convert(mode).save(path)
+                    error, counts = tiled.composition(Image.open(path))
+                    expected_error, expected_counts = lookup.composition(
+                        Image.open(path))
+                    self.assertDictEqual(counts, expected_counts)
+                    self.assertAlmostEqual(error, expected_error)
+
+    def test_compositions_match_composition(self):
+        rng = np.random.default_rng(1)
+        pixels = rng.integers(0, 256, (30, 30, 3), dtype=np.uint8)
+        image = Image.fromarray(pixels, 'RGB')
+        grey = ColourMapping(pd.DataFrame({
+            'Names': ['A', 'B', 'C'],
+            'Colours': ['#000000', '#808080', '#ffffff']
+        }))
+        extractors = [
+            ImageDataExtractor(MAPPING),
+            ImageDataExtractor(grey, mode=CompositionMode.HISTOGRAM),
+            ImageDataExtractor(grey, mode=CompositionMode.NEIGHBOURS)]
+        results = ImageDataExtractor.compositions(image, extractors)
+        for extractor, (error, counts) in zip(extractors, results):
+            expected_error, expected_counts = extractor.composition(image)
+            self.assertDictEqual(counts, expected_counts)
+            self.assertAlmostEqual(error, expected_error)
+
     def test_metadata(self):
         image = Image.new('RGB', (2, 2))
         image.info['Description'] = "a:b;x:bcde;Z"
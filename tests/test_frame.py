@@ -128,3 +128,20 @@ class FrameTest(unittest.TestCase):
             frame.apply_translation(pd.DataFrame({
                 'Missing': ['Undefined'],
                 'Something': ['Undefined']}))
+
+    def test_frame_shares_palette_section(self):
+        supplier = ColourMapping(pd.DataFrame({
+            'Names': ['A1', 'B1'],
+            'Colours': ['#101010', '#f0f0f0']
+        }))
+        frame = Frame([
+            ImageDataExtractor(DETAILED_MAPPING, FIELDS),
+            ImageDataExtractor(REDUCED_MAPPING, FIELDS),
+            ImageDataExtractor(supplier, FIELDS)])
+        self.assertListEqual(frame.sections, [0, 1, 0])
+        frame.append_image(DETAILED_IMAGE)
+        frame.append_image(make_image(['#101010', '#f0f0f0', '#f0f0f0']))
+        self.assertFalse(frame.requires_translation())
+        assert_array_equal(
+            frame.result()[['A0', 'A1', 'A2', 'B0', 'B1']].values,
+            np.array([[1, 1, 1, 1, 1], [0, 1, 0, 0, 2]]))
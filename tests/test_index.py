@@ -0,0 +1,115 @@
+import unittest
+import os
+import io
+import tempfile
+import contextlib
+import struct
+import zlib
+from argparse import Namespace
+from unittest import mock
+from steinbit.config import Config
+from steinbit.core import ColourMapping, read_info
+from steinbit.create import SteinbitCreate
+from steinbit.index import SteinbitIndex
+from .test_create import DATA, write_config, write_image
+import pandas as pd
+from PIL import Image
+
+
+class SteinbitIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = Config(
+            write_config(self.directory.name), use_cache=False)
+        mapping = ColourMapping(pd.read_csv(os.path.join(DATA, 'bls.csv')))
+        os.makedirs(self.path('images', 'deeper'))
+        self.files = [
+            write_image(
+                self.path('images', *(['deeper'] * (i > 1)), 'i%d.png' % i),
+                mapping, 1590 + i, (10, 20), seed=i)
+            for i in range(4)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, *names):
+        return os.path.join(self.directory.name, *names)
+
+    def index(self, **kwargs):
+        args = Namespace(
+            index=self.path('index.csv'), output=self.path('selected.csv'),
+            well=None, depth_min=None, depth_max=None,
+            paths=[self.path('images')])
+        args.__dict__.update(kwargs)
+        with mock.patch(
+                'steinbit.index.read_info', side_effect=read_info) as read:
+            SteinbitIndex(self.config).run(args)
+        return pd.read_csv(args.output, dtype={'well': str}), read.call_count
+
+    def test_index_reads_headers_once(self):
+        selected, reads = self.index(depth_min=1591, depth_max=1592.5)
+        self.assertEqual(reads, 4)
+        self.assertListEqual(selected['depth'].tolist(), [1591.0, 1592.0])
+        self.assertListEqual(selected['well'].tolist(), ['25/2-18'] * 2)
+        self.assertListEqual(
+            selected['rtid'].tolist(), ['RN2-001', 'RN2-002'])
+        selected, reads = self.index(well=['25/2-18'])
+        self.assertEqual(reads, 0)
+        self.assertEqual(len(selected.index), 4)
+        selected, _ = self.index(well=['25/2-19'])
+        self.assertEqual(len(selected.index), 0)
+
+    def test_create_skips_filtered_images(self):
+        decoded = []
+        open_image = SteinbitCreate.open_image
+        SteinbitCreate.open_image = staticmethod(
+            lambda f, *args: decoded.append(f) or open_image(f, *args))
+        try:
+            with contextlib.redirect_stderr(io.StringIO()):
+                SteinbitCreate(self.config).run(Namespace(
+                    files=self.files, output=self.path('out.csv'),
+                    update=None, jobs=1, translate=False, percent=False,
+                    index=None, well=['25/2-18'], depth_min=1592,
+                    depth_max=None, prefetch=2, stream=False, maps=None,
+                    compress_maps=False))
+        finally:
+            SteinbitCreate.open_image = staticmethod(open_image)
+        self.assertCountEqual(decoded, self.files[2:])
+        self.assertListEqual(
+            pd.read_csv(self.path('out.csv'))['depth'].tolist(),
+            [1592.0, 1593.0])
+
+    def test_text_after_pixels_is_read(self):
+        path = self.files[0]
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        chunks, position = [], 8
+        while position < len(data):
+            length = int.from_bytes(data[position:position + 4], 'big')
+            chunks.append(data[position:position + length + 12])
+            position += length + 12
+        text = [c for c in chunks if c[4:8] == b'tEXt']
+        rest = [c for c in chunks if c[4:8] != b'tEXt']
+        with open(path, 'wb') as handle:
+            handle.write(b''.join([data[:8]] + rest[:-1] + text + rest[-1:]))
+        self.assertNotIn('Description', Image.open(path).info)
+        with Image.open(path) as image:
+            image.load()
+            self.assertDictEqual(read_info(path), image.info)
+
+    def test_corrupt_text_is_skipped(self):
+        path = self.files[0]
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        data = data[:data.index(b'tEXt') - 4]
+        chunk = b'zTXtDescription\0\0not compressed'
+        data += struct.pack('>I', len(chunk) - 4) + chunk + struct.pack(
+            '>I', zlib.crc32(chunk)) + b'\0\0\0\0IEND\xaeB`\x82'
+        with open(path, 'wb') as handle:
+            handle.write(data)
+        selected, _ = self.index()
+        self.assertEqual(len(selected.index), 4)
+        self.assertNotIn(1590.0, selected['depth'].tolist())
+        selected, _ = self.index(depth_min=1590)
+        self.assertEqual(len(selected.index), 3)
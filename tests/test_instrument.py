@@ -0,0 +1,45 @@
+import unittest
+from steinbit.core import instrument
+import numpy as np
+
+
+class InstrumentTest(unittest.TestCase):
+
+    def tearDown(self):
+        instrument.stop()
+
+    def test_stage_does_nothing_when_off(self):
+        self.assertIs(instrument.stage('decode'), instrument.NULL_TIMER)
+        with instrument.stage('decode') as timer:
+            timer.count(10)
+        self.assertIsNone(instrument.PROFILER)
+
+    def test_stages_record_items_and_memory(self):
+        profiler = instrument.start()
+        for _ in range(3):
+            with instrument.stage('outer', 'rows', latency=True) as timer:
+                timer.count(10)
+                with instrument.stage('inner'):
+                    block = np.ones(1 << 20, dtype=np.uint8)
+                    del block
+        report = profiler.report()['stages']
+        self.assertEqual(report['outer']['calls'], 3)
+        self.assertEqual(report['outer']['rows'], 30)
+        self.assertGreater(report['outer']['rows_per_second'], 0)
+        self.assertIn('p99', report['outer']['latency'])
+        self.assertNotIn('latency', report['inner'])
+        self.assertGreaterEqual(report['inner']['peak_mb'], 1.0)
+        self.assertGreaterEqual(
+            report['outer']['peak_mb'], report['inner']['peak_mb'])
+
+    def test_merge_adds_stages(self):
+        profiler = instrument.start(memory=False)
+        with instrument.stage('file', latency=True):
+            pass
+        stages = profiler.take()
+        with instrument.stage('file', latency=True):
+            pass
+        profiler.merge(stages)
+        stage = profiler.stages['file']
+        self.assertEqual(stage.calls, 2)
+        self.assertEqual(len(stage.latencies), 2)
@@ -0,0 +1,122 @@
+import unittest
+import os
+import tempfile
+from steinbit.las import (
+    LASReader, iter_las, read_las, read_lasio, write_las)
+from steinbit.mnemonic import mnemonics
+import lasio
+import pandas as pd
+import numpy as np
+
+
+def write_lasio(output, df, columns, unit, well):
+    las = lasio.LASFile()
+    for item in [las.well.STRT, las.well.STOP, las.well.STEP]:
+        item.unit = unit
+    las.well.WELL.value = well
+    for mnemonic, column in zip(mnemonics(columns), columns):
+        las.append_curve(mnemonic, df[column], descr=column)
+    with open(output, mode='w') as handle:
+        las.write(handle)
+
+
+class WriteLasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assert_matches_lasio(self, df, unit='m', well='25/2-18'):
+        expected = os.path.join(self.directory.name, 'expected.las')
+        written = os.path.join(self.directory.name, 'written.las')
+        columns = list(df.columns)
+        write_lasio(expected, df, columns, unit, well)
+        write_las(written, df, columns, unit, well)
+        with open(expected) as first, open(written) as second:
+            self.assertEqual(second.read(), first.read())
+
+    def test_matches_lasio(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'depth': 1590.0 + np.arange(5000) * 0.25,
+            'Quartz': rng.integers(0, 1000, 5000),
+            'OtherClays': rng.random(5000) * 100,
+            'QuartzClayMix': rng.random(5000) * 1e7 - 1e6})
+        df.loc[::7, 'OtherClays'] = np.nan
+        self.assert_matches_lasio(df)
+        self.assert_matches_lasio(df.iloc[::-1], unit='ft', well=7)
+
+    def test_single_row_matches_lasio(self):
+        df = pd.DataFrame({'depth': [1590.0], 'Quartz': [3]})
+        self.assert_matches_lasio(df)
+        self.assert_matches_lasio(df, unit='')
+
+
+WRAPPED = """~Version
+VERS.   2.0 :
+WRAP.   YES :
+~Well
+STRT.m  1.0 :
+STOP.m  2.0 :
+STEP.m  1.0 :
+NULL. -999.25 :
+WELL.   A-1 :
+~Curve
+DEPT.m  : depth
+QUARTZ. : Quartz
+CALC.   : Calcite
+~A
+1.0
+10 20
+2.0
+30 -999.25
+"""
+
+
+class ReadLasTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.directory.name, 'read.las')
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'depth': 1590.0 + np.arange(1000) * 0.25,
+            'Quartz': rng.integers(0, 1000, 1000),
+            'Calcite': rng.random(1000) * 100})
+        df.loc[::7, 'Calcite'] = np.nan
+        write_lasio(self.filepath, df, list(df.columns), 'ft', '25/2-18')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_matches_lasio(self):
+        self.assertTrue(LASReader(self.filepath).supported)
+        read = read_las(self.filepath)
+        pd.testing.assert_frame_equal(read, read_lasio(self.filepath))
+        self.assertEqual(read['Calcite'].isna().sum(), 143)
+        self.assertListEqual(read['d_unit'].unique().tolist(), ['ft'])
+        self.assertListEqual(read['well'].unique().tolist(), ['25/2-18'])
+
+    def test_reads_only_curves_given(self):
+        read = read_las(self.filepath, ['calcite', 'Dolomite'])
+        self.assertListEqual(
+            list(read.columns), ['depth', 'Calcite', 'd_unit', 'well'])
+        pd.testing.assert_frame_equal(
+            read, read_lasio(self.filepath, ['calcite', 'Dolomite']))
+
+    def test_chunks(self):
+        chunks = list(iter_las(self.filepath, rows=300))
+        self.assertListEqual([len(x.index) for x in chunks], [300] * 3 + [100])
+        pd.testing.assert_frame_equal(
+            pd.concat(chunks, ignore_index=True), read_las(self.filepath))
+
+    def test_wrapped_falls_back_to_lasio(self):
+        with open(self.filepath, 'w') as handle:
+            handle.write(WRAPPED)
+        self.assertFalse(LASReader(self.filepath).supported)
+        read = read_las(self.filepath)
+        self.assertListEqual(read['Quartz'].tolist(), [10.0, 30.0])
+        self.assertTrue(np.isnan(read['Calcite'][1]))
+        self.assertListEqual(read['well'].tolist(), ['A-1', 'A-1'])
@@ -0,0 +1,53 @@
+import unittest
+import os
+from steinbit.core import (
+        ImageDataExtractor, ColourMapping, ColourLookup, CompositionMode)
+import pandas as pd
+import numpy as np
+from PIL import Image
+
+DATA = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+
+def noisy_pixels(colours, count, seed=0):
+    """
+    Palette colours with some anti-aliasing noise, excluding pixels
+    which are equidistant from two palette colours
+    """
+    rng = np.random.default_rng(seed)
+    pixels = colours[rng.integers(0, len(colours), count)].astype(int)
+    pixels += rng.integers(-20, 21, pixels.shape)
+    pixels = np.clip(pixels, 0, 255)
+    distances = np.square(
+        pixels[:, None, :] - colours[None, :, :].astype(int)).sum(axis=2)
+    nearest = np.sort(distances, axis=1)
+    return pixels[nearest[:, 0] != nearest[:, 1]].astype(np.uint8)
+
+
+class ColourLookupTest(unittest.TestCase):
+
+    def test_lookup_matches_neighbours(self):
+        for name in ['bls.csv', 'rs.csv']:
+            mapping = ColourMapping(pd.read_csv(os.path.join(DATA, name)))
+            pixels = noisy_pixels(mapping.colours, 20000)
+            image = Image.fromarray(pixels.reshape(1, -1, 3), 'RGB')
+            error, counts = ImageDataExtractor(mapping).composition(image)
+            expected_error, expected_counts = ImageDataExtractor(
+                mapping, mode=CompositionMode.NEIGHBOURS).composition(image)
+            self.assertDictEqual(counts, expected_counts)
+            self.assertAlmostEqual(error, expected_error)
+
+    def test_lookup_ties_prefer_first_colour(self):
+        lookup = ColourLookup(np.array([[0, 0, 0], [2, 2, 2]]))
+        packed = ColourLookup.pack(Image.new('RGB', (1, 1), (1, 1, 1)))
+        error, counts = lookup.score(packed)
+        self.assertListEqual(counts.tolist(), [1])
+        self.assertAlmostEqual(error, np.sqrt(3))
+
+    def test_distances_are_narrowed(self):
+        grid = np.stack(np.meshgrid(*[[0, 128, 255]] * 3), -1)
+        lookup = ColourLookup(grid.reshape(-1, 3))
+        self.assertEqual(lookup.distances.dtype, np.uint16)
+        lookup = ColourLookup(np.array([[0, 0, 0]]))
+        self.assertEqual(lookup.distances.dtype, np.uint32)
+        self.assertEqual(lookup.distances.max(), 3 * 255 ** 2)
@@ -0,0 +1,157 @@
+import unittest
+import os
+import tempfile
+from argparse import Namespace
+from unittest import mock
+from steinbit.config import Config
+from steinbit.core import (
+    ColourLookup, ColourMapping, ImageDataExtractor, MineralMap
+)
+from steinbit.create import SteinbitCreate
+from .test_create import DATA, write_config, write_image
+from PIL import Image
+import pandas as pd
+import numpy as np
+
+
+class MineralMapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = Config(
+            write_config(self.directory.name), use_cache=False)
+        self.mapping = ColourMapping(
+            pd.read_csv(os.path.join(DATA, 'bls.csv')))
+        self.files = [
+            write_image(
+                self.path('image%d.png' % i), self.mapping, 1590 + i,
+                (150 + 10 * i, 70), seed=i)
+            for i in range(3)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def test_counts_match_regions(self):
+        rng = np.random.default_rng(0)
+        indices = rng.integers(0, 5, (300, 170)).astype(np.uint8)
+        mineral_map = MineralMap(indices, list('abcde'), block=16)
+        for _ in range(200):
+            left, right = sorted(rng.integers(-5, 180, 2))
+            upper, lower = sorted(rng.integers(-5, 310, 2))
+            region = indices[
+                max(upper, 0):max(lower, 0), max(left, 0):max(right, 0)]
+            np.testing.assert_array_equal(
+                mineral_map.counts((left, upper, right, lower)),
+                np.bincount(region.ravel(), minlength=5))
+        self.assertDictEqual(
+            mineral_map.composition((0, 0, 2, 1)),
+            dict(zip('abcde', np.bincount(indices[0, :2], minlength=5))))
+        self.assertEqual(mineral_map.counts().sum(), 300 * 170)
+
+    def test_classify_matches_composition(self):
+        extractor = ImageDataExtractor(self.mapping)
+        image = Image.open(self.files[0])
+        mineral_map = MineralMap.classify(image, extractor, 1000)
+        self.assertEqual(mineral_map.size, (70, 150))
+        self.assertEqual(mineral_map.indices.dtype, np.uint8)
+        composition = extractor.composition(Image.open(self.files[0]))[1]
+        self.assertDictEqual(
+            {k: v for k, v in mineral_map.composition().items() if v},
+            {k: v for k, v in composition.items() if v})
+        self.assertIn('Depth:1590m', mineral_map.info['Description'])
+
+    def test_bottom_up_bitmap(self):
+        extractor = ImageDataExtractor(self.mapping)
+        colours = self.mapping.colours[:3]
+        pixels = np.repeat(colours[:, None, :], 4, axis=1)
+        for mode in ['RGB', 'P']:
+            path = self.path('rows.bmp')
+            image = Image.fromarray(pixels, 'RGB')
+            if mode == 'P':
+                image = image.quantize(3)
+            image.save(path)
+            image = Image.open(path)
+            self.assertEqual(image.tile[0][3][2], -1)
+            expected = extractor.mapping.lookup().indices[
+                ColourLookup.pack(Image.open(path))].reshape(3, 4)
+            for budget in [4, 1000]:
+                np.testing.assert_array_equal(
+                    MineralMap.classify(
+                        Image.open(path), extractor, budget).indices,
+                    expected)
+            self.assertListEqual(expected[:, 0].tolist(), [0, 1, 2])
+
+    def test_save_and_open(self):
+        extractor = ImageDataExtractor(self.mapping)
+        mineral_map = MineralMap.classify(
+            Image.open(self.files[1]), extractor)
+        box = (3, 17, 61, 140)
+        for name in ['map.npy', 'map.npz']:
+            mineral_map.save(self.path(name))
+            opened = MineralMap.open(self.path(name))
+            self.assertEqual(
+                isinstance(opened.indices, np.memmap), name == 'map.npy')
+            np.testing.assert_array_equal(
+                opened.indices, mineral_map.indices)
+            np.testing.assert_array_equal(
+                opened.counts(box), mineral_map.counts(box))
+            self.assertListEqual(opened.minerals, extractor.minerals)
+            self.assertDictEqual(opened.info, mineral_map.info)
+
+    def test_maps_made_while_reading(self):
+        create = SteinbitCreate(self.config)
+        expected = create.process_files(self.files).result()
+        for jobs, prefetch, compress in [(1, 0, False), (1, 2, True),
+                                         (2, 0, False)]:
+            directory = self.path('maps%d%d' % (jobs, prefetch))
+            maps = SteinbitCreate.map_outputs(
+                self.files + [self.path('a.csv')], directory, compress)
+            os.makedirs(directory)
+            result = create.process_files(
+                self.files, jobs, prefetch=prefetch, maps=maps).result()
+            pd.testing.assert_frame_equal(result, expected)
+            self.assertEqual(len(os.listdir(directory)), 6 if compress else 9)
+            for row, filepath in enumerate(self.files):
+                mineral_map = MineralMap.open(maps[filepath])
+                for mineral, count in mineral_map.composition().items():
+                    self.assertEqual(expected[mineral][row], count)
+
+    def test_maps_fill_the_cache(self):
+        self.config.cache_directory = self.path('cache')
+        create = SteinbitCreate(self.config)
+        maps = SteinbitCreate.map_outputs(self.files, self.path('maps'))
+        os.makedirs(self.path('maps'))
+        for jobs in [1, 2]:
+            for output in maps.values():
+                if os.path.exists(output):
+                    os.remove(output)
+            create.process_files(self.files, jobs, maps=maps)
+            for output in maps.values():
+                self.assertTrue(os.path.exists(output))
+        with mock.patch.object(
+                SteinbitCreate, 'open_image', side_effect=AssertionError):
+            create.process_files(self.files)
+
+    def test_update_maps_files_read(self):
+        output = self.path('output.csv')
+        args = dict(
+            output=None, update=None, jobs=1, translate=False,
+            percent=False, index=None, well=None, depth_min=None,
+            depth_max=None, prefetch=0, stream=False, compress_maps=False)
+        create = SteinbitCreate(self.config)
+        create.run(Namespace(
+            files=self.files[:2], maps=None, **dict(args, output=output)))
+        create.run(Namespace(
+            files=self.files, maps=self.path('maps'),
+            **dict(args, update=output)))
+        self.assertListEqual(sorted(os.listdir(self.path('maps'))), [
+            'image2.minerals.blocks.npy', 'image2.minerals.npy',
+            'image2.minerals.npy.json'])
+
+    def test_maps_named_after_images(self):
+        with self.assertRaises(ValueError):
+            SteinbitCreate.map_outputs(
+                ['a/image.png', 'b/image.png'], self.directory.name)
@@ -0,0 +1,44 @@
+import unittest
+import threading
+import time
+from concurrent.futures import Future
+from steinbit.pipeline import Pipeline
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_results_are_in_order(self):
+        def slow(x):
+            time.sleep(0.01 * (x % 3))
+            return x * 2
+        done: Future = Future()
+        done.set_result('cached')
+        pipeline = Pipeline([(slow, 3), (lambda x: x + 1, 1)], 4)
+        self.assertListEqual(
+            list(pipeline.run([0, 1, done, 2, 3, 4])),
+            [1, 3, 'cached', 5, 7, 9])
+
+    def test_capacity_bounds_items_in_flight(self):
+        lock = threading.Lock()
+        started = []
+
+        def record(x):
+            with lock:
+                started.append(x)
+            return x
+        pipeline = Pipeline([(record, 4)], 2)
+        for x in pipeline.run(range(10)):
+            time.sleep(0.01)
+            with lock:
+                self.assertLessEqual(len(started), x + 2)
+
+    def test_errors_are_raised_in_place(self):
+        def fail(x):
+            if x == 2:
+                raise ValueError(x)
+            return x
+        results = Pipeline([(fail, 2)], 3).run(range(5))
+        self.assertEqual(next(results), 0)
+        self.assertEqual(next(results), 1)
+        with self.assertRaises(ValueError):
+            next(results)
@@ -0,0 +1,79 @@
+import unittest
+import json
+import os
+import tempfile
+from steinbit.core import (
+    ImageDataExtractor, ColourMapping, CompositionMode, Frame, Field,
+    Raster, RasterFormatException)
+import pandas as pd
+import numpy as np
+from PIL import Image
+
+DATA = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+DESCRIPTION = 'Wellbore:_25/2-18_C;Depth:1590m;RtID:RN2-006'
+
+FIELDS = {
+    'd_unit': Field('Depth', '[0-9\\.]*(.*)'),
+    'well': Field('Wellbore', '[ _]*([0-9/-]*).*'),
+    'depth': Field('Depth', '([0-9][0-9\\.]*)')
+}
+
+
+class RasterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.mapping = ColourMapping(
+            pd.read_csv(os.path.join(DATA, 'bls.csv')))
+        rng = np.random.default_rng(0)
+        colours = self.mapping.colours
+        self.pixels = colours[rng.integers(0, len(colours), (60, 50))]
+        self.pixels = np.clip(
+            self.pixels.astype(int) + rng.integers(-3, 4, self.pixels.shape),
+            0, 255).astype(np.uint8)
+        self.image = Image.fromarray(self.pixels, 'RGB')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, pixels, info):
+        path = os.path.join(self.directory.name, name)
+        if name.endswith('.npy'):
+            np.save(path, pixels)
+        else:
+            pixels.tofile(path)
+        with open(path + '.json', 'w') as handle:
+            json.dump(info, handle)
+        return path
+
+    def test_raster_matches_image(self):
+        padded = np.concatenate(
+            [self.pixels, np.zeros((60, 50, 1), dtype=np.uint8)], axis=2)
+        paths = [
+            self.write('core.npy', self.pixels, {}),
+            self.write('padded.npy', padded, {}),
+            self.write('core.raw', self.pixels, {'Width': 50, 'Height': 60})]
+        for mode in CompositionMode:
+            extractor = ImageDataExtractor(self.mapping, mode=mode, budget=70)
+            expected = extractor.composition(self.image)
+            for path in paths:
+                raster = Raster.open(path)
+                self.assertIsInstance(raster.pixels, np.memmap)
+                error, counts = extractor.composition(raster)
+                self.assertDictEqual(counts, expected[1])
+                self.assertAlmostEqual(error, expected[0])
+
+    def test_raster_metadata(self):
+        path = self.write('core.npy', self.pixels, {
+            'Description': DESCRIPTION})
+        frame = Frame([ImageDataExtractor(self.mapping, FIELDS)])
+        frame.append_image(Raster.open(path))
+        result = frame.result()
+        self.assertEqual(result['depth'][0], 1590.0)
+        self.assertEqual(result['well'][0], '25/2-18')
+
+    def test_raw_requires_shape(self):
+        path = self.write('core.raw', self.pixels, {})
+        with self.assertRaises(RasterFormatException):
+            Raster.open(path)
@@ -0,0 +1,34 @@
+import unittest
+import os
+from steinbit.core import ColourMapping, ColourLookup, PaletteIndex
+import pandas as pd
+import numpy as np
+
+DATA = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+
+class PaletteIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mappings = [
+            ColourMapping(pd.read_csv(os.path.join(DATA, name)))
+            for name in ['bls.csv', 'rs.csv']]
+        self.index = PaletteIndex(self.mappings)
+
+    def test_routes_to_palette(self):
+        rng = np.random.default_rng(0)
+        colours = self.mappings[0].colours
+        pixels = colours[rng.integers(0, len(colours), 10000)]
+        self.assertListEqual(
+            self.index.route(ColourLookup.pack_colours(pixels)), [0])
+
+    def test_unmatched_pixels_are_ambiguous(self):
+        rng = np.random.default_rng(0)
+        pixels = rng.integers(0, 256, (10000, 3))
+        self.assertListEqual(
+            self.index.route(ColourLookup.pack_colours(pixels)), [0, 1])
+
+    def test_shared_colours_are_ambiguous(self):
+        shared = ColourLookup.pack_colours(np.array([[255, 255, 255]]))
+        self.assertListEqual(
+            self.index.route(shared, np.array([100])), [0, 1])
@@ -0,0 +1,26 @@
+import unittest
+import subprocess
+import sys
+
+# Dependencies only imported by the operations that use them
+LAZY = ['lasio', 'sklearn', 'tqdm', 'scipy']
+
+SCRIPT = """
+import sys
+import steinbit.steinbit
+print(' '.join(m for m in %r if m in sys.modules))
+"""
+
+
+class StartupTest(unittest.TestCase):
+
+    def test_heavy_dependencies_are_not_imported(self):
+        output = subprocess.run(
+            [sys.executable, '-c', SCRIPT % LAZY],
+            stdout=subprocess.PIPE, check=True).stdout
+        self.assertEqual(output.decode().strip(), '')
+
+    def test_help(self):
+        subprocess.run(
+            [sys.executable, '-m', 'steinbit.steinbit', '--help'],
+            stdout=subprocess.DEVNULL, check=True)
@@ -0,0 +1,58 @@
+import unittest
+import io
+import os
+import tempfile
+from steinbit.core import ConsistencyException
+from steinbit.stream import ExternalSort, StreamWriter
+import pandas as pd
+import numpy as np
+
+
+class ExternalSortTest(unittest.TestCase):
+
+    def test_merge_is_stable(self):
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'depth': rng.integers(0, 10, 50).astype(float),
+            'order': np.arange(50)})
+        with tempfile.TemporaryDirectory() as directory:
+            sort = ExternalSort(directory, list(df.columns), rows=3, fan_in=2)
+            for start in range(0, 50, 4):
+                sort.add(df.iloc[start:start + 4])
+            handle = io.StringIO()
+            sort.write(handle)
+            self.assertListEqual(os.listdir(directory), [])
+        handle.seek(0)
+        merged = pd.read_csv(handle, names=list(df.columns))
+        pd.testing.assert_frame_equal(
+            merged,
+            df.sort_values('depth', kind='mergesort').reset_index(drop=True))
+
+
+class StreamWriterTest(unittest.TestCase):
+
+    def test_columns_are_fixed_by_first_rows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'output.csv')
+            writer = StreamWriter(output)
+            writer.write(pd.DataFrame({'depth': [2.0], 'a': [1], 'b': [2]}))
+            writer.write(pd.DataFrame({'b': [4], 'depth': [1.0]}))
+            self.assertFalse(os.path.exists(output))
+            with self.assertRaises(ConsistencyException):
+                writer.write(pd.DataFrame({'depth': [3.0], 'c': [1]}))
+            writer.close()
+            written = pd.read_csv(output)
+        self.assertListEqual(list(written.columns), ['depth', 'a', 'b'])
+        self.assertListEqual(written['b'].tolist(), [2, 4])
+        self.assertTrue(pd.isna(written['a'][1]))
+
+    def test_abort_keeps_existing_output(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'output.csv')
+            with open(output, 'w') as handle:
+                handle.write('depth\n1.0\n')
+            writer = StreamWriter(output, order=True)
+            writer.write(pd.DataFrame({'depth': [2.0]}))
+            writer.abort()
+            self.assertListEqual(os.listdir(directory), ['output.csv'])
+            self.assertListEqual(pd.read_csv(output)['depth'].tolist(), [1.0])
@@ -0,0 +1,43 @@
+import unittest
+from steinbit.core import Translation, InvalidTranslationException
+import pandas as pd
+import numpy as np
+from numpy.testing import assert_array_equal
+
+TABLE = pd.DataFrame({
+    'Reduced': ['B', 'A', 'A', 'A', 'B'],
+    'Detailed': ['B0', 'A0', 'A1', 'A2', 'B1']
+})
+
+
+class TranslationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.translation = Translation(TABLE)
+
+    def test_compiles_matrix(self):
+        self.assertListEqual(self.translation.reduced, ['A', 'B'])
+        assert_array_equal(
+            self.translation.matrix.toarray(),
+            np.array([[0, 1], [1, 0], [1, 0], [1, 0], [0, 1]]))
+        with self.assertRaises(InvalidTranslationException):
+            Translation(TABLE[['Reduced']])
+
+    def test_translates_counts(self):
+        self.assertDictEqual(
+            self.translation.translate({'A0': 2, 'A2': 3, 'B1': 4, 'C': 9}),
+            {'A': 5, 'B': 4})
+
+    def test_translates_frame(self):
+        df = pd.DataFrame({
+            'depth': [1.0, 2.0],
+            'A0': [1, 2],
+            'A1': [1.0, np.nan],
+            'B0': [3, 4],
+            'B1': [5, 6]})
+        result = self.translation.translate_frame(df)
+        self.assertListEqual(list(result.columns), ['depth', 'A', 'B'])
+        self.assertEqual(result['A'][0], 2.0)
+        self.assertTrue(np.isnan(result['A'][1]))
+        self.assertEqual(result['B'].dtype, np.int64)
+        self.assertListEqual(result['B'].tolist(), [8, 10])